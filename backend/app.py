@@ -1,12 +1,48 @@
+import logging
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from werkzeug.serving import is_running_from_reloader
+import database
+import metrics
+import profiler
+import ratelimit
+from archive import archiver
+from backup import backups
+from cache import reference_cache
+from config import get_setting
+from db_init import upgrade_schema
+from event_server import event_server
+from events import event_hub
+from passwords import hash_pool
+from tokens import revocations
 from routes.auth_routes import auth_bp
 from routes.admin_routes import admin_bp
 from routes.doctor_routes import doctor_bp
 from routes.patient_routes import patient_bp
+from routes.event_routes import events_bp
+
+logging.basicConfig(level=get_setting('logging', 'level', 'INFO'),
+                    format=get_setting('logging', 'format', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+# Scheduled maintenance in the serving process (see start_background_jobs)
+BACKGROUND_JOBS = get_setting('maintenance', 'background_jobs', True)
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='/')
 CORS(app)
+database.init_app(app)
+# Before the rate limiter, so its hooks see rejected requests too
+metrics.init_app(app)
+profiler.init_app(app)
+ratelimit.init_app(app)
+for name, stats in (('db_pool', database.pool.stats), ('cache', reference_cache.stats),
+                    ('password_hashing', hash_pool.stats), ('rate_limit', ratelimit.stats), ('events', event_hub.stats),
+                    ('event_server', event_server.stats), ('archive', archiver.stats), ('backup', backups.stats)):
+    metrics.register_stats(name, stats)
+upgrade_schema(database.DB_PATH)
+
+_conn = database.get_db_connection()
+revocations.load_blacklisted(_conn)
+_conn.close()
 
 # ----------------- FRONTEND ROUTES -----------------
 
@@ -24,6 +60,26 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
 app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
 app.register_blueprint(patient_bp, url_prefix='/api/patient')
+app.register_blueprint(events_bp, url_prefix='/api/events')
+
+def start_background_jobs():
+    """Start the backup and archive schedules in this process.
+
+    Importing app starts no threads, so scripts and benchmarks that import it
+    run no jobs. The dev server below calls this; under a WSGI server call it
+    once per serving process (e.g. from gunicorn's post_worker_init), or set
+    maintenance.background_jobs to false and run backup.py and archive.py from
+    cron instead.
+    """
+    if BACKGROUND_JOBS:
+        backups.start()
+        archiver.start()
+
 
 if __name__ == '__main__':
+    # The reloader's watcher process serves nothing; only its child runs jobs
+    # and the event server (under a WSGI server, call both once per worker)
+    if is_running_from_reloader():
+        start_background_jobs()
+        event_server.start()
     app.run(debug=True)
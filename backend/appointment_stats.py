@@ -0,0 +1,110 @@
+"""Rebuild or verify the derived appointment counters against Appointment.
+
+AppointmentStats holds per-doctor/per-patient status counts, archived
+appointments included; DoctorDayLoad the per-doctor, per-day booking
+ledger used for max_appointments_per_day, over the hot table only.
+
+    python appointment_stats.py verify     # exit 1 if any counter drifted
+    python appointment_stats.py rebuild    # recompute every counter
+"""
+import argparse
+import sqlite3
+import sys
+from database import DB_PATH, apply_pragmas
+
+OWNER_TYPES = {'DoctorID': 'Doctor', 'PatientID': 'Patient'}
+
+ACTUAL_COUNTS_SQL = '''
+    SELECT 'Doctor' AS OwnerType, DoctorID AS OwnerID, Status, COUNT(*) AS Count
+    FROM (SELECT DoctorID, Status FROM Appointment UNION ALL SELECT DoctorID, Status FROM AppointmentArchive)
+    WHERE DoctorID IS NOT NULL GROUP BY DoctorID, Status
+    UNION ALL
+    SELECT 'Patient', PatientID, Status, COUNT(*)
+    FROM (SELECT PatientID, Status FROM Appointment UNION ALL SELECT PatientID, Status FROM AppointmentArchive)
+    WHERE PatientID IS NOT NULL GROUP BY PatientID, Status
+'''
+
+# Every appointment that is not cancelled takes up a place in the doctor's day
+ACTUAL_DAY_LOAD_SQL = '''
+    SELECT DoctorID, substr(AppointmentDate, 1, 10) AS Day, COUNT(*) AS Booked
+    FROM Appointment WHERE DoctorID IS NOT NULL AND Status IS NOT 'Cancelled'
+    GROUP BY DoctorID, Day
+'''
+
+
+def status_counts(conn, owner_column, owner_id):
+    rows = conn.execute(
+        'SELECT Status, Count FROM AppointmentStats WHERE OwnerType = ? AND OwnerID = ?',
+        (OWNER_TYPES[owner_column], owner_id)
+    ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def rebuild_stats(conn):
+    conn.execute('DELETE FROM AppointmentStats')
+    conn.execute(f'INSERT INTO AppointmentStats (OwnerType, OwnerID, Status, Count) {ACTUAL_COUNTS_SQL}')
+
+
+def rebuild_day_load(conn):
+    conn.execute('DELETE FROM DoctorDayLoad')
+    conn.execute(f'INSERT INTO DoctorDayLoad (DoctorID, Day, Booked) {ACTUAL_DAY_LOAD_SQL}')
+
+
+def verify_stats(conn):
+    """Return (OwnerType, OwnerID, Status, stored, actual) for every mismatch."""
+    stored = {
+        (row[0], row[1], row[2]): row[3]
+        for row in conn.execute('SELECT OwnerType, OwnerID, Status, Count FROM AppointmentStats WHERE Count != 0')
+    }
+    actual = {(row[0], row[1], row[2]): row[3] for row in conn.execute(ACTUAL_COUNTS_SQL)}
+    return [
+        key + (stored.get(key, 0), actual.get(key, 0))
+        for key in sorted(stored.keys() | actual.keys())
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def verify_day_load(conn):
+    """Return (DoctorID, Day, stored, actual) for every mismatch."""
+    stored = {
+        (row[0], row[1]): row[2]
+        for row in conn.execute('SELECT DoctorID, Day, Booked FROM DoctorDayLoad WHERE Booked != 0')
+    }
+    actual = {(row[0], row[1]): row[2] for row in conn.execute(ACTUAL_DAY_LOAD_SQL)}
+    return [
+        key + (stored.get(key, 0), actual.get(key, 0))
+        for key in sorted(stored.keys() | actual.keys())
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify AppointmentStats and DoctorDayLoad')
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    apply_pragmas(conn)
+
+    if args.command == 'rebuild':
+        rebuild_stats(conn)
+        rebuild_day_load(conn)
+        conn.commit()
+        print('AppointmentStats and DoctorDayLoad rebuilt')
+        conn.close()
+        return 0
+
+    mismatches = verify_stats(conn)
+    day_mismatches = verify_day_load(conn)
+    conn.close()
+    for owner_type, owner_id, status, stored, actual in mismatches:
+        print(f'{owner_type} {owner_id} {status}: stored {stored}, actual {actual}')
+    for doctor_id, day, stored, actual in day_mismatches:
+        print(f'Doctor {doctor_id} {day}: stored {stored} booked, actual {actual}')
+    print(f'{len(mismatches) + len(day_mismatches)} mismatched counter(s)')
+    return 1 if mismatches or day_mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
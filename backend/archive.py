@@ -0,0 +1,259 @@
+"""Hot/cold split of Appointment and History.
+
+Completed and Cancelled appointments dated more than archive_after_days
+ago move, with their History rows, to AppointmentArchive and
+HistoryArchive: same columns, same ids, same database file. The list and
+history queries read only the hot tables, so their indexes cover the last
+few months instead of the hospital's whole past. A request with
+?archived=1 reads hot and archived rows together through archive_union().
+
+The job moves archive_batch_size appointments per BEGIN IMMEDIATE
+transaction and sleeps archive_pause_ms between batches, so a booking
+never waits behind more than one short batch. The app runs it every
+archive_interval_minutes once app.start_background_jobs() has been called;
+POST /api/admin/system/archive or the command line run it on demand:
+
+    python archive.py run --max-batches 100
+    python archive.py status
+
+Archived appointments are read-only: set_status() and the bulk operations
+only see the hot table. AppointmentStats keeps lifetime counts (a batch
+adds back what the delete triggers take off), while DoctorDayLoad only
+counts hot rows, which is all booking needs.
+
+The archive is not a separate attached database: under WAL a transaction
+spanning attached databases is not atomic across them, and a move must
+never lose or duplicate a row.
+"""
+import argparse
+import datetime
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from config import get_setting
+from database import DB_PATH, apply_pragmas, get_db_connection
+
+ARCHIVE_ENABLED = get_setting('maintenance', 'archive_enabled', True)
+ARCHIVE_AFTER_DAYS = get_setting('maintenance', 'archive_after_days', 180)
+ARCHIVE_BATCH_SIZE = get_setting('maintenance', 'archive_batch_size', 500)
+ARCHIVE_PAUSE_MS = get_setting('maintenance', 'archive_pause_ms', 50)
+ARCHIVE_INTERVAL_MINUTES = get_setting('maintenance', 'archive_interval_minutes', 60)
+
+# hot table -> archive table
+ARCHIVE_TABLES = {'Appointment': 'AppointmentArchive', 'History': 'HistoryArchive'}
+
+APPOINTMENT_COLUMNS = 'AppointmentID, AppointmentDate, PatientID, DoctorID, Status'
+HISTORY_COLUMNS = 'HistoryID, AppointmentID, PatientID, Tests, MedicineName, Instructions'
+
+_HOT_TABLE = re.compile(r'\b(FROM|JOIN)\s+(Appointment|History)\b')
+
+log = logging.getLogger('hospital.archive')
+
+
+class ArchiveBusy(Exception):
+    pass
+
+
+# === Reads ===
+
+def include_archived(args):
+    return args.get('archived') in ('1', 'true')
+
+
+def archive_union(sql, params, include):
+    """Return (sql, params), extended with the same query over the archive tables if include.
+
+    sql is one SELECT over Appointment / History without ORDER BY or LIMIT.
+    The caller appends those naming result columns (AppointmentDate, not
+    a.AppointmentDate) so they apply to the whole union; each half keeps
+    its own index seeks and SQLite merges the two ordered halves.
+    """
+    if not include:
+        return sql, list(params)
+    archived = _HOT_TABLE.sub(lambda m: f'{m.group(1)} {ARCHIVE_TABLES[m.group(2)]}', sql)
+    return f'{sql}\n        UNION ALL\n{archived}', list(params) * 2
+
+
+# === Moves ===
+
+def _move_history(conn, marks, ids):
+    moved = conn.execute(f'''
+        INSERT INTO HistoryArchive ({HISTORY_COLUMNS})
+        SELECT {HISTORY_COLUMNS} FROM History WHERE AppointmentID IN ({marks})
+    ''', ids).rowcount
+    conn.execute(f'DELETE FROM History WHERE AppointmentID IN ({marks})', ids)
+    return moved
+
+
+def archive_batch(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to batch_size finished appointments dated before cutoff, with their History.
+
+    Returns (appointments, history rows) moved.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # No ORDER BY: any old rows will do, and the seek stays on the (Status, AppointmentDate) index
+        ids = [row[0] for row in conn.execute('''
+            SELECT AppointmentID FROM Appointment
+            WHERE Status IN ('Completed', 'Cancelled') AND AppointmentDate < ?
+            LIMIT ?
+        ''', (cutoff, batch_size))]
+        if not ids:
+            conn.rollback()
+            return 0, 0
+        marks = ','.join('?' * len(ids))
+        conn.execute(f'''
+            INSERT INTO AppointmentArchive ({APPOINTMENT_COLUMNS})
+            SELECT {APPOINTMENT_COLUMNS} FROM Appointment WHERE AppointmentID IN ({marks})
+        ''', ids)
+        history = _move_history(conn, marks, ids)
+        conn.execute(f'DELETE FROM Appointment WHERE AppointmentID IN ({marks})', ids)
+        # The delete triggers took the rows off AppointmentStats, which counts archived ones too
+        conn.execute(f'''
+            INSERT INTO AppointmentStats (OwnerType, OwnerID, Status, Count)
+            SELECT 'Doctor', DoctorID, Status, COUNT(*) FROM AppointmentArchive
+            WHERE AppointmentID IN ({marks}) AND DoctorID IS NOT NULL GROUP BY DoctorID, Status
+            UNION ALL
+            SELECT 'Patient', PatientID, Status, COUNT(*) FROM AppointmentArchive
+            WHERE AppointmentID IN ({marks}) AND PatientID IS NOT NULL GROUP BY PatientID, Status
+            ON CONFLICT (OwnerType, OwnerID, Status) DO UPDATE SET Count = Count + excluded.Count
+        ''', ids + ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(ids), history
+
+
+def archive_late_history(conn, appointment_id):
+    """Follow an archived appointment with History just added for it; call before committing."""
+    if conn.execute('SELECT 1 FROM AppointmentArchive WHERE AppointmentID = ?', (appointment_id,)).fetchone():
+        _move_history(conn, '?', [appointment_id])
+
+
+# === Job ===
+
+class Archiver:
+    """Runs archive_batch() until nothing is left to move, one run at a time."""
+
+    def __init__(self, after_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                 pause=ARCHIVE_PAUSE_MS / 1000, connect=get_db_connection):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.connect = connect
+        self._running = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'runs': 0,
+            'batches': 0,
+            'appointments': 0,
+            'history': 0,
+            'last_run': None,
+        }
+
+    def cutoff(self, now=None):
+        # A bare date sorts before every 'YYYY-MM-DD HH:MM' on that day
+        return ((now or datetime.datetime.now()) - datetime.timedelta(days=self.after_days)).strftime('%Y-%m-%d')
+
+    def run(self, max_batches=None):
+        """Archive batch by batch until done or max_batches; returns the run's report."""
+        if not self._running.acquire(blocking=False):
+            raise ArchiveBusy('An archive run is already in progress')
+        try:
+            report = {'cutoff': self.cutoff(), 'batches': 0, 'appointments': 0, 'history': 0, 'finished': False}
+            started = time.perf_counter()
+            longest = 0
+            while max_batches is None or report['batches'] < max_batches:
+                batch_started = time.perf_counter()
+                conn = self.connect()
+                try:
+                    appointments, history = archive_batch(conn, report['cutoff'], self.batch_size)
+                finally:
+                    conn.close()
+                if appointments:
+                    longest = max(longest, time.perf_counter() - batch_started)
+                    report['batches'] += 1
+                    report['appointments'] += appointments
+                    report['history'] += history
+                if appointments < self.batch_size:
+                    report['finished'] = True
+                    break
+                # Let queued writers take the lock before the next batch
+                time.sleep(self.pause)
+            report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            report['longest_batch_ms'] = round(longest * 1000, 1)
+        finally:
+            self._running.release()
+
+        self._stats['runs'] += 1
+        for key in ('batches', 'appointments', 'history'):
+            self._stats[key] += report[key]
+        self._stats['last_run'] = dict(report, at=datetime.datetime.now().isoformat(timespec='seconds'))
+        return report
+
+    def start(self, interval_minutes=ARCHIVE_INTERVAL_MINUTES):
+        if ARCHIVE_ENABLED and interval_minutes > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run_every, args=(interval_minutes * 60,),
+                                            name='archiver', daemon=True)
+            self._thread.start()
+
+    def _run_every(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                report = self.run()
+                if report['appointments']:
+                    log.info('Archived %d appointments and %d history rows older than %s in %d batches',
+                             report['appointments'], report['history'], report['cutoff'], report['batches'])
+            except ArchiveBusy:
+                pass
+            except Exception:
+                # Keep the schedule alive; the next interval tries again
+                log.exception('Archive run failed')
+
+    def stats(self):
+        return dict(self._stats, running=self._running.locked(), after_days=self.after_days,
+                    batch_size=self.batch_size)
+
+
+archiver = Archiver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move finished appointments and their History to the archive tables')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='archive appointments older than this')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int)
+    args = parser.parse_args()
+
+    def connect():
+        return apply_pragmas(sqlite3.connect(args.db))
+
+    job = Archiver(after_days=args.days, batch_size=args.batch_size, connect=connect)
+    if args.command == 'run':
+        report = job.run(args.max_batches)
+        print(f"Archived {report['appointments']} appointments and {report['history']} history rows "
+              f"dated before {report['cutoff']} in {report['batches']} batches, {report['duration_ms']} ms "
+              f"(longest batch {report['longest_batch_ms']} ms)"
+              f"{'' if report['finished'] else '; more remain'}")
+        return 0
+
+    conn = connect()
+    for table in ('Appointment', 'AppointmentArchive', 'History', 'HistoryArchive'):
+        print(f"{table:<20} {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:>10} rows")
+    due = conn.execute('''
+        SELECT COUNT(*) FROM Appointment WHERE Status IN ('Completed', 'Cancelled') AND AppointmentDate < ?
+    ''', (job.cutoff(),)).fetchone()[0]
+    conn.close()
+    print(f'{due} appointments dated before {job.cutoff()} are due for archiving')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
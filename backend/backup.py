@@ -0,0 +1,315 @@
+"""Online backups of the live database into compressed, verified snapshots.
+
+Each backup copies the database with SQLite's backup API,
+backup_pages_per_step pages per step with backup_step_sleep_ms between
+steps. The copy is read from one read transaction held on the source for
+the whole run: under WAL that is a fixed snapshot, so requests keep
+reading and writing throughout, and no write in between makes the backup
+start over. An unpinned backup restarts after every commit and, under
+steady traffic, never finishes. The WAL cannot be checkpointed past the
+snapshot while the backup runs, so it grows for that long.
+
+The copy is checked with PRAGMA integrity_check, switched to a rollback
+journal so it opens on its own, and gzipped into
+<backup_directory>/hospital-YYYYmmdd-HHMMSS.db.gz. backup_directory is
+relative to the database file. Snapshots older than retention_days are
+deleted (auto_cleanup_enabled), always keeping the newest
+backup_keep_min.
+
+Once app.start_background_jobs() has been called, the app takes a backup
+when one is due under backup_schedule: daily, weekly (Mondays) or monthly
+(on the 1st), at backup_time. A snapshot missed while the app was down is
+taken at the next start.
+POST /api/admin/system/backups or the command line take one on demand:
+
+    python backup.py run
+    python backup.py list
+    python backup.py prune
+
+To restore, stop the app and gunzip a snapshot over hospital.db.
+"""
+import argparse
+import datetime
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from config import get_setting
+from database import DB_PATH
+
+BACKUP_ENABLED = get_setting('maintenance', 'backup_enabled', True) and get_setting('database', 'backup_enabled', True)
+BACKUP_SCHEDULE = get_setting('maintenance', 'backup_schedule', 'daily')
+BACKUP_TIME = get_setting('maintenance', 'backup_time', '02:00')
+BACKUP_DIRECTORY = get_setting('maintenance', 'backup_directory', 'backups')
+RETENTION_DAYS = get_setting('maintenance', 'retention_days', 30)
+AUTO_CLEANUP = get_setting('maintenance', 'auto_cleanup_enabled', True)
+BACKUP_KEEP_MIN = get_setting('maintenance', 'backup_keep_min', 3)
+PAGES_PER_STEP = get_setting('maintenance', 'backup_pages_per_step', 256)
+STEP_SLEEP_MS = get_setting('maintenance', 'backup_step_sleep_ms', 10)
+COMPRESSION_LEVEL = get_setting('maintenance', 'backup_compression_level', 6)
+
+SCHEDULES = ('daily', 'weekly', 'monthly')
+
+SNAPSHOT_FORMAT = 'hospital-%Y%m%d-%H%M%S.db.gz'
+_SNAPSHOT = re.compile(r'^hospital-(\d{8}-\d{6})\.db\.gz$')
+
+# Another process's run counts as in progress for this long
+LOCK_STALE_SECONDS = 6 * 3600
+
+log = logging.getLogger('hospital.backup')
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupBusy(BackupError):
+    pass
+
+
+def backup_directory(db_path=DB_PATH, directory=BACKUP_DIRECTORY):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), directory)
+
+
+def snapshots(directory):
+    """(taken at, path) of every snapshot in directory, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        match = _SNAPSHOT.match(name)
+        if match:
+            found.append((datetime.datetime.strptime(match.group(1), '%Y%m%d-%H%M%S'), os.path.join(directory, name)))
+    return sorted(found, reverse=True)
+
+
+# === Schedule ===
+
+def last_slot(now, schedule=BACKUP_SCHEDULE, at=BACKUP_TIME):
+    """The latest scheduled backup time at or before now."""
+    if schedule not in SCHEDULES:
+        raise BackupError(f"backup_schedule must be one of {', '.join(SCHEDULES)}")
+    hour, minute = (int(part) for part in at.split(':'))
+    slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if schedule == 'daily':
+        return slot if slot <= now else slot - datetime.timedelta(days=1)
+    if schedule == 'weekly':
+        slot -= datetime.timedelta(days=slot.weekday())
+        return slot if slot <= now else slot - datetime.timedelta(days=7)
+    slot = slot.replace(day=1)
+    if slot <= now:
+        return slot
+    return (slot - datetime.timedelta(days=1)).replace(day=1)
+
+
+def is_due(directory, now=None, schedule=BACKUP_SCHEDULE, at=BACKUP_TIME):
+    now = now or datetime.datetime.now()
+    taken = snapshots(directory)
+    return not taken or taken[0][0] < last_slot(now, schedule, at)
+
+
+# === Backup ===
+
+def _copy(db_path, target, pages_per_step, sleep):
+    source = sqlite3.connect(db_path, isolation_level=None)
+    copy = sqlite3.connect(target)
+    steps = [0]
+
+    def progress(status, remaining, total):
+        steps[0] += 1
+        # The source holds no lock between steps; give the requests the disk
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    try:
+        # Pin one snapshot for the whole copy (see the module docstring)
+        source.execute('BEGIN')
+        source.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        pages = source.execute('PRAGMA page_count').fetchone()[0]
+        started = time.perf_counter()
+        source.backup(copy, pages=pages_per_step, progress=progress)
+        copied = time.perf_counter() - started
+        source.execute('COMMIT')
+
+        problems = [row[0] for row in copy.execute('PRAGMA integrity_check')]
+        if problems != ['ok']:
+            raise BackupError(f"Backup failed integrity_check: {'; '.join(problems[:5])}")
+        # A standalone file: no -wal needed next to the restored copy
+        copy.execute('PRAGMA journal_mode = DELETE').fetchall()
+    finally:
+        copy.close()
+        source.close()
+    return pages, steps[0], copied
+
+
+def _compress(path, target, level):
+    with open(path, 'rb') as raw, gzip.open(target, 'wb', compresslevel=level) as packed:
+        shutil.copyfileobj(raw, packed, 1024 * 1024)
+
+
+def backup_database(db_path=DB_PATH, directory=None, pages_per_step=PAGES_PER_STEP,
+                    sleep=STEP_SLEEP_MS / 1000, level=COMPRESSION_LEVEL, now=None):
+    """Write one verified, gzipped snapshot of db_path; returns its report."""
+    directory = directory or backup_directory(db_path)
+    os.makedirs(directory, exist_ok=True)
+    taken_at = now or datetime.datetime.now()
+    target = os.path.join(directory, taken_at.strftime(SNAPSHOT_FORMAT))
+    if os.path.exists(target):
+        raise BackupBusy(f'{os.path.basename(target)} already exists')
+    partial = target[:-len('.gz')] + '.partial'
+
+    started = time.perf_counter()
+    try:
+        pages, steps, copied = _copy(db_path, partial, pages_per_step, sleep)
+        verified = time.perf_counter() - started
+        database_bytes = os.path.getsize(partial)
+        _compress(partial, target + '.partial', level)
+        os.replace(target + '.partial', target)
+    finally:
+        for leftover in (partial, partial + '-journal', partial + '-wal', partial + '-shm', target + '.partial'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    duration = time.perf_counter() - started
+
+    return {
+        'snapshot': target,
+        'taken_at': taken_at.isoformat(timespec='seconds'),
+        'pages': pages,
+        'steps': steps,
+        'database_bytes': database_bytes,
+        'compressed_bytes': os.path.getsize(target),
+        'copy_seconds': round(copied, 3),
+        'verify_seconds': round(verified - copied, 3),
+        'compress_seconds': round(duration - verified, 3),
+        'duration_seconds': round(duration, 3),
+        'pages_per_second': round(pages / copied) if copied else None,
+    }
+
+
+def prune(directory, retention_days=RETENTION_DAYS, keep_min=BACKUP_KEEP_MIN, now=None):
+    """Delete snapshots older than retention_days, keeping the newest keep_min; returns the deleted paths."""
+    cutoff = (now or datetime.datetime.now()) - datetime.timedelta(days=retention_days)
+    deleted = []
+    for taken_at, path in snapshots(directory)[keep_min:]:
+        if taken_at < cutoff:
+            os.remove(path)
+            deleted.append(path)
+    return deleted
+
+
+# === Service ===
+
+class BackupService:
+    """Takes scheduled and on-demand backups, one at a time across processes."""
+
+    def __init__(self, db_path=DB_PATH, directory=None):
+        self.db_path = db_path
+        self.directory = directory or backup_directory(db_path)
+        self._running = threading.Lock()
+        self._thread = None
+        self._stats = {'backups': 0, 'failures': 0, 'pruned': 0, 'last': None, 'last_error': None}
+
+    def _lock_file(self):
+        # Several workers share the directory; only one of them backs up
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '.lock')
+        try:
+            if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise BackupBusy('A backup is already in progress')
+        return path
+
+    def run(self):
+        if not self._running.acquire(blocking=False):
+            raise BackupBusy('A backup is already in progress')
+        try:
+            lock = self._lock_file()
+            try:
+                report = backup_database(self.db_path, self.directory)
+                report['pruned'] = [os.path.basename(path) for path in prune(self.directory)] if AUTO_CLEANUP else []
+            finally:
+                os.remove(lock)
+        except (OSError, sqlite3.Error, BackupError) as e:
+            if not isinstance(e, BackupBusy):
+                self._stats['failures'] += 1
+                self._stats['last_error'] = str(e)
+            raise
+        finally:
+            self._running.release()
+
+        self._stats['backups'] += 1
+        self._stats['pruned'] += len(report['pruned'])
+        self._stats['last'] = report
+        log.info('Backup %s: %d pages, %d bytes (%d compressed) in %.1f s, %s pages/s',
+                 os.path.basename(report['snapshot']), report['pages'], report['database_bytes'],
+                 report['compressed_bytes'], report['duration_seconds'], report['pages_per_second'])
+        return report
+
+    def start(self, check_seconds=60):
+        if BACKUP_ENABLED and self._thread is None:
+            last_slot(datetime.datetime.now())   # reject a bad backup_schedule at startup
+            self._thread = threading.Thread(target=self._run_when_due, args=(check_seconds,),
+                                            name='backup', daemon=True)
+            self._thread.start()
+
+    def _run_when_due(self, check_seconds):
+        while True:
+            time.sleep(check_seconds)
+            try:
+                if is_due(self.directory):
+                    self.run()
+            except BackupBusy:
+                pass
+            except Exception:
+                # Keep the schedule alive; the next check tries again
+                log.exception('Scheduled backup failed')
+
+    def stats(self):
+        taken = snapshots(self.directory)
+        return dict(self._stats, running=self._running.locked(), schedule=BACKUP_SCHEDULE, time=BACKUP_TIME,
+                    snapshots=len(taken), newest=taken[0][0].isoformat() if taken else None)
+
+    def list(self):
+        return [{'name': os.path.basename(path), 'taken_at': taken_at.isoformat(), 'bytes': os.path.getsize(path)}
+                for taken_at, path in snapshots(self.directory)]
+
+
+backups = BackupService()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Take, list or prune online backups of the database')
+    parser.add_argument('command', choices=['run', 'list', 'prune'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--dir', help='snapshot directory (default: backup_directory next to the database)')
+    args = parser.parse_args()
+
+    service = BackupService(args.db, args.dir)
+    if args.command == 'run':
+        report = service.run()
+        print(f"{report['snapshot']}: {report['pages']} pages in {report['steps']} steps, "
+              f"{report['database_bytes']} bytes -> {report['compressed_bytes']} gzipped, "
+              f"{report['duration_seconds']} s ({report['pages_per_second']} pages/s copying)")
+        for name in report['pruned']:
+            print(f'pruned {name}')
+    elif args.command == 'list':
+        for snapshot in service.list():
+            print(f"{snapshot['taken_at']}  {snapshot['bytes']:>12}  {snapshot['name']}")
+    else:
+        for path in prune(service.directory):
+            print(f'pruned {os.path.basename(path)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
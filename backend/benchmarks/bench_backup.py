@@ -0,0 +1,82 @@
+"""Write latency while an online backup runs, for a few backup step sizes.
+
+Run from the backend directory:
+
+    python benchmarks/bench_backup.py --rows 200000 --pages 64 256 1024
+
+Seeds a scratch database, then keeps a writer committing one insert every
+few milliseconds while backup_database() copies it. Reports the backup's
+own numbers and the writer's p50 / max commit latency against an idle
+baseline: the writer should never wait on the backup.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from backup import backup_database  # noqa: E402
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = wal')
+    conn.execute('CREATE TABLE Item (ItemID INTEGER PRIMARY KEY, Name TEXT, Value REAL)')
+    conn.execute('CREATE INDEX idx_item_name ON Item (Name)')
+    conn.executemany('INSERT INTO Item (Name, Value) VALUES (?, ?)', ((f'item {i}', i / 3) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def write_latencies(path, stop):
+    conn = sqlite3.connect(path, timeout=30)
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute('INSERT INTO Item (Name, Value) VALUES (?, ?)', ('bench', 0))
+        conn.commit()
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.005)
+    conn.close()
+    return latencies
+
+
+def measure(path, run):
+    stop = threading.Event()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(latencies=write_latencies(path, stop)))
+    thread.start()
+    report = run()
+    stop.set()
+    thread.join()
+    return report, result['latencies']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[64, 256, 1024])
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    path = os.path.join(scratch, 'bench.db')
+    seed(path, args.rows)
+
+    _, idle = measure(path, lambda: time.sleep(1))
+    print(f'{"no backup":<18} writes p50 {statistics.median(idle) * 1e3:6.2f} ms  max {max(idle) * 1e3:6.2f} ms')
+    for pages in args.pages:
+        report, latencies = measure(path, lambda: backup_database(path, os.path.join(scratch, f'backups-{pages}'),
+                                                                  pages_per_step=pages))
+        print(f'{f"{pages} pages/step":<18} writes p50 {statistics.median(latencies) * 1e3:6.2f} ms'
+              f'  max {max(latencies) * 1e3:6.2f} ms  ({len(latencies)} during backup)'
+              f'  backup {report["duration_seconds"]:.2f} s, {report["pages_per_second"]} pages/s copying,'
+              f' {report["database_bytes"]} -> {report["compressed_bytes"]} bytes')
+
+
+if __name__ == '__main__':
+    main()
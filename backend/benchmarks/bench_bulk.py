@@ -0,0 +1,75 @@
+"""Cancelling a doctor's day: one PUT per appointment vs. one bulk request.
+
+Run from the backend directory:
+
+    python benchmarks/bench_bulk.py --appointments 100 1000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+
+
+def seed(path, appointments):
+    # Two doctors with the same schedule, one per method
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    conn.execute('DELETE FROM Appointment')
+    ids = {}
+    for doctor_id in (1, 2):
+        ids[doctor_id] = [
+            conn.execute(
+                "INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, 1, ?, 'Scheduled')",
+                (f'2030-{1 + i // 2000:02d}-{1 + i // 80 % 25:02d} {8 + i % 80 // 8:02d}:{i % 8 * 5:02d}', doctor_id)
+            ).lastrowid
+            for i in range(appointments)
+        ]
+    conn.commit()
+    conn.close()
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    path = os.environ['HOSPITAL_DB_PATH']
+    init_db(path)
+    from app import app
+    from tokens import issue_token
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {issue_token(1, 'Admin', None)}"
+
+    for appointments in args.appointments:
+        ids = seed(path, appointments)
+
+        started = time.perf_counter()
+        for appointment_id in ids[1]:
+            client.put(f'/api/admin/appointments/{appointment_id}/status', json={'status': 'Cancelled'})
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = client.post('/api/admin/appointments/bulk', json={
+            'operations': [{'op': 'cancel', 'appointment_id': appointment_id} for appointment_id in ids[2]]
+        })
+        bulk = time.perf_counter() - started
+        assert response.get_json()['failed'] == 0
+
+        print(f'\n{appointments} cancellations')
+        print(f'  single PUTs   {single * 1000:>9.1f} ms  {appointments / single:>9,.0f} ops/s')
+        print(f'  one bulk POST {bulk * 1000:>9.1f} ms  {appointments / bulk:>9,.0f} ops/s')
+
+
+if __name__ == '__main__':
+    main()
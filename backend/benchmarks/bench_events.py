@@ -0,0 +1,134 @@
+"""Publish cost and delivery latency with many idle subscribers waiting.
+
+Run from the backend directory:
+
+    python benchmarks/bench_events.py --subscribers 1 1000 3000
+    python benchmarks/bench_events.py --server --subscribers 1 1000 5000
+
+Each subscriber is a thread blocked in EventHub.wait() for its own patient
+scope, as a stream's worker is between events. Events go to one patient at
+a time, so only that subscriber should wake: publish() cost and latency
+should not grow with the number of idle subscribers.
+
+With --server each subscriber is instead an SSE connection to an
+EventServer, read by one selector here; the server's thread count should
+stay the same however many streams are open.
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from event_server import EventServer, _raise_file_limit  # noqa: E402
+from events import EventHub  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+
+def run(subscribers, events):
+    hub = EventHub(capacity=10000, max_subscribers=subscribers + 1)
+    stop = threading.Event()
+    received = {}
+    woken = [0]
+
+    def subscriber(patient_id):
+        scope = ('Patient', patient_id)
+        cursor, _ = hub.position()
+        while not stop.is_set():
+            found, cursor, _ = hub.wait(cursor, scope, 60)
+            woken[0] += 1
+            for event in found:
+                received[event['data']['sent']] = time.perf_counter()
+
+    threads = [threading.Thread(target=subscriber, args=(i,), daemon=True) for i in range(max(subscribers, 1))]
+    for thread in threads:
+        thread.start()
+    while hub.stats()['waiting'] < len(threads):
+        time.sleep(0.01)
+
+    woken[0] = 0
+    publish_times, latencies = [], []
+    for i in range(events):
+        sent = time.perf_counter()
+        hub.publish('appointment.updated', {'sent': sent}, patient_id=i % len(threads))
+        publish_times.append(time.perf_counter() - sent)
+        time.sleep(0.002)
+        if sent in received:
+            latencies.append(received[sent] - sent)
+    wakeups = woken[0]
+    stop.set()
+    hub.publish('shutdown', {'sent': 0}, public=True)
+    return len(threads), publish_times, latencies, wakeups
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def run_server(subscribers, events):
+    _raise_file_limit()
+    hub = EventHub(capacity=10000, max_subscribers=subscribers + 1)
+    server = EventServer(hub, '127.0.0.1', _free_port())
+    threads_before = threading.active_count()
+    server.start()
+
+    selector = selectors.DefaultSelector()
+    for patient_id in range(subscribers):
+        conn = socket.create_connection(('127.0.0.1', server.port))
+        token = issue_token(patient_id, 'Patient', patient_id)
+        conn.sendall(f'GET /api/events/stream?token={token} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode())
+        conn.setblocking(False)
+        selector.register(conn, selectors.EVENT_READ)
+    while server.stats()['parked'] < subscribers:
+        time.sleep(0.01)
+    for key, _ in selector.select(0):
+        key.fileobj.recv(65536)   # response heads
+    threads = threading.active_count() - threads_before
+
+    publish_times, latencies = [], []
+    for i in range(events):
+        sent = time.perf_counter()
+        hub.publish('appointment.updated', {'sent': sent}, patient_id=i % subscribers)
+        publish_times.append(time.perf_counter() - sent)
+        deadline = sent + 1
+        while time.perf_counter() < deadline:
+            chunks = b''.join(key.fileobj.recv(65536) for key, _ in selector.select(0.1))
+            if f'"sent":{json.dumps(sent)}'.encode() in chunks:
+                latencies.append(time.perf_counter() - sent)
+                break
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    return subscribers, threads, publish_times, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 1000, 3000])
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--server', action='store_true', help='subscribe over SSE to an EventServer')
+    args = parser.parse_args()
+
+    for subscribers in args.subscribers:
+        if args.server:
+            subscribers, threads, publish_times, latencies = run_server(subscribers, args.events)
+            print(f'{subscribers:>6} idle streams on {threads} server thread(s):'
+                  f' publish {statistics.median(publish_times) * 1e6:6.1f} µs'
+                  f'  delivery p50 {statistics.median(latencies) * 1e3 if latencies else 0:5.2f} ms'
+                  f'  {len(latencies)}/{args.events} delivered')
+            continue
+        subscribers, publish_times, latencies, wakeups = run(subscribers, args.events)
+        print(f'{subscribers:>6} idle subscribers: publish {statistics.median(publish_times) * 1e6:6.1f} µs'
+              f'  delivery p50 {statistics.median(latencies) * 1e3 if latencies else 0:5.2f} ms'
+              f'  {len(latencies)}/{args.events} delivered  {wakeups / args.events:.2f} wakeups per event')
+
+
+if __name__ == '__main__':
+    main()
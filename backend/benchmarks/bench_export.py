@@ -0,0 +1,80 @@
+"""Export throughput, output size and peak memory per format, against fetchall().
+
+Run from the backend directory:
+
+    python benchmarks/bench_export.py --appointments 100000 400000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+from exporter import export_rows, watermark  # noqa: E402
+
+# Past appointments, so the one-scheduled-per-slot index does not apply
+STATUSES = ('Completed', 'Completed', 'Cancelled')
+
+
+def seed(path, appointments):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    conn.execute('DELETE FROM Appointment')
+    conn.executemany(
+        'INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, ?)',
+        ((f'20{10 + i // 100000 % 20}-{1 + i // 8000 % 12:02d}-{1 + i // 300 % 25:02d} {8 + i % 10:02d}:{i % 4 * 15:02d}',
+          1 + i % 2, 1 + i % 2, STATUSES[i % 3]) for i in range(appointments))
+    )
+    conn.commit()
+    return conn
+
+
+def measure(fn):
+    # Timed without tracemalloc, which slows allocation-heavy code down
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, nargs='+', default=[100000, 400000])
+    args = parser.parse_args()
+
+    path = os.environ['HOSPITAL_DB_PATH']
+    init_db(path)
+    for appointments in args.appointments:
+        conn = seed(path, appointments)
+        upto = watermark(conn, 'appointments')
+        print(f'\n{appointments} appointments')
+
+        elapsed, peak, _ = measure(lambda: conn.execute('SELECT * FROM Appointment').fetchall())
+        print(f'  {"fetchall()":<16} {elapsed:>6.2f} s  {appointments / elapsed:>9,.0f} rows/s'
+              f'  peak {peak / 2 ** 20:>7.1f} MB')
+
+        for fmt in ('csv', 'ndjson', 'columnar'):
+            for compress in (False, True):
+                elapsed, peak, size = measure(lambda: sum(
+                    len(chunk) for chunk in export_rows(conn, 'appointments', fmt, 0, upto, compress=compress)))
+                label = f"{fmt}{'.gz' if compress else ''}"
+                print(f'  {label:<16} {elapsed:>6.2f} s  {appointments / elapsed:>9,.0f} rows/s'
+                      f'  peak {peak / 2 ** 20:>7.1f} MB  output {size / 2 ** 20:>6.1f} MB')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Bulk import throughput: importer batch sizes, deferred indexes, and row-at-a-time inserts.
+
+Run from the backend directory:
+
+    python benchmarks/bench_import.py --patients 20000 --appointments 100000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+from importer import import_stream  # noqa: E402
+
+
+def patients_csv(count):
+    lines = ['patient_id,name,age,gender,contact,address']
+    for i in range(count):
+        lines.append(f'{1000 + i},Patient {i},{18 + i % 70},{("Male", "Female", "Other")[i % 3]},'
+                     f'9{i:09d},City {i % 50}')
+    return '\n'.join(lines) + '\n'
+
+
+def appointments_ndjson(count, patients):
+    rng = random.Random(7)
+    lines = []
+    for i in range(count):
+        lines.append(json.dumps({
+            'patient_id': 1000 + rng.randrange(patients), 'doctor_id': 1 + i % 2,
+            'date': f'20{10 + i // 40000 % 10}-{1 + i // 3200 % 12:02d}-{1 + i // 128 % 25:02d} '
+                    f'{8 + i % 64 // 8:02d}:{i % 8 * 5:02d}',
+            'status': 'Completed',
+        }))
+    return '\n'.join(lines) + '\n'
+
+
+def fresh_db(name):
+    path = os.path.join(SCRATCH_DIR, name)
+    init_db(path)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    return conn
+
+
+def timed_import(conn, kind, text, fmt, **options):
+    started = time.perf_counter()
+    report = import_stream(conn, kind, io.StringIO(text), fmt, **options)
+    assert report['failed'] == 0, report['errors'][:5]
+    return time.perf_counter() - started, report
+
+
+def row_at_a_time(conn, patients, appointments):
+    # What the register/book routes amount to: one INSERT and commit per row
+    started = time.perf_counter()
+    for i in range(patients):
+        conn.execute('INSERT INTO Patient (PatientID, Name, Age, Gender, Contact, Address) VALUES (?, ?, ?, ?, ?, ?)',
+                     (1000 + i, f'Patient {i}', 18 + i % 70, ('Male', 'Female', 'Other')[i % 3], f'9{i:09d}', 'City'))
+        conn.commit()
+    for record in map(json.loads, appointments.splitlines()):
+        conn.execute('INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, ?)',
+                     (record['date'], record['patient_id'], record['doctor_id'], record['status']))
+        conn.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=20000)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 5000, 20000])
+    args = parser.parse_args()
+
+    patients = patients_csv(args.patients)
+    appointments = appointments_ndjson(args.appointments, args.patients)
+    total = args.patients + args.appointments
+    print(f'{args.patients} patients (CSV) + {args.appointments} appointments (NDJSON)')
+
+    runs = [(f'batch {size}', {'batch_size': size}) for size in args.batch_sizes]
+    runs.append((f'batch {args.batch_sizes[-1]}, deferred', {'batch_size': args.batch_sizes[-1], 'defer_indexes': True}))
+    for number, (label, options) in enumerate(runs):
+        conn = fresh_db(f'run{number}.db')
+        patient_seconds, _ = timed_import(conn, 'patients', patients, 'csv', **options)
+        appointment_seconds, _ = timed_import(conn, 'appointments', appointments, 'ndjson', **options)
+        elapsed = patient_seconds + appointment_seconds
+        print(f'  {label:<24} {elapsed:>7.2f} s  {total / elapsed:>9,.0f} rows/s'
+              f'  (patients {patient_seconds:.2f} s, appointments {appointment_seconds:.2f} s)')
+        conn.close()
+
+    sample = min(total, 5000)
+    conn = fresh_db('single.db')
+    share = args.patients * sample // total
+    elapsed = row_at_a_time(conn, share, '\n'.join(appointments.splitlines()[:sample - share]))
+    print(f'  {"row at a time":<24} {elapsed * total / sample:>7.2f} s  {sample / elapsed:>9,.0f} rows/s'
+          f'  (extrapolated from {sample} rows)')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
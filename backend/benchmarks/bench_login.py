@@ -0,0 +1,111 @@
+"""Login throughput and latency through /api/auth/login across password hash costs.
+
+Each cost setting is run with --concurrency client threads logging in
+against users hashed with that setting. Latencies are for successful
+logins; 503s are logins refused by the bounded hashing pool.
+
+Run from the backend directory:
+
+    python benchmarks/bench_login.py --concurrency 32 --logins 400 --workers 4
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import passwords  # noqa: E402
+import ratelimit  # noqa: E402
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+
+COSTS = [
+    ('scrypt', {'SCRYPT_N': 2 ** 12}),
+    ('scrypt', {'SCRYPT_N': 2 ** 14}),
+    ('scrypt', {'SCRYPT_N': 2 ** 15}),
+    ('pbkdf2_sha256', {'PBKDF2_ITERATIONS': 100000}),
+    ('pbkdf2_sha256', {'PBKDF2_ITERATIONS': 600000}),
+]
+USERS = 50
+
+
+def set_cost(scheme, settings):
+    passwords.SCHEME = scheme
+    for name, value in settings.items():
+        setattr(passwords, name, value)
+
+
+def seed_users(path):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    conn.execute("DELETE FROM User WHERE Username LIKE 'bench%'")
+    conn.executemany("INSERT INTO User (Username, Password, Role) VALUES (?, ?, 'Admin')",
+                     [(f'bench{i}', passwords.hash_password(f'secret{i}')) for i in range(USERS)])
+    conn.commit()
+    conn.close()
+
+
+def run(client, concurrency, logins):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    per_thread = logins // concurrency
+
+    def login_loop(offset):
+        for i in range(per_thread):
+            user = (offset * per_thread + i) % USERS
+            started = time.perf_counter()
+            response = client.post('/api/auth/login', json={'username': f'bench{user}', 'password': f'secret{user}'})
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses.append(response.status_code)
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=login_loop, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=320)
+    parser.add_argument('--workers', type=int, default=passwords.HASH_WORKERS)
+    parser.add_argument('--max-pending', type=int, default=passwords.HASH_MAX_PENDING)
+    args = parser.parse_args()
+
+    path = os.environ['HOSPITAL_DB_PATH']
+    init_db(path)
+    from app import app
+    from routes import auth_routes
+    auth_routes.hash_pool = passwords.HashPool(args.workers, args.max_pending)
+    # Measure hashing, not the per-IP login rate limit
+    ratelimit.request_limiter.limit = float('inf')
+    client = app.test_client()
+
+    print(f'{args.concurrency} clients, {args.workers} hash workers, {args.max_pending} max pending')
+    for scheme, settings in COSTS:
+        set_cost(scheme, settings)
+        seed_users(path)
+        elapsed, latencies, statuses = run(client, args.concurrency, args.logins)
+        ok = len(latencies)
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        cost = ', '.join(f'{name.split("_")[-1].lower()}={value}' for name, value in settings.items())
+        print(f'  {scheme:<14} {cost:<20} {ok / elapsed:>8.1f} logins/s   '
+              f'p50 {p50:>7.1f} ms   p99 {p99:>7.1f} ms   503s {statuses.count(503)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Cost of SQL timing and request metrics against plain sqlite3 connections.
+
+Run from the backend directory:
+
+    python benchmarks/bench_metrics.py --rows 20000
+
+Times the same statements on a plain connection and on a TimedConnection
+(primary-key lookups, a 500-row page fetched with fetchall() and by
+iterating the cursor, single-row inserts), then a request histogram
+observation on its own.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from metrics import Histogram, REQUEST_BUCKETS, TimedConnection  # noqa: E402
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE Item (ItemID INTEGER PRIMARY KEY, Name TEXT, Value REAL)')
+    conn.executemany('INSERT INTO Item (Name, Value) VALUES (?, ?)', ((f'item {i}', i / 3) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def cases(conn, rows):
+    def lookup(i):
+        conn.execute('SELECT * FROM Item WHERE ItemID = ?', (i % rows + 1,)).fetchone()
+
+    def page_fetchall(i):
+        conn.execute('SELECT * FROM Item WHERE ItemID > ? ORDER BY ItemID LIMIT 500', (i % rows,)).fetchall()
+
+    def page_iterate(i):
+        for _ in conn.execute('SELECT * FROM Item WHERE ItemID > ? ORDER BY ItemID LIMIT 500', (i % rows,)):
+            pass
+
+    def insert(i):
+        conn.execute('INSERT INTO Scratch (Value) VALUES (?)', (i,))
+
+    return {'pk lookup': (lookup, 20000), '500 rows fetchall': (page_fetchall, 1000),
+            '500 rows iterated': (page_iterate, 1000), 'insert': (insert, 20000)}
+
+
+def run(path, rows, factory):
+    conn = sqlite3.connect(path, factory=factory)
+    conn.execute('CREATE TEMP TABLE Scratch (Value INTEGER)')
+    results = {}
+    for name, (fn, repeat) in cases(conn, rows).items():
+        started = time.perf_counter()
+        for i in range(repeat):
+            fn(i)
+        results[name] = (time.perf_counter() - started) / repeat
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.rows)
+    plain = run(path, args.rows, sqlite3.Connection)
+    timed = run(path, args.rows, TimedConnection)
+    for name in plain:
+        print(f'{name:<20} plain {plain[name] * 1e6:8.1f} µs  timed {timed[name] * 1e6:8.1f} µs'
+              f'  overhead {(timed[name] - plain[name]) * 1e6:6.1f} µs')
+
+    histogram = Histogram('bench', 'bench', ('endpoint', 'method'), REQUEST_BUCKETS)
+    started = time.perf_counter()
+    for i in range(100000):
+        histogram.observe(('admin.get_doctors', 'GET'), i / 1e6)
+    print(f'{"request observe":<20} {(time.perf_counter() - started) / 100000 * 1e6:8.2f} µs')
+
+
+if __name__ == '__main__':
+    main()
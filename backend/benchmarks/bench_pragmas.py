@@ -0,0 +1,117 @@
+"""Mixed read/write throughput with SQLite defaults vs. the tuned pragma profile.
+
+Run from the backend directory:
+
+    python benchmarks/bench_pragmas.py --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import PRAGMAS, apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+
+# SQLite out of the box: rollback journal, synchronous=FULL, 2 MB cache, no mmap
+BASELINE_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full'}
+
+READ_SQL = '''
+    SELECT a.AppointmentID, a.AppointmentDate, a.Status,
+           p.PatientID, p.Name AS PatientName, p.Age, p.Gender, p.Contact
+    FROM Appointment a
+    JOIN Patient p ON a.PatientID = p.PatientID
+    WHERE a.DoctorID = ?
+    ORDER BY a.AppointmentDate ASC
+'''
+WRITE_SQL = '''
+    INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status)
+    VALUES (?, ?, ?, 'Scheduled')
+'''
+
+
+def build_db(path, pragmas, doctors, patients, appointments):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    conn.executemany('INSERT INTO Doctor (Name, Specialization) VALUES (?, ?)',
+                     [(f'Doctor {i}', 'General') for i in range(doctors)])
+    conn.executemany('INSERT INTO Patient (Name, Age, Gender) VALUES (?, ?, ?)',
+                     [(f'Patient {i}', 30, 'Other') for i in range(patients)])
+    rnd = random.Random(1)
+    conn.executemany(WRITE_SQL, [
+        (f'2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 10:00',
+         rnd.randint(1, patients), rnd.randint(1, doctors))
+        for _ in range(appointments)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def worker(path, pragmas, sql_kind, doctors, patients, stop, results):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    rnd = random.Random(threading.get_ident())
+    ops = errors = 0
+    while not stop.is_set():
+        try:
+            if sql_kind == 'read':
+                conn.execute(READ_SQL, (rnd.randint(1, doctors),)).fetchall()
+            else:
+                conn.execute(WRITE_SQL, ('2025-06-01 10:00', rnd.randint(1, patients), rnd.randint(1, doctors)))
+                conn.commit()
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.rollback()
+    conn.close()
+    results.append((sql_kind, ops, errors))
+
+
+def run(label, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build_db(path, pragmas, args.doctors, args.patients, args.appointments)
+
+        stop = threading.Event()
+        results = []
+        threads = [
+            threading.Thread(target=worker, args=(path, pragmas, kind, args.doctors, args.patients, stop, results))
+            for kind in ['read'] * args.readers + ['write'] * args.writers
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    reads = sum(ops for kind, ops, _ in results if kind == 'read')
+    writes = sum(ops for kind, ops, _ in results if kind == 'write')
+    errors = sum(err for _, _, err in results)
+    print(f'{label:<10} reads/s={reads / args.seconds:>10.1f}  writes/s={writes / args.seconds:>8.1f}  '
+          f'locked errors={errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--appointments', type=int, default=50000)
+    args = parser.parse_args()
+
+    run('baseline', BASELINE_PRAGMAS, args)
+    run('tuned', PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cost of a continuous-sampler tick and of a deterministic request profile.
+
+Run from the backend directory:
+
+    python benchmarks/bench_profiler.py --hz 10 50 200
+
+Times Sampler.sample() against a serving thread parked DEPTH frames deep
+(roughly a Flask request inside a route) and turns that into the share of
+one CPU the sampler takes at each rate. Then runs a fixed pure-Python
+workload with and without RequestProfile.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from profiler import RequestProfile, Sampler  # noqa: E402
+
+DEPTH = 40
+
+
+def parked(depth, ready, release):
+    if depth:
+        return parked(depth - 1, ready, release)
+    ready.set()
+    release.wait()
+
+
+def workload(rounds):
+    rows = [{'AppointmentID': i, 'Status': 'Scheduled', 'DoctorName': f'Dr. {i}'} for i in range(200)]
+    for _ in range(rounds):
+        json.dumps(sorted(rows, key=lambda row: row['DoctorName']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hz', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--threads', type=int, default=4, help='request threads being served')
+    parser.add_argument('--rounds', type=int, default=1000)
+    args = parser.parse_args()
+
+    sampler = Sampler(hz=0)
+    release = threading.Event()
+    for i in range(args.threads):
+        ready = threading.Event()
+        thread = threading.Thread(target=parked, args=(DEPTH, ready, release), daemon=True)
+        thread.start()
+        ready.wait()
+        sampler.serving[thread.ident] = f'bench.endpoint_{i}'
+    ticks = 2000
+    started = time.perf_counter()
+    for _ in range(ticks):
+        sampler.sample()
+    tick = (time.perf_counter() - started) / ticks
+    release.set()
+    print(f'sample() with {args.threads} threads {DEPTH} frames deep: {tick * 1e6:.1f} µs')
+    for hz in args.hz:
+        print(f'{f"  at {hz} Hz":<12} {tick * hz * 100:6.3f}% of one CPU')
+
+    started = time.perf_counter()
+    workload(args.rounds)
+    baseline = time.perf_counter() - started
+    profile = RequestProfile('bench')
+    profile.start()
+    workload(args.rounds)
+    profile.stop()
+    print(f'request profile: {baseline * 1e3:.1f} ms -> {profile.duration * 1e3:.1f} ms'
+          f' ({profile.duration / baseline:.1f}x), {len(profile.stacks)} stacks')
+
+
+if __name__ == '__main__':
+    main()
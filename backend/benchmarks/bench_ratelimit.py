@@ -0,0 +1,71 @@
+"""Per-request cost of the sliding-window rate limiter.
+
+Times SlidingWindowLimiter.allow() directly across key counts, then a cheap
+API route through the test client with the global limiter off and on.
+
+Run from the backend directory:
+
+    python benchmarks/bench_ratelimit.py --keys 100 10000 100000 --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ratelimit  # noqa: E402
+from db_init import init_db  # noqa: E402
+
+CALLS = 200000
+
+
+def bench_allow(keys):
+    limiter = ratelimit.SlidingWindowLimiter(float('inf'), 60, max_keys=keys)
+    names = [f'10.0.{i // 256 % 256}.{i % 256}/{i}' for i in range(keys)]
+    started = time.perf_counter()
+    for i in range(CALLS):
+        limiter.allow(names[i % keys])
+    return (time.perf_counter() - started) / CALLS
+
+
+def bench_route(client, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/api/admin/departments')
+    return (time.perf_counter() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('SlidingWindowLimiter.allow()')
+    for keys in args.keys:
+        print(f'  {keys:>7} keys  {bench_allow(keys) * 1e9:>8.0f} ns/call')
+
+    init_db(os.environ['HOSPITAL_DB_PATH'])
+    from app import app
+    from tokens import issue_token
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {issue_token(1, 'Admin', None)}"
+    ratelimit.request_limiter.limit = float('inf')
+    limiting = [False]
+    app.before_request(lambda: ratelimit.limit_requests() if limiting[0] else None)
+
+    off = bench_route(client, args.requests)
+    limiting[0] = True
+    on = bench_route(client, args.requests)
+    print(f'\nGET /api/admin/departments x {args.requests}')
+    print(f'  limiter off  {off * 1e6:>8.1f} us/request')
+    print(f'  limiter on   {on * 1e6:>8.1f} us/request  (+{(on - off) * 1e6:.1f} us)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Admin patient search: LIKE '%q%' over four columns vs. the FTS5 index.
+
+Run from the backend directory:
+
+    python benchmarks/bench_search.py --patients 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+from search import match_expression  # noqa: E402
+
+FIRST_NAMES = ['Arjun', 'Priya', 'Ravi', 'Neha', 'Aksheth', 'Gyan', 'Meera', 'Kiran', 'Sagar', 'Divya',
+               'Rahul', 'Anjali', 'Vikram', 'Pooja', 'Suresh', 'Lakshmi', 'Manoj', 'Kavya', 'Rohit', 'Sneha']
+LAST_NAMES = ['Mehta', 'Verma', 'Kumar', 'Sharma', 'Reddy', 'Rao', 'Iyer', 'Nair', 'Gupta', 'Patel']
+CITIES = ['Hyderabad', 'Chennai', 'Bengaluru', 'Mumbai', 'Delhi', 'Pune', 'Kolkata', 'Visakhapatnam']
+QUERIES = ['arj', 'priya verma', 'hyder', 'kavya nair', 'mumbai', 'zzz', 'sag red', '98765']
+
+LIKE_SQL = '''
+    SELECT * FROM Patient
+    WHERE lower(Name) LIKE ? OR lower(Contact) LIKE ? OR lower(Address) LIKE ?
+'''
+FTS_SQL = '''
+    SELECT p.* FROM PatientSearch s
+    JOIN Patient p ON p.PatientID = s.rowid
+    WHERE PatientSearch MATCH ?
+    ORDER BY bm25(PatientSearch, 10.0, 2.0, 1.0)
+    LIMIT 20
+'''
+
+
+def build_db(path, patients):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    rnd = random.Random(1)
+    conn.executemany(
+        'INSERT INTO Patient (Name, Age, Gender, Contact, Address) VALUES (?, ?, ?, ?, ?)',
+        ((f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}', rnd.randint(1, 90), 'Other',
+          str(rnd.randint(6000000000, 9999999999)), rnd.choice(CITIES))
+         for _ in range(patients))
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(conn, sql, params, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows = conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - started) / repeat * 1000, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for patients in args.patients:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            build_db(path, patients)
+            conn = sqlite3.connect(path)
+            apply_pragmas(conn)
+
+            print(f'\n{patients:,} patients')
+            for q in QUERIES:
+                like_ms, like_rows = timed(conn, LIKE_SQL, (f'%{q}%',) * 3, args.repeat)
+                fts_ms, fts_rows = timed(conn, FTS_SQL, (match_expression(q),), args.repeat)
+                print(f'  {q!r:<14} LIKE {like_ms:>9.2f} ms ({like_rows:>7,} rows)   '
+                      f'FTS {fts_ms:>7.2f} ms ({fts_rows:>2} rows)')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
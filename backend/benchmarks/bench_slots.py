@@ -0,0 +1,115 @@
+"""Next free slots: per doctor/day free_slots() calls vs. one merged next_free_slots() pass.
+
+Run from the backend directory:
+
+    python benchmarks/bench_slots.py --doctors 100 500 --fill 0.9
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache import reference_cache  # noqa: E402
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+from slots import BOOKING_ADVANCE_DAYS, SLOT_MINUTES, booking_index, free_slots, next_free_slots  # noqa: E402
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+
+def build_db(path, doctors, fill):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    first_id = conn.execute('SELECT COALESCE(MAX(DoctorID), 0) + 1 FROM Doctor').fetchone()[0]
+    ids = range(first_id, first_id + doctors)
+    conn.executemany('INSERT INTO Doctor (DoctorID, Name, Specialization) VALUES (?, ?, ?)',
+                     [(i, f'Doctor {i}', 'Bench') for i in ids])
+    conn.executemany('INSERT INTO DoctorAvailability (DoctorID, Day, StartTime, EndTime) VALUES (?, ?, ?, ?)',
+                     [(i, day, '09:00', '17:00') for i in ids for day in DAYS])
+
+    # Book `fill` of every slot in the booking horizon
+    rnd = random.Random(1)
+    today = datetime.date.today()
+    starts = range(9 * 60, 17 * 60, SLOT_MINUTES)
+    rows = []
+    for offset in range(BOOKING_ADVANCE_DAYS):
+        day = today + datetime.timedelta(days=offset)
+        if day.strftime('%A') not in DAYS:
+            continue
+        for i in ids:
+            for start in starts:
+                if rnd.random() < fill:
+                    rows.append((f'{day} {start // 60:02d}:{start % 60:02d}', 1, i))
+    conn.executemany(
+        "INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, 'Scheduled')",
+        rows
+    )
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def per_day_search(conn, doctors, first_day, days, limit):
+    # What a client without the endpoint does: ask every doctor for every day
+    found = []
+    for offset in range(days):
+        day = first_day + datetime.timedelta(days=offset)
+        for doctor in doctors:
+            found.extend((slot['StartTime'], doctor['DoctorID']) for slot in free_slots(conn, doctor['DoctorID'], day))
+        if len(found) >= limit:
+            break
+    return sorted(found)[:limit]
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        reference_cache.clear()
+        booking_index._days.clear()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doctors', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--fill', type=float, default=0.9, help='fraction of slots already booked')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for doctors in args.doctors:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            booked = build_db(path, doctors, args.fill)
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            apply_pragmas(conn)
+
+            rows = conn.execute("SELECT DoctorID, Name, Specialization FROM Doctor WHERE Specialization = 'Bench'").fetchall()
+            today = datetime.date.today()
+            per_day_ms = timed(lambda: per_day_search(conn, rows, today, BOOKING_ADVANCE_DAYS, args.limit), args.repeat)
+            cold_ms = timed(lambda: next_free_slots(conn, rows, today, BOOKING_ADVANCE_DAYS, args.limit), args.repeat)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                next_free_slots(conn, rows, today, BOOKING_ADVANCE_DAYS, args.limit)
+            warm_ms = (time.perf_counter() - started) / args.repeat * 1000
+
+            print(f'\n{doctors} doctors, {booked:,} scheduled appointments over {BOOKING_ADVANCE_DAYS} days')
+            print(f'  per doctor/day        {per_day_ms:>8.2f} ms')
+            print(f'  next_free_slots cold  {cold_ms:>8.2f} ms')
+            print(f'  next_free_slots warm  {warm_ms:>8.2f} ms')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
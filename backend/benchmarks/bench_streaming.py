@@ -0,0 +1,93 @@
+"""Peak Python memory of the admin appointment export: fetchall() + jsonify vs. streaming.
+
+Run from the backend directory:
+
+    python benchmarks/bench_streaming.py --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'bench.db')
+
+from db_init import init_db  # noqa: E402
+
+
+def build_db(path, rows):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO Doctor (Name, Specialization) VALUES (?, ?)',
+                     [(f'Doctor {i}', 'General') for i in range(100)])
+    conn.executemany('INSERT INTO Patient (Name, Age, Gender, Contact) VALUES (?, ?, ?, ?)',
+                     [(f'Patient {i}', 30, 'Other', f'{9000000000 + i}') for i in range(10000)])
+    rnd = random.Random(1)
+    conn.executemany(
+        "INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, 'Scheduled')",
+        ((f'2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 10:00', rnd.randint(1, 10000), rnd.randint(1, 100))
+         for _ in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<14} bytes={size:>12,}  peak={peak / 1e6:>8.1f} MB  time={elapsed:>6.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    build_db(os.environ['HOSPITAL_DB_PATH'], args.rows)
+
+    from app import app
+    from tokens import issue_token
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {issue_token(1, 'Admin', None)}"
+
+    def materialised():
+        # What the route did before: every row as sqlite3.Row, then dict, then one JSON string
+        conn = sqlite3.connect(os.environ['HOSPITAL_DB_PATH'])
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute('''
+            SELECT a.AppointmentID, a.AppointmentDate, a.Status, a.PatientID,
+                   p.Name as PatientName, p.Contact as PatientContact,
+                   d.Name as DoctorName, d.Specialization
+            FROM Appointment a
+            JOIN Patient p ON a.PatientID = p.PatientID
+            JOIN Doctor d ON a.DoctorID = d.DoctorID
+            ORDER BY a.AppointmentDate DESC
+        ''').fetchall()
+        body = json.dumps([dict(row) for row in rows])
+        conn.close()
+        return len(body)
+
+    def streamed(headers=None):
+        response = client.get('/api/admin/appointments?stream=1', headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    measure('fetchall', materialised)
+    measure('stream json', streamed)
+    measure('stream ndjson', lambda: streamed({'Accept': 'application/x-ndjson'}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Dashboard summary: three COUNT(*) queries vs. one grouped pass plus window/next seeks.
+
+Run from the backend directory:
+
+    python benchmarks/bench_summary.py --rows 1000000 --calls 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import apply_pragmas  # noqa: E402
+from db_init import init_db  # noqa: E402
+from summaries import appointment_summary  # noqa: E402
+
+STATUSES = ['Scheduled', 'Completed', 'Cancelled']
+
+
+def build_db(path, rows, doctors, patients):
+    init_db(path)
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn)
+    conn.executemany('INSERT INTO Doctor (Name, Specialization) VALUES (?, ?)',
+                     [(f'Doctor {i}', 'General') for i in range(doctors)])
+    conn.executemany('INSERT INTO Patient (Name, Age, Gender) VALUES (?, ?, ?)',
+                     [(f'Patient {i}', 30, 'Other') for i in range(patients)])
+    rnd = random.Random(1)
+    conn.executemany(
+        'INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, ?)',
+        ((f'202{rnd.randint(3, 6)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} {rnd.randint(8, 17):02d}:00',
+          rnd.randint(1, patients), rnd.randint(1, doctors), rnd.choice(STATUSES))
+         for _ in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def old_summary(conn, owner_column, owner_id):
+    # The previous implementation: three separate scans of the owner's rows
+    total = conn.execute(f'SELECT COUNT(*) AS Total FROM Appointment WHERE {owner_column} = ?',
+                         (owner_id,)).fetchone()['Total']
+    completed = conn.execute(f"SELECT COUNT(*) AS N FROM Appointment WHERE {owner_column} = ? AND Status = 'Completed'",
+                             (owner_id,)).fetchone()['N']
+    upcoming = conn.execute(f"SELECT COUNT(*) AS N FROM Appointment WHERE {owner_column} = ? AND Status = 'Scheduled'",
+                            (owner_id,)).fetchone()['N']
+    return {'total_appointments': total, 'completed_appointments': completed, 'upcoming_appointments': upcoming}
+
+
+def measure(label, fn, conn, owner_column, ids):
+    timings = []
+    for owner_id in ids:
+        started = time.perf_counter()
+        fn(conn, owner_column, owner_id)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f'{label:<28} mean={mean * 1000:>7.3f} ms  p99={p99 * 1000:>7.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        print(f'Building {args.rows:,} appointments...')
+        build_db(path, args.rows, args.doctors, args.patients)
+
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        apply_pragmas(conn)
+        rnd = random.Random(2)
+        for owner_column, upper in (('DoctorID', args.doctors), ('PatientID', args.patients)):
+            ids = [rnd.randint(1, upper) for _ in range(args.calls)]
+            measure(f'{owner_column} old (3 x COUNT)', old_summary, conn, owner_column, ids)
+            measure(f'{owner_column} new (grouped)', appointment_summary, conn, owner_column, ids)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
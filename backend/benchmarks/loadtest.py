@@ -0,0 +1,254 @@
+"""Replay a realistic mix of patient and doctor API calls; report latency per route.
+
+    python generate_data.py --db /tmp/load.db --doctors 1000 --patients 100000 --appointments 1000000
+    python benchmarks/loadtest.py --db /tmp/load.db --users 32 --requests 5000
+    python benchmarks/loadtest.py --db /tmp/load.db --url http://localhost:5000 --json run.json
+
+Virtual users are accounts from a generate_data.py database (password
+patient123 / doctor123). Each logs in once, which is not measured, and
+then makes its share of --requests calls drawn from PATIENT_MIX or
+DOCTOR_MIX with its own RNG. The same arguments replay the same sequence
+of calls. Bookings take a slot from the user's last slot search, so some
+of them race other users and end in 409, which is counted separately
+from errors. Bookings also change the database, so regenerate it (same
+seed) before a run that must match an earlier one exactly.
+
+Without --url the app runs in this process through the Flask test client
+(the per-IP login limit is lifted). The client threads then share the GIL
+with the app, so compare runs made the same way. With --url the server's
+own rate limits apply; raise api.rate_limit_per_minute there first.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PATIENT_MIX = {
+    'login': 4, 'patient_dashboard': 25, 'patient_appointments': 15, 'patient_history': 15,
+    'slots': 20, 'book': 8, 'profile': 13,
+}
+DOCTOR_MIX = {'login': 4, 'doctor_dashboard': 40, 'doctor_appointments': 36, 'doctor_patient_history': 20}
+PASSWORDS = {'Patient': 'patient123', 'Doctor': 'doctor123'}
+# Slot searches look this many days ahead from today
+SLOT_SEARCH_DAYS = 7
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.conn.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+
+class VirtualUser:
+    def __init__(self, client, role, username, reference_id, rng, patient_ids, doctor_ids):
+        self.client = client
+        self.role = role
+        self.username = username
+        self.reference_id = reference_id
+        self.rng = rng
+        self.patient_ids = patient_ids
+        self.doctor_ids = doctor_ids
+        self.token = None
+        self.free_slots = []
+        mix = PATIENT_MIX if role == 'Patient' else DOCTOR_MIX
+        self.operations, self.weights = list(mix), list(mix.values())
+
+    def login(self):
+        status, body = self.client.request('POST', '/api/auth/login',
+                                           body={'username': self.username, 'password': PASSWORDS[self.role]})
+        if status == 200:
+            self.token = body['token']
+        return status
+
+    def call(self, operation):
+        """Run one operation; returns its HTTP status."""
+        me = self.reference_id
+        get = lambda path: self.client.request('GET', path, self.token)[0]   # noqa: E731
+        if operation == 'login':
+            return self.login()
+        if operation == 'patient_dashboard':
+            return get(f'/api/patient/dashboard/{me}/summary')
+        if operation == 'patient_appointments':
+            return get(f'/api/patient/appointments/{me}')
+        if operation == 'patient_history':
+            return get(f'/api/patient/history/{me}')
+        if operation == 'profile':
+            return get(f'/api/patient/profile/{me}')
+        if operation == 'slots':
+            status, body = self.client.request(
+                'GET', f'/api/patient/slots?doctor_id={self.rng.choice(self.doctor_ids)}'
+                       f'&days={SLOT_SEARCH_DAYS}&limit=5', self.token)
+            if status == 200:
+                self.free_slots = body.get('slots', [])
+            return status
+        if operation == 'book':
+            slot = self.free_slots.pop(0)
+            return self.client.request('POST', '/api/patient/appointments/book', self.token, {
+                'patient_id': me, 'doctor_id': slot['DoctorID'], 'date': slot['AppointmentDate'],
+            })[0]
+        if operation == 'doctor_dashboard':
+            return get(f'/api/doctor/dashboard/{me}/summary')
+        if operation == 'doctor_appointments':
+            return get(f'/api/doctor/appointments/{me}')
+        if operation == 'doctor_patient_history':
+            return get(f'/api/doctor/patients/{self.rng.choice(self.patient_ids)}/history')
+        raise ValueError(operation)
+
+    def run(self, count, results, lock):
+        local = {}
+        for _ in range(count):
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            if operation == 'book' and not self.free_slots:
+                operation = 'slots'
+            started = time.perf_counter()
+            status = self.call(operation)
+            elapsed = time.perf_counter() - started
+            entry = local.setdefault(operation, {'latencies': [], 'statuses': {}})
+            entry['latencies'].append(elapsed)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+        with lock:
+            for operation, entry in local.items():
+                merged = results.setdefault(operation, {'latencies': [], 'statuses': {}})
+                merged['latencies'].extend(entry['latencies'])
+                for status, n in entry['statuses'].items():
+                    merged['statuses'][status] = merged['statuses'].get(status, 0) + n
+
+
+def pick_accounts(db_path, rng, patients, doctors):
+    conn = sqlite3.connect(db_path)
+    max_patient = conn.execute('SELECT COALESCE(MAX(PatientID), 0) FROM Patient').fetchone()[0]
+    max_doctor = conn.execute('SELECT COALESCE(MAX(DoctorID), 0) FROM Doctor').fetchone()[0]
+
+    def accounts(role, table, key, top, count):
+        wanted = rng.sample(range(1, top + 1), min(top, count * 2))
+        marks = ','.join('?' * len(wanted))
+        rows = conn.execute(f'''
+            SELECT u.Username, u.ReferenceID FROM User u JOIN {table} t ON t.{key} = u.ReferenceID
+            WHERE u.Role = ? AND u.ReferenceID IN ({marks}) AND t.IsBlacklisted = 0
+        ''', [role] + wanted).fetchall()
+        order = {reference_id: i for i, reference_id in enumerate(wanted)}
+        return sorted(rows, key=lambda row: order[row[1]])[:count]
+
+    patient_accounts = accounts('Patient', 'Patient', 'PatientID', max_patient, patients)
+    doctor_accounts = accounts('Doctor', 'Doctor', 'DoctorID', max_doctor, doctors)
+    doctor_ids = [row[0] for row in conn.execute(
+        'SELECT DISTINCT DoctorID FROM DoctorAvailability ORDER BY DoctorID').fetchall()]
+    conn.close()
+    return patient_accounts, doctor_accounts, doctor_ids, max_patient
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def report(results, elapsed):
+    rows = []
+    total = 0
+    print(f"\n{'route':<24}{'calls':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for operation in sorted(results):
+        latencies = sorted(results[operation]['latencies'])
+        statuses = results[operation]['statuses']
+        total += len(latencies)
+        row = {
+            'route': operation, 'calls': len(latencies), 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50), 'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99), 'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        }
+        rows.append(row)
+        print(f"{operation:<24}{row['calls']:>7}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}  {' '.join(f'{k}:{v}' for k, v in row['statuses'].items())}")
+    print(f"{'total':<24}{total:>7}{total / elapsed:>9.1f}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='generate_data.py database (accounts are picked from it)')
+    parser.add_argument('--url', help='run against a server instead of in process')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--doctor-share', type=float, default=0.1, help='share of virtual users that are doctors')
+    parser.add_argument('--requests', type=int, default=4000, help='measured calls across all users')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the arguments and results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    doctors = max(1, round(args.users * args.doctor_share)) if args.doctor_share else 0
+    patient_accounts, doctor_accounts, doctor_ids, max_patient = pick_accounts(
+        args.db, rng, args.users - doctors, doctors)
+    if not doctor_ids or not patient_accounts:
+        print('No patients or doctor availability in this database; run generate_data.py first')
+        return 1
+
+    if args.url:
+        new_client = lambda: HttpClient(args.url)   # noqa: E731
+    else:
+        os.environ['HOSPITAL_DB_PATH'] = os.path.abspath(args.db)
+        import ratelimit
+        from app import app
+        ratelimit.request_limiter.limit = float('inf')
+        new_client = lambda: TestClient(app)   # noqa: E731
+
+    patient_ids = [row[1] for row in patient_accounts]
+    users = [
+        VirtualUser(new_client(), role, username, reference_id, random.Random(args.seed * 1000 + i),
+                    patient_ids or [1], doctor_ids)
+        for i, (role, (username, reference_id)) in enumerate(
+            [('Patient', account) for account in patient_accounts] + [('Doctor', account) for account in doctor_accounts])
+    ]
+    failed = [user.username for user in users if user.login() != 200]
+    if failed:
+        print(f'Login failed for {len(failed)} user(s), e.g. {failed[0]}')
+        return 1
+
+    print(f'{len(users)} users ({len(doctor_accounts)} doctors), {args.requests} requests, seed {args.seed}, '
+          f"{'against ' + args.url if args.url else 'in process'}")
+    results, lock = {}, threading.Lock()
+    per_user = args.requests // len(users)
+    threads = [threading.Thread(target=user.run, args=(per_user, results, lock)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rows = report(results, elapsed)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'patients_in_db': max_patient, 'seconds': elapsed, 'routes': rows}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
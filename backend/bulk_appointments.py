@@ -0,0 +1,175 @@
+"""Batch booking, cancellation and status changes applied in one transaction."""
+import bisect
+import datetime
+import slots
+from config import get_setting
+from pagination import APPOINTMENT_STATUSES
+
+MAX_BULK_OPERATIONS = get_setting('api', 'max_bulk_operations', 1000)
+
+OPERATIONS = ('book', 'cancel', 'status')
+
+
+class BulkError(ValueError):
+    pass
+
+
+def _ok(index, **extra):
+    return dict(index=index, ok=True, **extra)
+
+
+def _fail(index, code, message):
+    return {'index': index, 'ok': False, 'code': code, 'error': message}
+
+
+class _Batch:
+    """Plans a batch against the database state plus the operations before it.
+
+    Each operation is validated the way the single-item routes would
+    validate it, against the appointments, slots and day capacity as the
+    earlier operations in the batch leave them. Valid changes are collected
+    and written at the end in one executemany (status changes) plus one
+    INSERT per booking.
+    """
+
+    def __init__(self, conn, doctor_id=None):
+        self.conn = conn
+        self.doctor_id = doctor_id
+        self.appointments = {}   # AppointmentID -> {'DoctorID', 'AppointmentDate', 'Status'}
+        self.days = {}           # (DoctorID, date) -> {'starts': scheduled start minutes, 'load': live count}
+        self.blacklisted = {}    # PatientID -> bool
+        self.updates = []        # (Status, AppointmentID)
+        self.inserts = []        # (result, INSERT params)
+
+    def prefetch(self, operations):
+        ids = sorted({op.get('appointment_id') for op in operations
+                      if isinstance(op, dict) and isinstance(op.get('appointment_id'), int)})
+        for chunk in range(0, len(ids), 500):
+            part = ids[chunk:chunk + 500]
+            rows = self.conn.execute(f'''
+                SELECT AppointmentID, DoctorID, AppointmentDate, Status FROM Appointment
+                WHERE AppointmentID IN ({','.join('?' * len(part))})
+            ''', part).fetchall()
+            for row in rows:
+                self.appointments[row['AppointmentID']] = dict(row)
+
+    def day(self, doctor_id, date):
+        key = (doctor_id, date)
+        if key not in self.days:
+            starts = slots.scheduled_starts(self.conn, [doctor_id], datetime.date.fromisoformat(date))
+            row = self.conn.execute('SELECT Booked FROM DoctorDayLoad WHERE DoctorID = ? AND Day = ?',
+                                    (doctor_id, date)).fetchone()
+            self.days[key] = {'starts': starts.get(doctor_id, []), 'load': row[0] if row else 0}
+        return self.days[key]
+
+    def plan(self, index, op, allowed):
+        if not isinstance(op, dict) or op.get('op') not in allowed:
+            return _fail(index, 400, f"op must be one of: {', '.join(allowed)}")
+        if op['op'] == 'book':
+            return self.plan_book(index, op)
+        status = 'Cancelled' if op['op'] == 'cancel' else op.get('status')
+        if status not in APPOINTMENT_STATUSES:
+            return _fail(index, 400, 'Invalid status')
+        return self.plan_status(index, op.get('appointment_id'), status)
+
+    def plan_status(self, index, appointment_id, status):
+        appointment = self.appointments.get(appointment_id)
+        if appointment is None or (self.doctor_id is not None and appointment['DoctorID'] != self.doctor_id):
+            return _fail(index, 404, 'Appointment not found')
+
+        old = appointment['Status']
+        if old == status:
+            return _ok(index, appointment_id=appointment_id)
+
+        date = appointment['AppointmentDate'][:10]
+        start = slots.to_minutes(appointment['AppointmentDate'][11:16])
+        day = self.day(appointment['DoctorID'], date)
+        if status == 'Scheduled' and slots.overlaps(day['starts'], start):
+            return _fail(index, 409, 'Another appointment is already scheduled in this slot')
+        if old == 'Cancelled' and day['load'] >= slots.MAX_APPOINTMENTS_PER_DAY:
+            return _fail(index, 409, f'Doctor is fully booked on {date}')
+
+        if old == 'Scheduled':
+            day['starts'].remove(start)
+        if status == 'Scheduled':
+            bisect.insort(day['starts'], start)
+        day['load'] += (old == 'Cancelled') - (status == 'Cancelled')
+        appointment['Status'] = status
+        self.updates.append((status, appointment_id))
+        return _ok(index, appointment_id=appointment_id)
+
+    def plan_book(self, index, op):
+        patient_id, doctor_id = op.get('patient_id'), op.get('doctor_id')
+        if not isinstance(patient_id, int) or not isinstance(doctor_id, int) or not op.get('date'):
+            return _fail(index, 400, 'Missing fields')
+        try:
+            appointment_dt = datetime.datetime.strptime(op['date'], slots.DATE_FORMAT)
+        except (TypeError, ValueError):
+            return _fail(index, 400, 'Invalid date format. Use YYYY-MM-DD HH:MM')
+
+        if patient_id not in self.blacklisted:
+            row = self.conn.execute('SELECT IsBlacklisted FROM Patient WHERE PatientID = ?', (patient_id,)).fetchone()
+            self.blacklisted[patient_id] = bool(row and row['IsBlacklisted'] == 1)
+        if self.blacklisted[patient_id]:
+            return _fail(index, 403, 'Patient account is blacklisted')
+
+        start = appointment_dt.hour * 60 + appointment_dt.minute
+        if start not in slots.slot_grid(self.conn, doctor_id).get(appointment_dt.strftime('%A'), []):
+            return _fail(index, 400, 'Not an available slot for this doctor')
+        date = appointment_dt.strftime('%Y-%m-%d')
+        day = self.day(doctor_id, date)
+        if slots.overlaps(day['starts'], start):
+            return _fail(index, 409, 'This slot is already booked')
+        if day['load'] >= slots.MAX_APPOINTMENTS_PER_DAY:
+            return _fail(index, 409, f'Doctor is fully booked on {date}')
+
+        bisect.insort(day['starts'], start)
+        day['load'] += 1
+        result = _ok(index)
+        self.inserts.append((result, (appointment_dt.strftime(slots.DATE_FORMAT), patient_id, doctor_id)))
+        return result
+
+
+def changed_appointments(results):
+    """AppointmentIDs of the successful operations, for publishing their new state."""
+    return sorted({result['appointment_id'] for result in results if result['ok']})
+
+
+def apply_operations(conn, operations, doctor_id=None, allowed=OPERATIONS, atomic=False):
+    """Validate and apply a list of operations in a single write transaction.
+
+    Returns (results, committed): one result per operation, in order. Valid
+    operations are applied even if others fail, unless atomic is set, in
+    which case any failure rolls the whole batch back. doctor_id restricts
+    cancel/status operations to that doctor's appointments.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BulkError('operations must be a non-empty list')
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise BulkError(f'At most {MAX_BULK_OPERATIONS} operations per request')
+
+    batch = _Batch(conn, doctor_id)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        batch.prefetch(operations)
+        results = [batch.plan(index, op, allowed) for index, op in enumerate(operations)]
+        if atomic and not all(result['ok'] for result in results):
+            conn.rollback()
+            return results, False
+
+        # Status changes first: a batch may cancel an appointment and book its slot again
+        if batch.updates:
+            conn.executemany('UPDATE Appointment SET Status = ? WHERE AppointmentID = ?', batch.updates)
+        for result, params in batch.inserts:
+            result['appointment_id'] = conn.execute('''
+                INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status)
+                VALUES (?, ?, ?, 'Scheduled')
+            ''', params).lastrowid
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for doctor, date in batch.days:
+        slots.booking_index.forget(doctor, date)
+    return results, True
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from config import get_setting
+
+CACHE_ENABLED = get_setting('cache', 'enabled', True)
+CACHE_MAX_ENTRIES = get_setting('cache', 'max_entries', 1024)
+CACHE_TTL_SECONDS = get_setting('cache', 'ttl_seconds', 300)
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after ttl seconds.
+
+    Keys are tuples whose first element is a namespace ('departments',
+    'doctors', 'availability', ...). invalidate() drops every key that starts
+    with the given prefix, so a write route can clear exactly what it changed:
+    invalidate('availability', 3) for one doctor, invalidate('doctors') for
+    every cached page of the directory.
+
+    The cache is per process, so a write served by another worker does not
+    invalidate it. Callers that know the ResourceVersion counters of what
+    they load pass them as version: an entry is only served to a lookup
+    with the same version, and the loader runs after the counters were
+    read, so a value is never older than its version. Without a version,
+    the TTL bounds how long data changed elsewhere may be served.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, enabled=CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, value, version)
+        self._generation = 0            # bumped by every invalidation
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0, 'outdated': 0}
+
+    def get_or_load(self, key, loader, version=None):
+        if not self.enabled:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now and entry[2] == version:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats['expirations' if entry[0] <= now else 'outdated'] += 1
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation != self._generation:
+                # A write landed while we were loading; don't cache what may be stale
+                return value
+            self._entries[key] = (time.monotonic() + self.ttl, value, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return value
+
+    def invalidate(self, *prefix):
+        size = len(prefix)
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if key[:size] == prefix]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        ttl_seconds=self.ttl, enabled=self.enabled)
+
+
+# Departments, the doctor directory and doctor availability: read on every
+# dashboard load, changed only by a handful of admin/doctor routes
+reference_cache = TTLCache()
@@ -0,0 +1,132 @@
+"""Hammer one doctor's day with parallel writers and check the booking invariants.
+
+Several processes, each with its own SQLite connection, book every slot of
+the same day in random order and then churn (cancel / re-activate / book
+again). Afterwards the script checks that the day never holds more than
+max_appointments_per_day live appointments, that no slot is scheduled
+twice, and that the DoctorDayLoad ledger matches the Appointment table.
+Exits non-zero on any violation.
+
+    python check_capacity.py --workers 8 --capacity 10
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+import slots
+from appointment_stats import verify_day_load
+from database import apply_pragmas
+from db_init import init_db
+
+DAY = datetime.date(2030, 1, 7)   # a Monday
+PATIENTS = 50
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return apply_pragmas(conn)
+
+
+def seed(path):
+    init_db(path)
+    conn = connect(path)
+    doctor_id = conn.execute(
+        "INSERT INTO Doctor (Name, Specialization) VALUES ('Dr. Capacity', 'General')"
+    ).lastrowid
+    conn.execute("INSERT INTO DoctorAvailability (DoctorID, Day, StartTime, EndTime) VALUES (?, 'Monday', '08:00', '20:00')",
+                 (doctor_id,))
+    conn.executemany('INSERT INTO Patient (Name, Age, Gender) VALUES (?, 30, ?)',
+                     [(f'Patient {i}', 'Other') for i in range(PATIENTS)])
+    conn.commit()
+    conn.close()
+    return doctor_id
+
+
+def worker(path, doctor_id, capacity, rounds, seed_value):
+    slots.MAX_APPOINTMENTS_PER_DAY = capacity
+    rnd = random.Random(seed_value)
+    conn = connect(path)
+    outcomes = {'booked': 0, 'taken': 0, 'full': 0, 'cancelled': 0, 'reactivated': 0}
+    starts = list(slots.slot_grid(conn, doctor_id)['Monday'])
+
+    def book(start):
+        when = datetime.datetime.combine(DAY, datetime.time(start // 60, start % 60))
+        try:
+            slots.book_slot(conn, rnd.randint(1, PATIENTS), doctor_id, when)
+            outcomes['booked'] += 1
+        except slots.SlotTaken:
+            outcomes['taken'] += 1
+        except slots.DayFull:
+            outcomes['full'] += 1
+
+    rnd.shuffle(starts)
+    for start in starts:
+        book(start)
+
+    for _ in range(rounds):
+        ids = [row[0] for row in conn.execute('SELECT AppointmentID FROM Appointment WHERE DoctorID = ?', (doctor_id,))]
+        action = rnd.random()
+        try:
+            if action < 0.4 and ids:
+                slots.set_status(conn, rnd.choice(ids), 'Cancelled')
+                outcomes['cancelled'] += 1
+            elif action < 0.6 and ids:
+                slots.set_status(conn, rnd.choice(ids), 'Scheduled')
+                outcomes['reactivated'] += 1
+            else:
+                book(rnd.choice(starts))
+        except slots.SlotTaken:
+            outcomes['taken'] += 1
+        except slots.DayFull:
+            outcomes['full'] += 1
+    conn.close()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--capacity', type=int, default=10, help='max_appointments_per_day for the run')
+    parser.add_argument('--rounds', type=int, default=200, help='cancel/re-activate/book operations per worker')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'capacity_check.db')
+    doctor_id = seed(path)
+
+    with multiprocessing.Pool(args.workers) as workers:
+        results = workers.starmap(worker, [
+            (path, doctor_id, args.capacity, args.rounds, seed_value) for seed_value in range(args.workers)
+        ])
+
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    print(f'{args.workers} writers: ' + ', '.join(f'{key} {value}' for key, value in totals.items()))
+
+    conn = connect(path)
+    failures = []
+    live = conn.execute("SELECT COUNT(*) FROM Appointment WHERE DoctorID = ? AND Status != 'Cancelled'",
+                        (doctor_id,)).fetchone()[0]
+    if live > args.capacity:
+        failures.append(f'{live} live appointments exceed capacity {args.capacity}')
+    doubled = conn.execute('''
+        SELECT AppointmentDate, COUNT(*) FROM Appointment
+        WHERE DoctorID = ? AND Status = 'Scheduled' GROUP BY AppointmentDate HAVING COUNT(*) > 1
+    ''', (doctor_id,)).fetchall()
+    failures.extend(f'{row[0]} scheduled {row[1]} times' for row in doubled)
+    failures.extend(f'ledger {day}: stored {stored}, actual {actual}'
+                    for _, day, stored, actual in verify_day_load(conn))
+    conn.close()
+
+    print(f'{live} live appointments, capacity {args.capacity}')
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
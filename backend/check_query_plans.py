@@ -0,0 +1,220 @@
+"""Run EXPLAIN QUERY PLAN on the SQL issued by every API route.
+
+Each route is called once through the Flask test client against a scratch
+database; every SELECT / UPDATE / DELETE it executes is captured and its plan
+checked. The script exits non-zero if a statement falls back to a full table
+SCAN (outside the allow-list below) or if an API route is not exercised.
+
+    python check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp()
+os.environ['HOSPITAL_DB_PATH'] = os.path.join(SCRATCH_DIR, 'plan_check.db')
+
+import sqlite3  # noqa: E402
+from flask import request  # noqa: E402
+
+import database  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+from db_init import init_db  # noqa: E402
+
+# Endpoints that list a whole (small) reference table on purpose
+FULL_SCAN_ALLOWED = {
+    'admin.get_departments': {'Department'},
+    # One row per AUTOINCREMENT table
+    'admin.import_records': {'sqlite_sequence'},
+}
+
+# (method, url, json body) for every API route
+ROUTE_CALLS = [
+    ('POST', '/api/auth/login', {'username': 'arjun', 'password': 'patient123'}),
+    ('POST', '/api/auth/register', {'username': 'plancheck', 'password': 'pw', 'name': 'Plan Check',
+                                    'age': 40, 'gender': 'Other'}),
+
+    ('GET', '/api/admin/doctors', None),
+    ('GET', f'/api/admin/doctors?limit=1&cursor={encode_cursor([1])}', None),
+    ('POST', '/api/admin/doctors', {'name': 'Dr. Plan', 'specialization': 'General', 'department_id': 1,
+                                    'email': 'plan@hospital.com'}),
+    ('PUT', '/api/admin/doctors/2', {'contact': '123'}),
+    ('PUT', '/api/admin/doctors/2/blacklist', {'status': 0}),
+    ('GET', '/api/admin/patients', None),
+    ('GET', '/api/admin/patients?stream=1', None),
+    ('PUT', '/api/admin/patients/2', {'contact': '456'}),
+    ('PUT', '/api/admin/patients/2/blacklist', {'status': 0}),
+    ('GET', '/api/admin/patients/1/history', None),
+    ('GET', '/api/admin/patients/1/history?archived=1', None),
+    ('GET', '/api/admin/doctors/search?q=neh', None),
+    ('GET', '/api/admin/patients/search?q=arj', None),
+    ('GET', '/api/admin/departments', None),
+    ('POST', '/api/admin/departments', {'name': 'Radiology', 'location': 'Block D'}),
+    ('PUT', '/api/admin/departments/4', {'location': 'Block E'}),
+    ('DELETE', '/api/admin/departments/4', None),
+    ('GET', '/api/admin/appointments', None),
+    ('GET', f'/api/admin/appointments?archived=1&limit=1&cursor={encode_cursor(["2031-01-01 10:00", 9])}', None),
+    ('GET', '/api/admin/appointments?status=Scheduled&date_from=2030-01-01&date_to=2030-01-31&limit=1'
+            f'&cursor={encode_cursor(["2030-01-02 10:00", 2])}', None),
+    ('GET', '/api/admin/appointments?doctor_id=1&limit=1', None),
+    ('GET', '/api/admin/appointments?stream=1&status=Completed', None),
+    ('PUT', '/api/admin/appointments/2/status', {'status': 'Completed'}),
+    ('POST', '/api/admin/appointments/bulk', {'operations': [
+        {'op': 'cancel', 'appointment_id': 1},
+        {'op': 'status', 'appointment_id': 1, 'status': 'Scheduled'},
+        {'op': 'book', 'patient_id': 1, 'doctor_id': 1, 'date': '2030-01-07 11:00'},
+    ]}),
+    # A JSON body is read as a one-record NDJSON file
+    ('POST', '/api/admin/import/patients', {'name': 'Imported', 'age': 30, 'gender': 'Female', 'contact': '1',
+                                            'username': 'imported', 'password_hash': 'scrypt$2$8$1$AA$AA'}),
+    ('POST', '/api/admin/import/appointments', {'patient_id': 1, 'doctor_id': 2, 'date': '2029-05-01 09:00',
+                                                'status': 'Completed'}),
+    ('POST', '/api/admin/import/history', {'appointment_id': 1, 'tests': 'X-ray'}),
+    ('GET', '/api/admin/export/appointments', None),
+    ('GET', '/api/admin/export/patients?format=columnar&after_id=1&compress=none', None),
+    ('GET', '/api/admin/system/db-pool', None),
+    ('GET', '/api/admin/system/cache', None),
+    ('GET', '/api/admin/system/password-hashing', None),
+    ('GET', '/api/admin/system/rate-limits', None),
+    ('GET', '/api/admin/system/events', None),
+    ('GET', '/api/admin/system/cache?profile=1', None),
+    ('GET', '/api/admin/system/archive', None),
+    ('POST', '/api/admin/system/archive', None),
+    ('GET', '/api/admin/system/backups', None),
+    ('POST', '/api/admin/system/backups', None),
+    ('GET', '/api/admin/system/profiles', None),
+    ('GET', '/api/admin/system/profiles/continuous', None),
+    ('GET', '/api/admin/system/profiles/missing', None),
+
+    ('GET', '/api/doctor/appointments/1', None),
+    ('GET', '/api/doctor/appointments/1?archived=1', None),
+    ('GET', f'/api/doctor/appointments/1?status=Scheduled&limit=1&cursor={encode_cursor(["2030-01-01 10:00", 1])}',
+     None),
+    ('PUT', '/api/doctor/appointments/1/status', {'status': 'Completed'}),
+    ('POST', '/api/doctor/appointments/1/bulk', {'operations': [{'op': 'status', 'appointment_id': 1, 'status': 'Completed'}]}),
+    ('POST', '/api/doctor/appointments/1/history', {'patient_id': 1, 'tests': 'ECG', 'medicine': 'Aspirin'}),
+    ('GET', '/api/doctor/patients/1/history', None),
+    ('GET', '/api/doctor/patients/1/history?archived=1', None),
+    ('GET', '/api/doctor/dashboard/1/summary', None),
+    ('POST', '/api/doctor/1/availability', {'day': 'Tuesday', 'start_time': '09:00', 'end_time': '12:00'}),
+    ('GET', '/api/doctor/1/availability', None),
+    ('PUT', '/api/doctor/availability/2', {'end_time': '13:00'}),
+    ('DELETE', '/api/doctor/availability/2', None),
+
+    ('GET', '/api/patient/profile/1', None),
+    ('PUT', '/api/patient/profile/1', {'name': 'Arjun Mehta', 'age': 28, 'gender': 'Male', 'contact': '999'}),
+    ('GET', '/api/patient/appointments/1', None),
+    ('GET', '/api/patient/appointments/1?archived=1', None),
+    ('POST', '/api/patient/appointments/book', {'patient_id': 1, 'doctor_id': 1, 'date': '2030-01-07 10:00'}),
+    ('PUT', '/api/patient/appointments/3/cancel', None),
+    ('GET', '/api/patient/slots?doctor_id=1&limit=5', None),
+    ('GET', '/api/patient/slots?specialization=cardiology', None),
+    ('GET', '/api/patient/slots?department_id=1&date_from=2030-01-07&days=7', None),
+    ('GET', '/api/patient/history/1', None),
+    ('GET', '/api/patient/history/1?archived=1', None),
+    ('GET', f'/api/patient/history/1?limit=1&cursor={encode_cursor(["2031-01-01 10:00", 9])}', None),
+    ('GET', '/api/patient/dashboard/1/summary', None),
+    ('GET', '/api/patient/doctor/1', None),
+
+    ('GET', '/api/events/stream?timeout=0', None),
+    ('GET', '/api/events/poll?wait=0', None),
+
+    ('DELETE', '/api/admin/doctors/3', None),
+    ('DELETE', '/api/admin/patients/3', None),
+]
+
+PLANNED_STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def seed(db_path):
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO DoctorAvailability (DoctorID, Day, StartTime, EndTime) VALUES (?, ?, ?, ?)',
+                     [(1, 'Monday', '09:00', '17:00')])
+    conn.executemany('INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status) VALUES (?, ?, ?, ?)',
+                     [('2030-01-01 10:00', 1, 1, 'Scheduled'),
+                      ('2030-01-02 10:00', 2, 1, 'Scheduled'),
+                      ('2030-01-03 10:00', 1, 2, 'Scheduled'),
+                      # Old enough for the archive job
+                      ('2020-01-03 10:00', 1, 2, 'Completed')])
+    conn.executemany('INSERT INTO History (AppointmentID, PatientID, Tests) VALUES (?, ?, ?)',
+                     [(1, 1, 'Blood test'), (4, 1, 'MRI')])
+    conn.commit()
+    conn.close()
+
+
+class TracingPool(database.ConnectionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = []
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def _trace(self, sql):
+        if PLANNED_STATEMENT.match(sql):
+            self.statements.append((request.endpoint, sql))
+
+
+def table_aliases(sql):
+    # Map "FROM Appointment a" style aliases back to table names
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in ('WHERE', 'JOIN', 'ON', 'SET', 'ORDER', 'LEFT', 'INNER', 'GROUP'):
+            aliases[alias] = table
+    return aliases
+
+
+def main():
+    db_path = os.environ['HOSPITAL_DB_PATH']
+    seed(db_path)
+
+    database.pool = TracingPool(db_path)
+    from app import app
+    from tokens import issue_token
+
+    # Admin may call every route
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {issue_token(1, 'Admin', None)}"
+    for method, url, body in ROUTE_CALLS:
+        response = client.open(url, method=method, json=body)
+        # Drain streamed bodies so all their queries run inside the request
+        response.get_data()
+        response.close()
+        if response.status_code >= 500:
+            print(f'WARN {method} {url} -> {response.status_code}')
+
+    failures = []
+    exercised = set()
+    plan_conn = sqlite3.connect(db_path)
+    for endpoint, sql in database.pool.statements:
+        exercised.add(endpoint)
+        aliases = table_aliases(sql)
+        for row in plan_conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+            match = FULL_SCAN.match(row[3])
+            if not match:
+                continue
+            table = aliases.get(match.group(1), match.group(1))
+            if table in FULL_SCAN_ALLOWED.get(endpoint, set()):
+                continue
+            failures.append(f'{endpoint}: {row[3]}\n    {" ".join(sql.split())}')
+    plan_conn.close()
+
+    api_endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.rule.startswith('/api/')}
+    called = {app.url_map.bind('').match(url.split('?')[0], method=method)[0] for method, url, _ in ROUTE_CALLS}
+    for endpoint in sorted(api_endpoints - called):
+        failures.append(f'{endpoint}: route not exercised by check_query_plans.py')
+
+    print(f'Checked {len(database.pool.statements)} statements from {len(exercised)} endpoints')
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
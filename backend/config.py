@@ -0,0 +1,19 @@
+import os
+import yaml
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yaml')
+
+
+def load_config(path=CONFIG_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+config = load_config()
+
+
+def get_setting(section, key, default=None):
+    value = (config.get(section) or {}).get(key)
+    return default if value is None else value
@@ -0,0 +1,255 @@
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from config import get_setting
+from metrics import SQL_TIMING, TimedConnection
+
+DB_PATH = os.environ.get(
+    'HOSPITAL_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hospital.db'),
+)
+
+# Upper bound on open SQLite handles and how long a request waits for one
+POOL_MAX_CONNECTIONS = get_setting('database', 'pool_max_connections', 10)
+POOL_CHECKOUT_TIMEOUT = get_setting('database', 'pool_timeout_seconds', 30)
+
+# Tuning applied to every connection; the `database.pragmas` section of
+# config.yaml overrides individual entries. WAL lets readers proceed while a
+# writer commits, and synchronous=NORMAL is durable under WAL except for
+# the last transactions before a power loss.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,       # ms to wait on a locked database
+    'cache_size': -65536,       # negative = KiB, i.e. 64 MB page cache
+    'mmap_size': 268435456,     # 256 MB memory-mapped reads
+    'temp_store': 'memory',
+}
+
+PRAGMAS = dict(DEFAULT_PRAGMAS, **get_setting('database', 'pragmas', {}))
+
+_PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+_PRAGMA_VALUE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def apply_pragmas(conn, pragmas=None):
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        if isinstance(value, bool):
+            value = int(value)
+        if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f'Invalid pragma setting {name} = {value!r}')
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+    return conn
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Thin proxy around a pooled sqlite3 connection.
+
+    Routes keep calling ``conn.close()`` when they are done; for a pooled
+    connection that hands the handle back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._raw.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        self._pool.release()
+
+
+class ConnectionPool:
+    def __init__(self, db_path, max_connections=POOL_MAX_CONNECTIONS, timeout=POOL_CHECKOUT_TIMEOUT):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._idle = []          # raw connections not checked out by anyone
+        self._open = 0           # idle + checked out
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'reuses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+
+    # === connection lifecycle ===
+
+    def _connect(self):
+        # TimedConnection records every statement for /metrics and the slow-query log
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               factory=TimedConnection if SQL_TIMING else sqlite3.Connection)
+        conn.row_factory = sqlite3.Row
+        try:
+            return apply_pragmas(conn)
+        except BaseException:
+            conn.close()
+            raise
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        # Called without the lock: closing the last connection checkpoints the WAL
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def _take_idle(self):
+        # Prefer the handle this thread used last so its page cache stays warm
+        last = getattr(self._local, 'last', None)
+        if last is not None and last in self._idle:
+            self._idle.remove(last)
+            return last
+        return self._idle.pop() if self._idle else None
+
+    def acquire(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            # Nested checkout on the same thread shares the handle
+            self._local.depth += 1
+            return held
+
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            self._stats['checkouts'] += 1
+        while True:
+            # Only picking a handle or reserving a slot happens under the lock:
+            # opening one (pragmas may wait on busy_timeout) and probing it do
+            # not hold up other checkouts and releases
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout('Connection pool is closed')
+                    raw = self._take_idle()
+                    if raw is not None:
+                        break
+                    if self._open < self.max_connections:
+                        self._open += 1
+                        break
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'No database connection available after {self.timeout}s')
+
+            if raw is None:
+                try:
+                    raw = self._connect()
+                except BaseException:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                break
+            if self._is_healthy(raw):
+                with self._cond:
+                    self._stats['reuses'] += 1
+                break
+            self._discard(raw)
+
+        held = PooledConnection(self, raw)
+        self._local.conn = held
+        self._local.depth = 1
+        self._local.last = raw
+        return held
+
+    def release(self):
+        held = getattr(self._local, 'conn', None)
+        if held is None:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        raw = held._raw
+
+        # Never hand an open transaction to the next request
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            healthy = True
+        except sqlite3.Error:
+            healthy = False
+
+        with self._cond:
+            keep = healthy and not self._closed
+            if keep:
+                self._idle.append(raw)
+                self._cond.notify()
+        if not keep:
+            self._discard(raw)
+
+    def release_thread(self):
+        # Return whatever this thread still holds, regardless of nesting depth
+        if getattr(self._local, 'conn', None) is not None:
+            self._local.depth = 1
+            self.release()
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return dict(
+                self._stats,
+                open=self._open,
+                idle=idle,
+                in_use=self._open - idle,
+                max_connections=self.max_connections,
+            )
+
+
+pool = ConnectionPool(DB_PATH)
+atexit.register(pool.close_all)
+
+
+def get_db_connection():
+    return pool.acquire()
+
+
+def init_app(app):
+    @app.teardown_appcontext
+    def release_db_connection(exc):
+        pool.release_thread()
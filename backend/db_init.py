@@ -1,9 +1,12 @@
 import sqlite3
+from appointment_stats import rebuild_day_load, rebuild_stats
+from database import apply_pragmas
+from passwords import hash_password
 
-def init_db():
-    conn = sqlite3.connect('hospital.db')
-    cursor = conn.cursor()
+# Tables whose writes bump a ResourceVersion counter (used for HTTP ETags)
+VERSIONED_TABLES = ['Department', 'Patient', 'Doctor', 'Appointment', 'History', 'DoctorAvailability', 'User']
 
+def create_tables(cursor):
     # === TABLE CREATION ===
 
     cursor.execute('''
@@ -65,6 +68,30 @@ def init_db():
     )
 ''')
 
+    # === ARCHIVE (see archive.py) ===
+    # Finished appointments and their History past archive_after_days, moved
+    # here with their ids; no AUTOINCREMENT, the ids come from the hot tables
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS AppointmentArchive (
+        AppointmentID INTEGER PRIMARY KEY,
+        AppointmentDate TEXT NOT NULL,
+        PatientID INTEGER,
+        DoctorID INTEGER,
+        Status TEXT CHECK(Status IN ('Completed','Cancelled'))
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS HistoryArchive (
+        HistoryID INTEGER PRIMARY KEY,
+        AppointmentID INTEGER,
+        PatientID INTEGER,
+        Tests TEXT,
+        MedicineName TEXT,
+        Instructions TEXT
+    )
+    ''')
+
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS User (
         UserID INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -86,7 +113,267 @@ def init_db():
     )
     ''')
 
+    # Per-doctor / per-patient appointment counts by status, kept current by
+    # the triggers in create_triggers() (see appointment_stats.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS AppointmentStats (
+        OwnerType TEXT NOT NULL CHECK(OwnerType IN ('Doctor','Patient')),
+        OwnerID INTEGER NOT NULL,
+        Status TEXT NOT NULL,
+        Count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (OwnerType, OwnerID, Status)
+    ) WITHOUT ROWID
+    ''')
+
+    # === DOCTOR DAY LOAD (maintained by triggers) ===
+    # Appointments that are not cancelled, per doctor and day, so
+    # max_appointments_per_day is checked with one primary-key lookup
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS DoctorDayLoad (
+        DoctorID INTEGER NOT NULL,
+        Day TEXT NOT NULL,
+        Booked INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (DoctorID, Day)
+    ) WITHOUT ROWID
+    ''')
+
+    # One change counter per table, bumped by triggers on every write
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ResourceVersion (
+        Resource TEXT PRIMARY KEY,
+        Version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    cursor.executemany('INSERT OR IGNORE INTO ResourceVersion (Resource, Version) VALUES (?, 0)',
+                       [(table,) for table in VERSIONED_TABLES])
+
+    # Full-text indexes for the admin search box. They are external-content
+    # tables: only the index is stored, rows are read back from Doctor/Patient.
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS DoctorSearch USING fts5(
+        Name, Specialization, Contact, Email,
+        content='Doctor', content_rowid='DoctorID', prefix='2 3'
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS PatientSearch USING fts5(
+        Name, Contact, Address,
+        content='Patient', content_rowid='PatientID', prefix='2 3'
+    )
+    ''')
+
+
+def create_indexes(cursor):
+    # === SECONDARY INDEXES ===
+    # One per hot WHERE / JOIN / ORDER BY access path. The list indexes carry
+    # the selected columns too, so the per-doctor and per-patient appointment
+    # lists are answered from the index without touching the table.
+
+    cursor.executescript('''
+    CREATE INDEX IF NOT EXISTS idx_appointment_doctor_date
+        ON Appointment (DoctorID, AppointmentDate, Status, PatientID);
+    CREATE INDEX IF NOT EXISTS idx_appointment_patient_date
+        ON Appointment (PatientID, AppointmentDate, Status, DoctorID);
+    CREATE INDEX IF NOT EXISTS idx_appointment_doctor_status
+        ON Appointment (DoctorID, Status);
+    CREATE INDEX IF NOT EXISTS idx_appointment_patient_status
+        ON Appointment (PatientID, Status);
+    CREATE INDEX IF NOT EXISTS idx_appointment_status_date
+        ON Appointment (Status, AppointmentDate);
+    CREATE INDEX IF NOT EXISTS idx_appointment_date
+        ON Appointment (AppointmentDate);
+
+    CREATE INDEX IF NOT EXISTS idx_history_patient
+        ON History (PatientID, AppointmentID);
+    CREATE INDEX IF NOT EXISTS idx_history_appointment
+        ON History (AppointmentID);
+
+    CREATE INDEX IF NOT EXISTS idx_appointment_archive_doctor_date
+        ON AppointmentArchive (DoctorID, AppointmentDate, Status, PatientID);
+    CREATE INDEX IF NOT EXISTS idx_appointment_archive_patient_date
+        ON AppointmentArchive (PatientID, AppointmentDate, Status, DoctorID);
+    CREATE INDEX IF NOT EXISTS idx_appointment_archive_date
+        ON AppointmentArchive (AppointmentDate);
+    CREATE INDEX IF NOT EXISTS idx_history_archive_patient
+        ON HistoryArchive (PatientID, AppointmentID);
+    CREATE INDEX IF NOT EXISTS idx_history_archive_appointment
+        ON HistoryArchive (AppointmentID);
+
+    CREATE INDEX IF NOT EXISTS idx_availability_doctor_day
+        ON DoctorAvailability (DoctorID, Day, StartTime, EndTime);
+
+    CREATE INDEX IF NOT EXISTS idx_user_reference
+        ON User (ReferenceID, Role);
+
+    CREATE INDEX IF NOT EXISTS idx_doctor_department
+        ON Doctor (DepartmentID);
+
+    CREATE INDEX IF NOT EXISTS idx_doctor_specialization
+        ON Doctor (Specialization COLLATE NOCASE);
+    ''')
+
+    # A doctor can have only one Scheduled appointment per slot start
+    try:
+        cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_doctor_slot
+            ON Appointment (DoctorID, AppointmentDate) WHERE Status = 'Scheduled'
+        ''')
+    except sqlite3.IntegrityError:
+        # Pre-existing double bookings; book_slot()'s locked overlap check still applies
+        print('Warning: duplicate scheduled appointments found, idx_appointment_doctor_slot not created')
+
+
+def _stats_row(owner_type, owner, status, delta):
+    # Add delta to one AppointmentStats counter; owner/status are OLD.* or NEW.* columns
+    return f'''
+        INSERT INTO AppointmentStats (OwnerType, OwnerID, Status, Count)
+        SELECT '{owner_type}', {owner}, {status}, {delta} WHERE {owner} IS NOT NULL
+        ON CONFLICT (OwnerType, OwnerID, Status) DO UPDATE SET Count = Count + {delta};'''
+
+
+def _day_load_row(doctor, date, status, delta):
+    # Add delta to one DoctorDayLoad entry unless the appointment is cancelled
+    return f'''
+        INSERT INTO DoctorDayLoad (DoctorID, Day, Booked)
+        SELECT {doctor}, substr({date}, 1, 10), {delta}
+        WHERE {doctor} IS NOT NULL AND {status} IS NOT 'Cancelled'
+        ON CONFLICT (DoctorID, Day) DO UPDATE SET Booked = Booked + {delta};'''
+
+
+def create_triggers(cursor):
+    # === APPOINTMENT COUNTER TRIGGERS ===
+    # Every insert, delete and status/owner change on Appointment adjusts the
+    # matching AppointmentStats rows in the same transaction.
+
+    cursor.executescript(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_insert
+    AFTER INSERT ON Appointment
+    BEGIN
+        {_stats_row('Doctor', 'NEW.DoctorID', 'NEW.Status', 1)}
+        {_stats_row('Patient', 'NEW.PatientID', 'NEW.Status', 1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_delete
+    AFTER DELETE ON Appointment
+    BEGIN
+        {_stats_row('Doctor', 'OLD.DoctorID', 'OLD.Status', -1)}
+        {_stats_row('Patient', 'OLD.PatientID', 'OLD.Status', -1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_stats_update
+    AFTER UPDATE OF Status, DoctorID, PatientID ON Appointment
+    WHEN OLD.Status IS NOT NEW.Status
+      OR OLD.DoctorID IS NOT NEW.DoctorID
+      OR OLD.PatientID IS NOT NEW.PatientID
+    BEGIN
+        {_stats_row('Doctor', 'OLD.DoctorID', 'OLD.Status', -1)}
+        {_stats_row('Patient', 'OLD.PatientID', 'OLD.Status', -1)}
+        {_stats_row('Doctor', 'NEW.DoctorID', 'NEW.Status', 1)}
+        {_stats_row('Patient', 'NEW.PatientID', 'NEW.Status', 1)}
+    END;
+    ''')
+
+    # === DOCTOR DAY LOAD TRIGGERS ===
+
+    cursor.executescript(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_day_load_insert
+    AFTER INSERT ON Appointment
+    BEGIN
+        {_day_load_row('NEW.DoctorID', 'NEW.AppointmentDate', 'NEW.Status', 1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_day_load_delete
+    AFTER DELETE ON Appointment
+    BEGIN
+        {_day_load_row('OLD.DoctorID', 'OLD.AppointmentDate', 'OLD.Status', -1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_appointment_day_load_update
+    AFTER UPDATE OF Status, DoctorID, AppointmentDate ON Appointment
+    WHEN OLD.Status IS NOT NEW.Status
+      OR OLD.DoctorID IS NOT NEW.DoctorID
+      OR OLD.AppointmentDate IS NOT NEW.AppointmentDate
+    BEGIN
+        {_day_load_row('OLD.DoctorID', 'OLD.AppointmentDate', 'OLD.Status', -1)}
+        {_day_load_row('NEW.DoctorID', 'NEW.AppointmentDate', 'NEW.Status', 1)}
+    END;
+    ''')
+
+    # === RESOURCE VERSION TRIGGERS ===
+
+    for table in VERSIONED_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_version_{table.lower()}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE ResourceVersion SET Version = Version + 1 WHERE Resource = '{table}';
+            END
+            ''')
+
+    # === SEARCH INDEX TRIGGERS ===
+
+    for table, key, columns in (
+        ('Doctor', 'DoctorID', ['Name', 'Specialization', 'Contact', 'Email']),
+        ('Patient', 'PatientID', ['Name', 'Contact', 'Address']),
+    ):
+        fts = f'{table}Search'
+        cols = ', '.join(columns)
+        new_vals = ', '.join(f'NEW.{c}' for c in columns)
+        old_vals = ', '.join(f'OLD.{c}' for c in columns)
+        cursor.executescript(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{fts.lower()}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.{key}, {new_vals});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_{fts.lower()}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.{key}, {old_vals});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_{fts.lower()}_update AFTER UPDATE OF {cols} ON {table}
+        BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.{key}, {old_vals});
+            INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.{key}, {new_vals});
+        END;
+        ''')
+
+
+def upgrade_schema(db_path='hospital.db'):
+    # Bring an existing database up to the current schema without sample data
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    cursor = conn.cursor()
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    create_tables(cursor)
+    create_indexes(cursor)
+    create_triggers(cursor)
+    # Logins look users up by Username alone (the UNIQUE index); a copy of
+    # every password hash in an index only cost space and writes
+    cursor.execute('DROP INDEX IF EXISTS idx_user_username_password')
+
+    # Derived tables start empty on a database that predates them
+    if 'AppointmentStats' not in existing:
+        rebuild_stats(conn)
+    if 'DoctorDayLoad' not in existing:
+        rebuild_day_load(conn)
+    for fts in ('DoctorSearch', 'PatientSearch'):
+        if fts not in existing:
+            cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
+
+
+def init_db(db_path='hospital.db'):
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    cursor = conn.cursor()
 
+    create_tables(cursor)
+    create_indexes(cursor)
+    create_triggers(cursor)
     conn.commit()
 
     # === SAMPLE DATA INSERTION ===
@@ -124,16 +411,16 @@ def init_db():
         INSERT OR IGNORE INTO User (Username, Password, Role, ReferenceID)
         VALUES (?, ?, ?, ?)
     ''', [
-        ('admin', 'admin123', 'Admin', None),
-        ('aksheth', 'doctor123', 'Doctor', 1),
-        ('neha', 'doctor123', 'Doctor', 2),
-        ('arjun', 'patient123', 'Patient', 1),
-        ('priya', 'patient123', 'Patient', 2)
+        ('admin', hash_password('admin123'), 'Admin', None),
+        ('aksheth', hash_password('doctor123'), 'Doctor', 1),
+        ('neha', hash_password('doctor123'), 'Doctor', 2),
+        ('arjun', hash_password('patient123'), 'Patient', 1),
+        ('priya', hash_password('patient123'), 'Patient', 2)
     ])
 
     conn.commit()
     conn.close()
-    print("Database initialized successfully with sample data: hospital.db")
+    print(f"Database initialized successfully with sample data: {db_path}")
 
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,62 @@
+import datetime
+import functools
+import hashlib
+from flask import g, make_response, request
+from database import get_db_connection
+
+
+def current_versions(conn, resources):
+    rows = conn.execute(
+        f"SELECT Resource, Version FROM ResourceVersion WHERE Resource IN ({','.join('?' * len(resources))})",
+        resources
+    ).fetchall()
+    versions = {row['Resource']: row['Version'] for row in rows}
+    return [versions.get(resource, 0) for resource in resources]
+
+
+def resource_versions():
+    """The counters conditional() read for this request, as a reference_cache version."""
+    return g.get('resource_versions')
+
+
+def conditional(*resources, per_minute=False):
+    """Serve a GET route with an ETag and answer If-None-Match with 304.
+
+    The ETag is derived from the request URL and the ResourceVersion counters
+    of the tables the route reads, so an unchanged resource costs a single
+    primary-key lookup instead of the route's query and JSON encoding. The
+    counters are read before the route runs: a write that lands in between
+    only makes the next request miss, never serves stale data. A route that
+    keeps its body in reference_cache passes resource_versions() as the
+    entry's version, so a body cached before a write made by another worker
+    is not served under the new ETag.
+    per_minute mixes in the current minute for responses that depend on the
+    clock (today's counts, the next upcoming appointment).
+    """
+    resources = list(resources)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            conn = get_db_connection()
+            versions = current_versions(conn, resources)
+            conn.close()
+            g.resource_versions = tuple(zip(resources, versions))
+
+            parts = [request.full_path] + [f'{r}={v}' for r, v in zip(resources, versions)]
+            if per_minute:
+                parts.append(datetime.datetime.now().strftime('%Y-%m-%d %H:%M'))
+            etag = hashlib.blake2b('|'.join(parts).encode(), digest_size=12).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate on every use
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
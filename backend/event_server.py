@@ -0,0 +1,291 @@
+"""/api/events served from one asyncio loop, so idle subscribers hold no thread.
+
+Served by the app, an open stream or a waiting long-poll blocks a request
+thread in EventHub.wait() for as long as it lasts. The event server answers
+the same two endpoints on its own port (api.events_port) from a single
+thread: a subscriber is a socket and a parked coroutine, and publish()
+reaches the loop with one call_soon_threadsafe() per event, which wakes only
+the scopes the event is for. Open streams are bounded by
+events_max_subscribers and the process's open-file limit, which start()
+raises to its hard limit.
+
+It runs inside the app process, because the event buffer is per process.
+The dev server starts it next to the app; under a WSGI server call
+event_server.start() once per worker (workers share the port through
+SO_REUSEPORT, each still only seeing the writes it served). While it runs,
+the app answers /api/events/* with a 307 to it, which EventSource and
+?token= pollers follow; clients sending an Authorization header should
+call it directly, since browsers drop that header on a cross-origin
+redirect. With api.events_port set to 0 the app serves the events itself.
+
+The server speaks just enough HTTP/1.1 for these GETs: one request per
+connection, the token as a Bearer header or ?token=, CORS for any origin
+(as the app allows) and no TLS, so put it behind the same proxy as the app.
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+from config import get_setting
+from events import (
+    HEARTBEAT_SECONDS, MAX_STREAM_SECONDS, MAX_WAIT_SECONDS, event_hub, format_sse, seconds_arg, subscriber_scope,
+)
+from tokens import REQUIRE_AUTH, TokenError, decode_token, revocations
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+EVENTS_HOST = get_setting('server', 'host', 'localhost')
+EVENTS_PORT = get_setting('api', 'events_port', 5001)
+
+ROLES = ('Admin', 'Doctor', 'Patient')
+STREAM_PATH = '/api/events/stream'
+POLL_PATH = '/api/events/poll'
+
+# The request line and headers must arrive within this long and fit in this many bytes
+REQUEST_TIMEOUT_SECONDS = 10
+MAX_REQUEST_BYTES = 16384
+
+STATUS_TEXT = {
+    200: 'OK', 204: 'No Content', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+    404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable',
+}
+
+CORS_HEADERS = (
+    'Access-Control-Allow-Origin: *\r\n'
+    'Access-Control-Allow-Headers: Authorization, Last-Event-ID\r\n'
+    'Access-Control-Allow-Methods: GET, OPTIONS\r\n'
+)
+
+log = logging.getLogger('hospital.events')
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _raise_file_limit():
+    # Every subscriber is an open socket, and the soft limit is often 1024
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def _parse(head):
+    """(method, path, query args, lower-cased headers) of a request head, or None."""
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        return None
+    method, target, _ = parts
+    path, _, query = target.partition('?')
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return method, path, dict(urllib.parse.parse_qsl(query)), headers
+
+
+def _claims(headers, args):
+    """(claims, None) for the request's token, or (None, (status, error))."""
+    if not REQUIRE_AUTH:
+        # As in the app: every caller listens as an admin
+        return {'role': 'Admin', 'ref': None, 'exp': time.time() + MAX_STREAM_SECONDS}, None
+    header = headers.get('authorization', '')
+    token = header[7:] if header.startswith('Bearer ') else args.get('token')
+    if not token:
+        return None, (401, 'Authentication required')
+    try:
+        claims = decode_token(token)
+    except TokenError as e:
+        return None, (401, str(e))
+    if claims['role'] not in ROLES:
+        return None, (403, 'Not allowed for this role')
+    return claims, None
+
+
+def _head(status, content_type, extra=''):
+    return (f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n'
+            f'{extra}{CORS_HEADERS}Connection: close\r\n\r\n').encode()
+
+
+async def _respond(writer, status, body=None):
+    payload = b'' if body is None else _dumps(body).encode()
+    writer.write(_head(status, 'application/json', f'Content-Length: {len(payload)}\r\n') + payload)
+    await writer.drain()
+
+
+class EventServer:
+    def __init__(self, hub=event_hub, host=EVENTS_HOST, port=EVENTS_PORT):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.loop = None
+        self._thread = None
+        self._waiters = {}   # scope -> futures of the coroutines parked in wait()
+        self._stats = {'streams': 0, 'polls': 0, 'open': 0, 'parked': 0}
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def start(self):
+        """Serve on a daemon thread; returns once the port is bound, or raises OSError."""
+        if self.port <= 0 or self._thread is not None:
+            return
+        _raise_file_limit()
+        ready = threading.Event()
+        failure = []
+        self._thread = threading.Thread(target=self._serve, args=(ready, failure), name='event-server', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            self._thread = None
+            raise failure[0]
+        log.info('Event server listening on %s:%d', self.host, self.port)
+
+    def _serve(self, ready, failure):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(asyncio.start_server(
+                self._handle, self.host, self.port, limit=MAX_REQUEST_BYTES, backlog=1024,
+                reuse_port=hasattr(socket, 'SO_REUSEPORT')))
+        except OSError as e:
+            failure.append(e)
+            ready.set()
+            loop.close()
+            return
+        self.loop = loop
+        self.hub.add_listener(self._published)
+        ready.set()
+        loop.run_forever()
+
+    # === Wake-ups ===
+
+    def _published(self, scopes, public):
+        # On the publishing thread: the loop does the waking
+        self.loop.call_soon_threadsafe(self._wake, scopes, public)
+
+    def _wake(self, scopes, public):
+        for scope in list(self._waiters) if public else scopes:
+            for future in self._waiters.pop(scope, ()):
+                if not future.done():
+                    future.set_result(None)
+
+    async def wait(self, cursor, scope, timeout):
+        """EventHub.wait() for the loop: parks a future instead of a thread."""
+        deadline = time.monotonic() + timeout
+        while True:
+            # No await between this read and parking, so no wake-up can fall in between
+            events, cursor, resync = self.hub.after(cursor, scope)
+            remaining = deadline - time.monotonic()
+            if events or resync or not remaining > 0:
+                return events, cursor, resync
+            future = self.loop.create_future()
+            waiters = self._waiters.setdefault(scope, set())
+            waiters.add(future)
+            self._stats['parked'] += 1
+            try:
+                await asyncio.wait((future,), timeout=remaining)
+            finally:
+                self._stats['parked'] -= 1
+                waiters.discard(future)
+                if not waiters and self._waiters.get(scope) is waiters:
+                    del self._waiters[scope]
+
+    # === Requests ===
+
+    async def _handle(self, reader, writer):
+        self._stats['open'] += 1
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT_SECONDS)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, TimeoutError):
+                return
+            request = _parse(head)
+            if request is None:
+                await _respond(writer, 400, {'error': 'Bad request'})
+                return
+            method, path, args, headers = request
+            if path not in (STREAM_PATH, POLL_PATH):
+                await _respond(writer, 404, {'error': 'Not found'})
+            elif method == 'OPTIONS':
+                await _respond(writer, 204)
+            elif method != 'GET':
+                await _respond(writer, 405, {'error': 'Method not allowed'})
+            else:
+                claims, error = _claims(headers, args)
+                if error:
+                    await _respond(writer, error[0], {'error': error[1]})
+                elif path == STREAM_PATH:
+                    await self._stream(writer, claims, args, headers)
+                else:
+                    await self._poll(writer, claims, args)
+        except ConnectionError:
+            pass   # the client went away
+        except Exception:
+            log.exception('Event request failed')
+        finally:
+            self._stats['open'] -= 1
+            writer.close()
+
+    async def _stream(self, writer, claims, args, headers):
+        # Same protocol as the app's stream_events()
+        try:
+            timeout = seconds_arg(args.get('timeout'), MAX_STREAM_SECONDS)
+        except ValueError:
+            await _respond(writer, 400, {'error': 'timeout must be a number of seconds, 0 or more'})
+            return
+        closes_at = min(time.time() + timeout, claims['exp'])
+        if not self.hub.join():
+            await _respond(writer, 503, {'error': 'Too many event streams; poll /api/events/poll instead'})
+            return
+        self._stats['streams'] += 1
+        try:
+            scope = subscriber_scope(claims)
+            cursor, resync = self.hub.position(headers.get('last-event-id') or args.get('last_event_id'))
+            writer.write(_head(200, 'text/event-stream', 'Cache-Control: no-cache\r\nX-Accel-Buffering: no\r\n')
+                         + f'retry: {HEARTBEAT_SECONDS * 1000}\n\n'.encode())
+            while True:
+                if resync:
+                    writer.write(format_sse({'id': self.hub.event_id(cursor), 'type': 'resync', 'data': {}}).encode())
+                await writer.drain()
+                remaining = closes_at - time.time()
+                if remaining <= 0 or (REQUIRE_AUTH and revocations.is_revoked(claims)):
+                    return
+                events, cursor, resync = await self.wait(cursor, scope, min(HEARTBEAT_SECONDS, remaining))
+                if events:
+                    writer.write(''.join(format_sse(event) for event in events).encode())
+                elif not resync:
+                    writer.write(b': keepalive\n\n')
+        finally:
+            self.hub.leave()
+
+    async def _poll(self, writer, claims, args):
+        try:
+            wait = seconds_arg(args.get('wait'), MAX_WAIT_SECONDS)
+        except ValueError:
+            await _respond(writer, 400, {'error': 'wait must be a number of seconds, 0 or more'})
+            return
+        self._stats['polls'] += 1
+        after = args.get('after')
+        cursor, resync = self.hub.position(after)
+        events = []
+        if after and not resync:
+            events, cursor, resync = await self.wait(cursor, subscriber_scope(claims), wait)
+        await _respond(writer, 200, {'events': events, 'last_event_id': self.hub.event_id(cursor), 'resync': resync})
+
+    def stats(self):
+        return dict(self._stats, running=self.running, port=self.port)
+
+
+event_server = EventServer()
@@ -0,0 +1,229 @@
+"""Change events pushed to the dashboards instead of re-polling their lists.
+
+Write routes publish a row-level delta once they have committed (the
+appointment as the lists show it, the new History row, a blacklist flag)
+and /api/events hands every subscriber the events in its scope: an Admin
+sees all of them, a Doctor or Patient only those carrying their own
+DoctorID or PatientID, and everyone sees public events (the doctor
+directory). Dashboards patch their local lists from the deltas.
+
+Events live in one ring buffer holding the last events_buffer_size of
+them. A subscriber is only a cursor into it, so an idle connection costs
+no memory here and publish() never loops over subscribers: waiters block
+on one condition per scope and an event wakes only the scopes it is for.
+A client that reconnects with Last-Event-ID resumes where it stopped; one
+whose cursor has fallen out of the buffer (or comes from before a
+restart) is sent a resync event and reloads its lists once.
+
+The buffer is per process, like the token revocation list, so with several
+workers each one only sees the writes it served. Served by the app itself,
+an open stream or a waiting long-poll blocks a request thread in wait();
+event_server.py serves the same endpoints from one asyncio loop, where a
+subscriber is a parked coroutine, and the app redirects to it while it runs.
+"""
+import collections
+import json
+import math
+import threading
+import time
+from config import get_setting
+
+EVENT_BUFFER_SIZE = get_setting('api', 'events_buffer_size', 10000)
+MAX_SUBSCRIBERS = get_setting('api', 'events_max_subscribers', 1000)
+HEARTBEAT_SECONDS = get_setting('api', 'events_heartbeat_seconds', 15)
+MAX_STREAM_SECONDS = get_setting('api', 'events_max_stream_seconds', 3600)
+MAX_WAIT_SECONDS = get_setting('api', 'events_max_wait_seconds', 30)
+
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+ADMIN = ('Admin', None)
+PUBLIC = ('Public', None)
+
+APPOINTMENT_DELTA = '''
+    SELECT a.AppointmentID, a.AppointmentDate, a.Status,
+           a.PatientID, p.Name AS PatientName, p.Age, p.Gender, p.Contact,
+           a.DoctorID, d.Name AS DoctorName, d.Specialization
+    FROM Appointment a
+    JOIN Patient p ON a.PatientID = p.PatientID
+    JOIN Doctor d ON a.DoctorID = d.DoctorID
+    WHERE a.AppointmentID IN ({marks})
+'''
+
+HISTORY_DELTA = '''
+    SELECT h.HistoryID, h.AppointmentID, h.PatientID, h.Tests, h.MedicineName, h.Instructions,
+           a.AppointmentDate, a.Status,
+           d.DoctorID, d.Name AS DoctorName, d.Specialization
+    FROM History h
+    JOIN Appointment a ON h.AppointmentID = a.AppointmentID
+    JOIN Doctor d ON a.DoctorID = d.DoctorID
+    WHERE h.HistoryID = ?
+'''
+
+
+def seconds_arg(value, limit):
+    """A ?timeout= / ?wait= value as seconds within [0, limit]; None means limit.
+
+    Raises ValueError unless value is a finite number of seconds, 0 or more:
+    float() also takes 'nan' and 'inf', and a nan deadline never passes.
+    """
+    if value is None:
+        return limit
+    seconds = float(value)
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f'{value!r} is not a number of seconds')
+    return min(seconds, limit)
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {_dumps(event['data'])}\n\n"
+
+
+def subscriber_scope(claims):
+    """('Admin', None), ('Doctor', DoctorID) or ('Patient', PatientID) for a token's claims."""
+    return ADMIN if claims['role'] == 'Admin' else (claims['role'], claims['ref'])
+
+
+class EventHub:
+    def __init__(self, capacity=EVENT_BUFFER_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        # Ids restart with the process; the epoch tells a stale Last-Event-ID apart
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self._lock = threading.Lock()
+        self._events = collections.deque(maxlen=capacity)   # (seq, scopes, event)
+        self._seq = 0
+        self._waiting = {}   # scope -> [Condition, waiters]
+        self._listeners = []
+        self._subscribers = 0
+        self._published = 0
+        self._rejected = 0
+
+    def publish(self, event_type, data, doctor_id=None, patient_id=None, public=False):
+        """Append an event for the admins plus the given doctor/patient (or everyone)."""
+        scopes = {ADMIN}
+        if public:
+            scopes.add(PUBLIC)
+        if doctor_id is not None:
+            scopes.add(('Doctor', doctor_id))
+        if patient_id is not None:
+            scopes.add(('Patient', patient_id))
+        with self._lock:
+            self._seq += 1
+            event = {'id': f'{self.epoch}-{self._seq}', 'type': event_type, 'data': data}
+            self._events.append((self._seq, scopes, event))
+            self._published += 1
+            if public:
+                woken = list(self._waiting.values())
+            else:
+                woken = [self._waiting[scope] for scope in scopes if scope in self._waiting]
+            for condition, _ in woken:
+                condition.notify_all()
+        for listener in self._listeners:
+            listener(scopes, public)
+        return event
+
+    def add_listener(self, callback):
+        """Call callback(scopes, public) after each publish, on the publishing thread."""
+        self._listeners.append(callback)
+
+    def position(self, last_event_id=None):
+        """(cursor, resync) to resume after last_event_id; new subscribers start at the end."""
+        with self._lock:
+            if not last_event_id:
+                return self._seq, False
+            epoch, _, seq = last_event_id.partition('-')
+            if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+                return self._seq, True
+            return int(seq), False
+
+    def _after(self, cursor, scope):
+        # Newest first, stopping at the cursor: the cost is the number of new events
+        found = []
+        oldest = self._events[0][0] if self._events else self._seq + 1
+        for seq, scopes, event in reversed(self._events):
+            if seq <= cursor:
+                break
+            if scope == ADMIN or scope in scopes or PUBLIC in scopes:
+                found.append(event)
+        found.reverse()
+        return found, self._seq, cursor < oldest - 1
+
+    def after(self, cursor, scope):
+        """Events for scope after cursor without waiting: (events, new cursor, resync)."""
+        with self._lock:
+            return self._after(cursor, scope)
+
+    def wait(self, cursor, scope, timeout):
+        """Events for scope after cursor, blocking up to timeout for the first one.
+
+        Returns (events, new cursor, resync); resync means events were
+        dropped from the buffer before this subscriber saw them.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            events, cursor, resync = self._after(cursor, scope)
+            if events or resync or not timeout > 0:
+                return events, cursor, resync
+            waiting = self._waiting.setdefault(scope, [threading.Condition(self._lock), 0])
+            waiting[1] += 1
+            try:
+                while not (events or resync):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    waiting[0].wait(remaining)
+                    events, cursor, resync = self._after(cursor, scope)
+            finally:
+                waiting[1] -= 1
+                if not waiting[1]:
+                    del self._waiting[scope]
+        return events, cursor, resync
+
+    def event_id(self, cursor):
+        return f'{self.epoch}-{cursor}'
+
+    def join(self):
+        """Count a new stream; False once max_subscribers are connected."""
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                self._rejected += 1
+                return False
+            self._subscribers += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._subscribers -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'last_event_id': self.event_id(self._seq),
+                'buffered': len(self._events),
+                'capacity': self._events.maxlen,
+                'subscribers': self._subscribers,
+                'max_subscribers': self.max_subscribers,
+                'rejected': self._rejected,
+                'waiting': sum(count for _, count in self._waiting.values()),
+                'published': self._published,
+            }
+
+
+event_hub = EventHub()
+
+
+# === Row deltas ===
+
+def publish_appointments(conn, appointment_ids, event_type):
+    """Publish each appointment's current row to its doctor, its patient and the admins."""
+    appointment_ids = list(appointment_ids)
+    for chunk in range(0, len(appointment_ids), 500):
+        part = appointment_ids[chunk:chunk + 500]
+        rows = conn.execute(APPOINTMENT_DELTA.format(marks=','.join('?' * len(part))), part).fetchall()
+        for row in rows:
+            event_hub.publish(event_type, dict(row), doctor_id=row['DoctorID'], patient_id=row['PatientID'])
+
+
+def publish_history(conn, history_id):
+    row = conn.execute(HISTORY_DELTA, (history_id,)).fetchone()
+    if row is not None:
+        event_hub.publish('history.added', dict(row), doctor_id=row['DoctorID'], patient_id=row['PatientID'])
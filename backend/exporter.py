@@ -0,0 +1,217 @@
+"""Streaming export of Patient, Doctor, Appointment and History for analytics.
+
+    python exporter.py --out exports/                       # every table, gzipped CSV
+    python exporter.py --out exports/ --format columnar --tables appointments history
+
+Each table is read through one cursor, export_batch_size rows at a time,
+and every batch is encoded and compressed before the next is fetched, so
+memory does not grow with the table. All tables of a run are read in one
+read transaction, so under WAL they come from the same snapshot while the
+app keeps writing.
+
+Exports resume by primary-key watermark. A run covers the keys after
+after_id up to the largest key at the snapshot, and the CLI keeps that
+watermark per table in <out>/export_state.json, so the next run only emits
+rows added since. Rows changed below the watermark (a status update, say)
+are not exported again.
+
+Formats:
+
+    csv       header line, then one line per row
+    ndjson    one JSON object per row
+    columnar  a schema line, then one line per batch holding each column
+              as a list ({"rows": n, "columns": {"Name": [...], ...}})
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from config import get_setting
+from database import DB_PATH, apply_pragmas
+
+EXPORT_BATCH_SIZE = get_setting('api', 'export_batch_size', 5000)
+
+TABLES = {
+    'patients': ('Patient', 'PatientID'),
+    'doctors': ('Doctor', 'DoctorID'),
+    'appointments': ('Appointment', 'AppointmentID'),
+    'history': ('History', 'HistoryID'),
+    # Rows move here from the two above with their ids, not in id order (see archive.py),
+    # so a watermark only resumes these exactly when the archive job has not run since
+    'appointments_archive': ('AppointmentArchive', 'AppointmentID'),
+    'history_archive': ('HistoryArchive', 'HistoryID'),
+}
+
+# format -> file extension
+FORMATS = {'csv': '.csv', 'ndjson': '.ndjson', 'columnar': '.columns.ndjson'}
+
+STATE_FILE = 'export_state.json'
+
+# json.dumps() with non-default arguments builds a new encoder on every call
+_dumps = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _csv_encoder(table, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([name for name, _ in columns])
+    header = buffer.getvalue()
+
+    def encode(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return header, encode
+
+
+def _ndjson_encoder(table, columns):
+    names = [name for name, _ in columns]
+
+    def encode(rows):
+        return ''.join(_dumps(dict(zip(names, row))) + '\n' for row in rows)
+    return '', encode
+
+
+def _columnar_encoder(table, columns):
+    names = [name for name, _ in columns]
+    header = json.dumps({'table': table, 'columns': [{'name': name, 'type': declared} for name, declared in columns]})
+
+    def encode(rows):
+        group = {'rows': len(rows), 'columns': {name: [row[i] for row in rows] for i, name in enumerate(names)}}
+        return _dumps(group) + '\n'
+    return header + '\n', encode
+
+
+ENCODERS = {'csv': _csv_encoder, 'ndjson': _ndjson_encoder, 'columnar': _columnar_encoder}
+
+
+def check_request(table, fmt):
+    if table not in TABLES:
+        raise ExportError(f"Table must be one of {', '.join(TABLES)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"Format must be one of {', '.join(FORMATS)}")
+
+
+def watermark(conn, table):
+    """Largest primary key of table; the first read of a transaction fixes its snapshot."""
+    name, key = TABLES[table]
+    return conn.execute(f'SELECT COALESCE(MAX({key}), 0) FROM {name}').fetchone()[0]
+
+
+def export_filename(table, fmt, after_id, upto, compress=True):
+    return f"{table}-{after_id + 1}-{upto}{FORMATS[fmt]}{'.gz' if compress else ''}"
+
+
+def export_rows(conn, table, fmt, after_id, upto, batch_size=EXPORT_BATCH_SIZE, compress=True, progress=None):
+    """Yield one table's rows in (after_id, upto] as encoded, optionally gzipped, bytes."""
+    name, key = TABLES[table]
+    columns = [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info({name})')]
+    header, encode = ENCODERS[fmt](name, columns)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None   # wbits 31: gzip framing
+
+    def out(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    cursor = conn.execute(f'SELECT * FROM {name} WHERE {key} > ? AND {key} <= ? ORDER BY {key}', (after_id, upto))
+    if header:
+        yield out(header)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if progress is not None:
+            progress['rows'] = progress.get('rows', 0) + len(rows)
+        chunk = out(encode(rows))
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+# === CLI ===
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.part', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.part', path)
+
+
+def export_tables(conn, out_dir, tables, fmt, compress=True, batch_size=EXPORT_BATCH_SIZE):
+    """Write each table's new rows to out_dir and advance the watermarks; return [(table, rows, path)]."""
+    state = load_state(out_dir)
+    written = []
+    conn.execute('BEGIN')
+    try:
+        marks = {table: watermark(conn, table) for table in tables}
+        for table in tables:
+            after_id, upto = state.get(table, 0), marks[table]
+            if upto <= after_id:
+                written.append((table, 0, None))
+                continue
+            path = os.path.join(out_dir, export_filename(table, fmt, after_id, upto, compress))
+            progress = {}
+            with open(path + '.part', 'wb') as f:
+                for chunk in export_rows(conn, table, fmt, after_id, upto, batch_size, compress, progress):
+                    f.write(chunk)
+            os.replace(path + '.part', path)
+            # Saved per table, so a failed run keeps the tables it finished
+            state[table] = upto
+            save_state(out_dir, state)
+            written.append((table, progress.get('rows', 0), path))
+    finally:
+        conn.rollback()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export tables for analytics, resuming from the last run')
+    parser.add_argument('--out', required=True, help='output directory (holds the watermark state too)')
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--no-compress', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument('--full', action='store_true', help='ignore the saved watermarks')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    if args.full and os.path.exists(os.path.join(args.out, STATE_FILE)):
+        os.remove(os.path.join(args.out, STATE_FILE))
+
+    conn = sqlite3.connect(args.db)
+    apply_pragmas(conn)
+    started = time.perf_counter()
+    written = export_tables(conn, args.out, args.tables, args.format, not args.no_compress, args.batch_size)
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    total = 0
+    for table, rows, path in written:
+        total += rows
+        print(f'{table:<13} {rows:>9} rows  {path or "(no new rows)"}')
+    print(f'{total} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
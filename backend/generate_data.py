@@ -0,0 +1,273 @@
+"""Fill a fresh database with a large, seeded, realistic data set.
+
+    python generate_data.py --db /data/load.db --doctors 1000 --patients 1000000 --appointments 20000000
+
+Doctors belong to departments and work four to six weekdays in morning
+and/or afternoon shifts. Appointments sit on their slot grid, at most
+max_appointments_per_day per doctor and day, day by day up to
+booking_advance_days ahead, so AppointmentID grows with the date. The
+first day is chosen so the total comes out close to --appointments. Past
+appointments are Completed or Cancelled, future ones Scheduled or
+Cancelled, and about --history-ratio of the completed visits have a
+History record.
+
+Every account has a login: admin / admin123, doctors use their email with
+doctor123, patients patient<PatientID> with patient123. The same seed
+always produces the same database.
+
+Rows are written with executemany into tables without secondary indexes
+or triggers, with the journal off. The indexes, triggers and derived
+tables (AppointmentStats, DoctorDayLoad, search indexes) are built once
+at the end, the way upgrade_schema() would on an existing database.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+from appointment_stats import rebuild_day_load, rebuild_stats
+from database import DB_PATH, apply_pragmas
+from db_init import create_indexes, create_tables, create_triggers
+from passwords import hash_password
+from slots import BOOKING_ADVANCE_DAYS, MAX_APPOINTMENTS_PER_DAY, SLOT_MINUTES
+
+CHUNK = 50000
+
+# Fast and unsafe while the file is being created; apply_pragmas() defaults after
+LOAD_PRAGMAS = {'journal_mode': 'off', 'synchronous': 'off', 'cache_size': -262144, 'temp_store': 'memory'}
+
+DEPARTMENTS = [
+    ('Cardiology', 'Block A', ['Cardiologist', 'Cardiac Surgeon']),
+    ('Neurology', 'Block B', ['Neurologist', 'Neurosurgeon']),
+    ('Orthopedics', 'Block C', ['Orthopedic Surgeon', 'Sports Medicine']),
+    ('Pediatrics', 'Block D', ['Pediatrician', 'Neonatologist']),
+    ('General Medicine', 'Block E', ['General Physician', 'Internist']),
+    ('Dermatology', 'Block F', ['Dermatologist']),
+    ('ENT', 'Block F', ['ENT Specialist']),
+    ('Ophthalmology', 'Block G', ['Ophthalmologist']),
+    ('Gynecology', 'Block H', ['Gynecologist', 'Obstetrician']),
+    ('Psychiatry', 'Block J', ['Psychiatrist']),
+    ('Oncology', 'Block K', ['Oncologist']),
+    ('Radiology', 'Block L', ['Radiologist']),
+]
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Deepa', 'Divya', 'Gaurav', 'Isha', 'Karan', 'Kavya', 'Lakshmi',
+    'Manoj', 'Meera', 'Neha', 'Nikhil', 'Pooja', 'Priya', 'Rahul', 'Ravi', 'Rohan', 'Sanjay', 'Sneha', 'Suresh',
+    'Tanvi', 'Varun', 'Vikram', 'Yash', 'Zoya', 'Farhan', 'Harpreet', 'John', 'Maria', 'Anil', 'Sunita', 'Kiran',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Mehta', 'Patel', 'Rao', 'Singh', 'Kumar', 'Das',
+    'Joshi', 'Kapoor', 'Menon', 'Pillai', 'Bose', 'Chopra', 'Khan', 'Fernandes', 'Yadav', 'Mishra', 'Shah', 'Jain',
+]
+CITIES = ['Hyderabad', 'Chennai', 'Bengaluru', 'Mumbai', 'Pune', 'Delhi', 'Kolkata', 'Kochi', 'Jaipur', 'Lucknow']
+TESTS = [None, 'Blood test', 'ECG', 'X-ray', 'MRI', 'CT scan', 'Ultrasound', 'Lipid profile', 'HbA1c', 'Urine test']
+MEDICINES = [None, 'Paracetamol', 'Amoxicillin', 'Aspirin', 'Metformin', 'Atorvastatin', 'Ibuprofen', 'Omeprazole',
+             'Cetirizine', 'Amlodipine', 'Azithromycin']
+INSTRUCTIONS = ['Twice daily after food', 'Once daily at night', 'Three times daily for 5 days', 'As needed for pain',
+                'Review after two weeks', 'Rest and hydration']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+SHIFTS = [('09:00', '13:00'), ('14:00', '18:00')]
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert(conn, sql, rows):
+    count = 0
+    for chunk in _chunks(rows):
+        conn.executemany(sql, chunk)
+        count += len(chunk)
+    return count
+
+
+def _shift_starts(start, end):
+    first, last = (int(t[:2]) * 60 + int(t[3:]) for t in (start, end))
+    return [f'{m // 60:02d}:{m % 60:02d}' for m in range(first, last - SLOT_MINUTES + 1, SLOT_MINUTES)]
+
+
+def generate_doctors(conn, rng, count):
+    conn.executemany('INSERT INTO Department (DepartmentID, Name, Location) VALUES (?, ?, ?)',
+                     [(i + 1, name, location) for i, (name, location, _) in enumerate(DEPARTMENTS)])
+    doctors, availability, schedule = [], [], {}
+    for doctor_id in range(1, count + 1):
+        department = rng.randrange(len(DEPARTMENTS))
+        name = _name(rng)
+        email = f"{name.lower().replace(' ', '.')}.{doctor_id}@hospital.com"
+        doctors.append((doctor_id, f'Dr. {name}', rng.choice(DEPARTMENTS[department][2]), department + 1,
+                        f'9{rng.randrange(10 ** 9):09d}', email))
+        # weekday index -> slot start times
+        schedule[doctor_id] = {}
+        for day in sorted(rng.sample(range(len(WEEKDAYS)), rng.randint(4, 6))):
+            shifts = SHIFTS if rng.random() < 0.5 else [rng.choice(SHIFTS)]
+            for start, end in shifts:
+                availability.append((doctor_id, WEEKDAYS[day], start, end))
+            schedule[doctor_id][day] = [t for start, end in shifts for t in _shift_starts(start, end)]
+    conn.executemany('INSERT INTO Doctor (DoctorID, Name, Specialization, DepartmentID, Contact, Email) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', doctors)
+    conn.executemany('INSERT INTO DoctorAvailability (DoctorID, Day, StartTime, EndTime) VALUES (?, ?, ?, ?)',
+                     availability)
+    doctor_hash = hash_password('doctor123')
+    conn.executemany("INSERT INTO User (Username, Password, Role, ReferenceID) VALUES (?, ?, 'Doctor', ?)",
+                     [(row[5], doctor_hash, row[0]) for row in doctors])
+    return schedule
+
+
+def generate_patients(conn, rng, count):
+    genders = ['Male'] * 49 + ['Female'] * 49 + ['Other'] * 2
+    _insert(conn, 'INSERT INTO Patient (PatientID, Name, Age, Gender, Contact, Address, IsBlacklisted) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((i, _name(rng), rng.randint(1, 90), rng.choice(genders),
+              f'8{rng.randrange(10 ** 9):09d}', rng.choice(CITIES), int(rng.random() < 0.005))
+             for i in range(1, count + 1)))
+    # One shared hash: hashing a million passwords would take hours
+    patient_hash = hash_password('patient123')
+    _insert(conn, "INSERT INTO User (Username, Password, Role, ReferenceID) VALUES (?, ?, 'Patient', ?)",
+            ((f'patient{i}', patient_hash, i) for i in range(1, count + 1)))
+
+
+def appointment_days(schedule, total, today):
+    """(date, [(doctor_id, slot starts)]) from the first day needed up to the booking horizon."""
+    per_weekday = [sum(min(len(days[w]), MAX_APPOINTMENTS_PER_DAY) for days in schedule.values() if w in days)
+                   for w in range(7)]
+    # A day is filled to between half and all of its capacity, 3/4 on average
+    daily = sum(per_weekday) * 0.75 / 7 or 1
+    last = today + datetime.timedelta(days=BOOKING_ADVANCE_DAYS)
+    day = last - datetime.timedelta(days=int(total / daily) + 1)
+    while day <= last:
+        weekday = day.weekday()
+        if per_weekday[weekday]:
+            yield day, [(doctor_id, days[weekday]) for doctor_id, days in schedule.items() if weekday in days]
+        day += datetime.timedelta(days=1)
+
+
+def generate_appointments(conn, rng, schedule, patients, total, history_ratio, today):
+    history = []
+
+    def appointments():
+        appointment_id = 0
+        for day, working in appointment_days(schedule, total, today):
+            date = day.isoformat()
+            past = day < today
+            for doctor_id, starts in working:
+                capacity = min(len(starts), MAX_APPOINTMENTS_PER_DAY)
+                for start in rng.sample(starts, rng.randint(capacity // 2, capacity)):
+                    appointment_id += 1
+                    patient_id = rng.randint(1, patients)
+                    if rng.random() < 0.1:
+                        status = 'Cancelled'
+                    else:
+                        status = 'Completed' if past else 'Scheduled'
+                    if status == 'Completed' and rng.random() < history_ratio:
+                        history.append((appointment_id, patient_id, rng.choice(TESTS), rng.choice(MEDICINES),
+                                        rng.choice(INSTRUCTIONS)))
+                    yield appointment_id, f'{date} {start}', patient_id, doctor_id, status
+                    if len(history) >= CHUNK:
+                        conn.executemany(
+                            'INSERT INTO History (AppointmentID, PatientID, Tests, MedicineName, Instructions) '
+                            'VALUES (?, ?, ?, ?, ?)', history)
+                        history.clear()
+
+    count = _insert(conn, 'INSERT INTO Appointment (AppointmentID, AppointmentDate, PatientID, DoctorID, Status) '
+                          'VALUES (?, ?, ?, ?, ?)', appointments())
+    conn.executemany('INSERT INTO History (AppointmentID, PatientID, Tests, MedicineName, Instructions) '
+                     'VALUES (?, ?, ?, ?, ?)', history)
+    return count
+
+
+def build_derived(conn):
+    cursor = conn.cursor()
+    create_indexes(cursor)
+    create_triggers(cursor)
+    rebuild_stats(conn)
+    rebuild_day_load(conn)
+    for fts in ('DoctorSearch', 'PatientSearch'):
+        cursor.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def generate(db_path, doctors, patients, appointments, history_ratio=0.6, seed=1, today=None, log=print):
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn, LOAD_PRAGMAS)
+    cursor = conn.cursor()
+    create_tables(cursor)
+    conn.commit()
+
+    timings = {}
+
+    def step(label, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        conn.commit()
+        timings[label] = time.perf_counter() - started
+        log(f'  {label:<14} {timings[label]:>7.1f} s')
+        return result
+
+    conn.execute("INSERT INTO User (Username, Password, Role) VALUES ('admin', ?, 'Admin')",
+                 (hash_password('admin123'),))
+    schedule = step('doctors', generate_doctors, conn, rng, doctors)
+    step('patients', generate_patients, conn, rng, patients)
+    step('appointments', generate_appointments, conn, rng, schedule, patients, appointments, history_ratio, today)
+    step('indexes', build_derived, conn)
+    conn.execute('ANALYZE')
+    conn.close()
+
+    # Back to the normal journal mode (WAL) for the app
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a large synthetic hospital database')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--doctors', type=int, default=1000)
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--appointments', type=int, default=1000000)
+    parser.add_argument('--history-ratio', type=float, default=0.6,
+                        help='share of completed appointments with a History record')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--today', type=datetime.date.fromisoformat,
+                        help='date that splits past from future appointments (default: today)')
+    parser.add_argument('--force', action='store_true', help='replace an existing database file')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f'{args.db} exists; pass --force to replace it')
+            return 1
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    print(f'Generating {args.doctors} doctors, {args.patients} patients, {args.appointments} appointments '
+          f'(seed {args.seed}) into {args.db}')
+    timings = generate(args.db, args.doctors, args.patients, args.appointments, args.history_ratio,
+                       args.seed, args.today)
+    conn = sqlite3.connect(args.db)
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('Doctor', 'Patient', 'Appointment', 'History', 'DoctorAvailability')}
+    conn.close()
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+    print(f'Done in {sum(timings.values()):.1f} s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,448 @@
+"""Streaming CSV / NDJSON import of patients, doctors, appointments and History.
+
+    python importer.py patients branch_patients.csv
+    python importer.py appointments visits.ndjson --batch-size 10000 --defer-indexes
+
+Records are parsed one at a time and validated with the same rules as the
+single-row routes (validation.py). Valid rows are written with executemany,
+one transaction per batch, so memory stays flat and a bad row costs a
+per-row error instead of the batch. Columns are the JSON field names of
+the routes, plus an optional explicit primary key (patient_id, doctor_id,
+appointment_id, history_id) so later files can refer to earlier ones:
+
+    patients      name, age, gender, contact, address, username, password | password_hash
+    doctors       name, specialization, department_id, contact, email, password | password_hash
+    appointments  patient_id, doctor_id, date, status
+    history       appointment_id, patient_id, tests, medicine, instructions
+
+A patient gets a login when username and a password are given; a doctor
+when a password is given (the username is the email, as in add_doctor).
+password_hash takes an already hashed value in the passwords.py format.
+"""
+import abc
+import argparse
+import csv
+import io
+import itertools
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from appointment_stats import rebuild_day_load, rebuild_stats
+from archive import ARCHIVE_TABLES
+from config import get_setting
+from database import DB_PATH, apply_pragmas
+from db_init import create_indexes, create_triggers, upgrade_schema
+from passwords import HASH_WORKERS, hash_password, is_hashed
+from validation import ValidationError, appointment_fields, doctor_fields, patient_fields
+
+IMPORT_BATCH_SIZE = get_setting('api', 'import_batch_size', 5000)
+IMPORT_MAX_ERRORS = get_setting('api', 'import_max_errors', 1000)
+
+FORMATS = ('csv', 'ndjson')
+
+# SQLite's default limit on host parameters per statement is 999
+_IN_CHUNK = 500
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _int_or_none(data, field):
+    value = data.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f'{field} must be a number')
+
+
+def _login(data, username):
+    password, password_hash = data.get('password'), data.get('password_hash')
+    if password_hash and not is_hashed(password_hash):
+        raise ValidationError('password_hash is not a scrypt or pbkdf2_sha256 hash')
+    if not (password or password_hash):
+        return None
+    if not username:
+        raise ValidationError('A login needs a username')
+    return [username, password, password_hash]
+
+
+class _Kind(abc.ABC):
+    """One importable table: how a record becomes a row, and what it refers to.
+
+    parse() returns (key, values, login). references lists
+    (values index, table, key column) that must already exist.
+    """
+    table = key = role = None
+    columns = ()
+    references = ()
+
+    @abc.abstractmethod
+    def parse(self, data):
+        pass
+
+
+class _Patients(_Kind):
+    table, key, role = 'Patient', 'PatientID', 'Patient'
+    columns = ('Name', 'Age', 'Gender', 'Contact', 'Address')
+    fields = ('patient_id', 'name', 'age', 'gender', 'contact', 'address', 'username', 'password', 'password_hash')
+
+    def parse(self, data):
+        return _int_or_none(data, 'patient_id'), patient_fields(data), _login(data, data.get('username'))
+
+
+class _Doctors(_Kind):
+    table, key, role = 'Doctor', 'DoctorID', 'Doctor'
+    columns = ('Name', 'Specialization', 'DepartmentID', 'Contact', 'Email')
+    fields = ('doctor_id', 'name', 'specialization', 'department_id', 'contact', 'email', 'password', 'password_hash')
+    references = ((2, 'Department', 'DepartmentID'),)
+
+    def parse(self, data):
+        values = doctor_fields(data)
+        return _int_or_none(data, 'doctor_id'), values, _login(data, values[4])
+
+
+class _Appointments(_Kind):
+    table, key = 'Appointment', 'AppointmentID'
+    columns = ('AppointmentDate', 'PatientID', 'DoctorID', 'Status')
+    fields = ('appointment_id', 'patient_id', 'doctor_id', 'date', 'status')
+    references = ((1, 'Patient', 'PatientID'), (2, 'Doctor', 'DoctorID'))
+
+    def parse(self, data):
+        return _int_or_none(data, 'appointment_id'), appointment_fields(data), None
+
+
+class _History(_Kind):
+    table, key = 'History', 'HistoryID'
+    columns = ('AppointmentID', 'PatientID', 'Tests', 'MedicineName', 'Instructions')
+    fields = ('history_id', 'appointment_id', 'patient_id', 'tests', 'medicine', 'instructions')
+    references = ((0, 'Appointment', 'AppointmentID'),)
+
+    def parse(self, data):
+        appointment_id = _int_or_none(data, 'appointment_id')
+        if appointment_id is None:
+            raise ValidationError('Appointment ID required')
+        values = (appointment_id, _int_or_none(data, 'patient_id'),
+                  data.get('tests'), data.get('medicine'), data.get('instructions'))
+        return _int_or_none(data, 'history_id'), values, None
+
+
+KINDS = {'patients': _Patients, 'doctors': _Doctors, 'appointments': _Appointments, 'history': _History}
+
+
+# === Parsing ===
+
+def read_records(stream, fmt, fields):
+    """Yield (line number, record dict or None, parse error or None) from a text stream."""
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip().lower() for name in header]
+        unknown = [name for name in header if name not in fields]
+        if unknown:
+            raise ImportFormatError(f"Unknown column(s): {', '.join(unknown)}")
+        for values in reader:
+            if not any(values):
+                continue
+            if len(values) != len(header):
+                yield reader.line_num, None, f'Expected {len(header)} columns, got {len(values)}'
+                continue
+            # Empty cells are missing values, as an absent JSON key would be
+            yield reader.line_num, {name: value or None for name, value in zip(header, values)}, None
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, 'Invalid JSON'
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, 'Expected a JSON object'
+                continue
+            yield line_number, record, None
+    else:
+        raise ImportFormatError(f"Format must be one of {', '.join(FORMATS)}")
+
+
+# === Writing ===
+
+def _existing(conn, table, column, values):
+    found = set()
+    values = sorted(values)
+    for start in range(0, len(values), _IN_CHUNK):
+        part = values[start:start + _IN_CHUNK]
+        found.update(row[0] for row in conn.execute(
+            f"SELECT {column} FROM {table} WHERE {column} IN ({','.join('?' * len(part))})", part))
+    return found
+
+
+class Importer:
+    """Writes one kind of record in batches and keeps the run's report."""
+
+    def __init__(self, conn, kind, batch_size=None, max_errors=IMPORT_MAX_ERRORS):
+        if kind not in KINDS:
+            raise ImportFormatError(f"Kind must be one of {', '.join(KINDS)}")
+        self.conn = conn
+        self.kind = KINDS[kind]()
+        self.batch_size = max(1, batch_size or IMPORT_BATCH_SIZE)
+        self.max_errors = max_errors
+        self.report = {'kind': kind, 'rows': 0, 'imported': 0, 'failed': 0, 'batches': 0,
+                       'errors': [], 'errors_truncated': False}
+        self._hasher = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='import-hash')
+
+    def fail(self, line, message):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append({'line': line, 'error': message})
+        else:
+            self.report['errors_truncated'] = True
+
+    def run(self, records):
+        started = time.perf_counter()
+        try:
+            batch = []
+            for line, record, error in records:
+                self.report['rows'] += 1
+                if error:
+                    self.fail(line, error)
+                    continue
+                try:
+                    key, values, login = self.kind.parse(record)
+                except ValidationError as e:
+                    self.fail(line, str(e))
+                    continue
+                batch.append([line, key, list(values), login])
+                if len(batch) >= self.batch_size:
+                    self.write(batch)
+                    batch = []
+            if batch:
+                self.write(batch)
+        finally:
+            self._hasher.shutdown()
+        self.report['errors'].sort(key=lambda error: error['line'])
+        elapsed = time.perf_counter() - started
+        self.report['seconds'] = round(elapsed, 3)
+        self.report['rows_per_second'] = round(self.report['rows'] / elapsed) if elapsed else None
+        return self.report
+
+    def _hash_logins(self, batch):
+        # hashlib releases the GIL, so the batch's hashes run in parallel
+        pending = [login for _, _, _, login in batch if login and not login[2]]
+        for login, hashed in zip(pending, self._hasher.map(hash_password, [login[1] for login in pending])):
+            login[2] = hashed
+
+    def _check(self, batch):
+        """Drop rows that collide or refer to missing rows; runs under the write lock."""
+        kind = self.kind
+        bad = {}
+        for index, table, column in kind.references:
+            present = _existing(self.conn, table, column, {row[2][index] for row in batch})
+            for row in batch:
+                if row[2][index] not in present:
+                    bad.setdefault(row[0], f'{column} {row[2][index]} does not exist')
+
+        if kind.table == 'History':
+            # Patient defaults to the appointment's and must match it when given
+            ids = sorted({row[2][0] for row in batch})
+            owners = {}
+            for start in range(0, len(ids), _IN_CHUNK):
+                part = ids[start:start + _IN_CHUNK]
+                owners.update(self.conn.execute(
+                    f"SELECT AppointmentID, PatientID FROM Appointment WHERE AppointmentID IN ({','.join('?' * len(part))})",
+                    part).fetchall())
+            for row in batch:
+                owner = owners.get(row[2][0])
+                if row[2][1] is None:
+                    row[2][1] = owner
+                elif owner is not None and row[2][1] != owner:
+                    bad.setdefault(row[0], 'patient_id does not match the appointment')
+
+        keys = [row[1] for row in batch if row[1] is not None]
+        # Earlier batches are committed, so the database covers them too
+        taken = _existing(self.conn, kind.table, kind.key, keys)
+        if kind.table in ARCHIVE_TABLES:
+            # Archived rows keep their ids
+            taken |= _existing(self.conn, ARCHIVE_TABLES[kind.table], kind.key, keys)
+        logins_taken = _existing(self.conn, 'User', 'Username', [row[3][0] for row in batch if row[3]])
+        seen_keys, seen_usernames = set(), set()
+        for line, key, _, login in batch:
+            if key is not None:
+                if key in taken or key in seen_keys:
+                    bad.setdefault(line, f'{kind.key} {key} already exists')
+                seen_keys.add(key)
+            if login:
+                if login[0] in logins_taken or login[0] in seen_usernames:
+                    bad.setdefault(line, f'Username {login[0]} already exists')
+                seen_usernames.add(login[0])
+
+        for line, message in bad.items():
+            self.fail(line, message)
+        return [row for row in batch if row[0] not in bad]
+
+    def _assign_keys(self, batch):
+        # Logins need the new rows' ids, which executemany does not return
+        kind = self.kind
+        last = self.conn.execute(
+            f"SELECT max(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),"
+            f" COALESCE((SELECT MAX({kind.key}) FROM {kind.table}), 0))",
+            (kind.table,)).fetchone()[0]
+        for row in batch:
+            last = max(last, row[1] or 0)
+        for row in batch:
+            if row[1] is None:
+                last += 1
+                row[1] = last
+
+    def _insert(self, rows):
+        kind = self.kind
+        columns = (kind.key,) + kind.columns
+        self.conn.executemany(
+            f"INSERT INTO {kind.table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [[key] + values for _, key, values, _ in rows])
+        logins = [(login[0], login[2], kind.role, key) for _, key, _, login in rows if login]
+        if logins:
+            self.conn.executemany(
+                'INSERT INTO User (Username, Password, Role, ReferenceID) VALUES (?, ?, ?, ?)', logins)
+
+    def _insert_each(self, rows):
+        kept = []
+        for row in rows:
+            self.conn.execute('SAVEPOINT import_row')
+            try:
+                self._insert([row])
+                kept.append(row)
+            except sqlite3.IntegrityError as e:
+                self.conn.execute('ROLLBACK TO import_row')
+                self.fail(row[0], f'Rejected by the database: {e}')
+            self.conn.execute('RELEASE import_row')
+        return kept
+
+    def write(self, batch):
+        self._hash_logins(batch)
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self._check(batch)
+            explicit_keys = [row[1] for row in rows]
+            self._assign_keys(rows)
+            try:
+                self._insert(rows)
+            except sqlite3.IntegrityError:
+                # Something the checks above don't cover (e.g. a double-booked
+                # slot). A savepoint around the whole batch would make every
+                # insert several times slower, so start the batch over and
+                # insert row by row to find the offenders.
+                conn.rollback()
+                conn.execute('BEGIN IMMEDIATE')
+                for row, key in zip(rows, explicit_keys):
+                    row[1] = key
+                self._assign_keys(rows)
+                rows = self._insert_each(rows)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self.report['imported'] += len(rows)
+        self.report['batches'] += 1
+
+
+# === Deferred index builds (offline loads) ===
+
+def drop_secondary_structures(conn, table):
+    """Drop table's non-unique indexes and its triggers before a large load.
+
+    Unique indexes stay, since they enforce constraints. finish_deferred()
+    recreates the rest and rebuilds what the triggers would have maintained.
+    Nothing else should write to the database in between.
+    """
+    dropped = conn.execute('''
+        SELECT type, name FROM sqlite_master
+        WHERE tbl_name = ? AND ((type = 'index' AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%')
+                                OR type = 'trigger')
+    ''', (table,)).fetchall()
+    for object_type, name in dropped:
+        conn.execute(f'DROP {object_type.upper()} {name}')
+    conn.commit()
+    return [name for _, name in dropped]
+
+
+def finish_deferred(conn, table):
+    cursor = conn.cursor()
+    create_indexes(cursor)
+    create_triggers(cursor)
+    if table == 'Appointment':
+        rebuild_stats(conn)
+        rebuild_day_load(conn)
+    elif table in ('Doctor', 'Patient'):
+        cursor.execute(f"INSERT INTO {table}Search ({table}Search) VALUES ('rebuild')")
+    # The version triggers were off too, so cached ETags must still change
+    conn.execute("UPDATE ResourceVersion SET Version = Version + 1 WHERE Resource IN (?, 'User')", (table,))
+    conn.commit()
+
+
+def import_stream(conn, kind, stream, fmt, batch_size=None, defer_indexes=False):
+    importer = Importer(conn, kind, batch_size)
+    if not defer_indexes:
+        return importer.run(read_records(stream, fmt, importer.kind.fields))
+    table = importer.kind.table
+    drop_secondary_structures(conn, table)
+    try:
+        report = importer.run(read_records(stream, fmt, importer.kind.fields))
+    finally:
+        started = time.perf_counter()
+        finish_deferred(conn, table)
+    report['index_build_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def detect_format(name):
+    return 'csv' if name.lower().endswith('.csv') else 'ndjson'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import patients, doctors, appointments or History')
+    parser.add_argument('kind', choices=list(KINDS))
+    parser.add_argument('file', help="CSV or NDJSON file, '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help='drop secondary indexes and triggers during the load (no other writers)')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    upgrade_schema(args.db)
+    conn = sqlite3.connect(args.db)
+    apply_pragmas(conn)
+    fmt = args.format or detect_format(args.file)
+    if args.file == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        stream = open(args.file, encoding='utf-8-sig', newline='')
+    try:
+        report = import_stream(conn, args.kind, stream, fmt, args.batch_size, args.defer_indexes)
+    except ImportFormatError as e:
+        print(f'Error: {e}')
+        return 2
+    finally:
+        stream.close()
+        conn.close()
+
+    for error in itertools.islice(report['errors'], 50):
+        print(f"line {error['line']}: {error['error']}")
+    if report['failed'] > 50:
+        print(f"... {report['failed'] - 50} more")
+    print(f"{report['rows']} rows, {report['imported']} imported, {report['failed']} failed "
+          f"in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
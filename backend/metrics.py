@@ -0,0 +1,374 @@
+"""Request latency, SQL timing and slow-query logging, exported at /metrics.
+
+Request hooks time every request into a histogram per endpoint and count
+responses per status. Pooled connections are TimedConnections: each
+statement is timed from execute() until its cursor is exhausted, executes
+again or is dropped, including the fetchone/fetchmany/fetchall calls in
+between (rows read by iterating the cursor are not timed: a Python-level
+__next__ would double the cost of iteration), and is recorded against the
+endpoint that ran it and its normalised text (IN lists of any length count
+as one statement). Statements slower than monitoring.slow_query_ms
+are logged with the shape of their parameters (never the values) and their
+EXPLAIN QUERY PLAN, which is looked up on a separate connection and cached
+per statement.
+
+GET /metrics renders all of it, plus the stats() of the pool, cache and
+friends, in the Prometheus text format. It answers loopback clients, or
+anyone sending monitoring.metrics_token as a Bearer token.
+
+Recording is off by default. monitoring.enabled turns on the request
+metrics; performance_monitoring adds the SQL timing and slow-query log
+(development.show_sql_queries also needs it). Recording adds about a
+microsecond per request and a few per statement (benchmarks/bench_metrics.py).
+With both off, /metrics still serves the pool, cache and friends' stats.
+"""
+import bisect
+import hashlib
+import hmac
+import itertools
+import logging
+import re
+import sqlite3
+import threading
+import time
+from flask import Response, g, request
+from config import get_setting
+
+MONITORING_ENABLED = get_setting('monitoring', 'enabled', False)
+TRACK_API_CALLS = MONITORING_ENABLED and get_setting('monitoring', 'track_api_calls', True)
+SQL_TIMING = MONITORING_ENABLED and get_setting('monitoring', 'performance_monitoring', False)
+SLOW_QUERY_SECONDS = get_setting('monitoring', 'slow_query_ms', 100) / 1000
+MAX_STATEMENTS = get_setting('monitoring', 'max_tracked_statements', 500)
+METRICS_TOKEN = get_setting('monitoring', 'metrics_token', None)
+SHOW_SQL = get_setting('development', 'show_sql_queries', False)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5)
+
+# Slow statements are explained again after this long, in case the plan changed
+PLAN_CACHE_SECONDS = 600
+
+LOOPBACK = ('127.0.0.1', '::1')
+
+log = logging.getLogger('hospital.sql')
+
+
+class _RequestContext(threading.local):
+    endpoint = None   # of the request this thread is serving
+
+
+_context = _RequestContext()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} counter')
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {value}')
+
+
+class Histogram:
+    """Bucket counts per label set, rendered cumulatively as Prometheus expects."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._lock = threading.Lock()
+        self._series = {}   # label values -> [count per bucket..., count above the last, sum]
+
+    def observe(self, labels, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} histogram')
+        with self._lock:
+            series = sorted((labels, list(counts)) for labels, counts in self._series.items())
+        for labels, counts in series:
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                total += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, le)} {total}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {counts[-1]:.6f}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {total}')
+
+
+request_seconds = Histogram('hospital_request_duration_seconds', 'Time to build the response, by endpoint',
+                            ('endpoint', 'method'), REQUEST_BUCKETS)
+requests_total = Counter('hospital_requests_total', 'Responses by endpoint and status',
+                         ('endpoint', 'method', 'status'))
+sql_seconds = Histogram('hospital_sql_statement_duration_seconds', 'Execute plus fetch time per statement',
+                        ('query',), SQL_BUCKETS)
+sql_endpoint_seconds = Counter('hospital_sql_seconds_total', 'Time spent in SQL, by endpoint', ('endpoint',))
+sql_endpoint_statements = Counter('hospital_sql_statements_total', 'Statements run, by endpoint', ('endpoint',))
+slow_statements = Counter('hospital_sql_slow_statements_total', 'Statements over slow_query_ms', ('query',))
+
+
+# === Statements ===
+
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+class StatementRegistry:
+    """Normalised statement text by short id, capped at max_statements ids."""
+
+    def __init__(self, max_statements=MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._keys = {}    # raw SQL -> id
+        self.texts = {}    # id -> normalised text
+        self._plans = {}   # id -> (explained at, plan lines)
+
+    def key(self, sql):
+        key = self._keys.get(sql)
+        if key is not None:
+            return key
+        text = ' '.join(_IN_LIST.sub('(?, ...)', sql).split())
+        key = hashlib.sha1(text.encode()).hexdigest()[:12]
+        with self._lock:
+            if key not in self.texts and len(self.texts) >= self.max_statements:
+                key = 'other'
+            else:
+                self.texts[key] = text
+            if len(self._keys) < self.max_statements * 4:
+                self._keys[sql] = key
+        return key
+
+    def plan(self, key, db_path, sql, parameters):
+        cached = self._plans.get(key)
+        if cached and cached[0] > time.monotonic() - PLAN_CACHE_SECONDS:
+            return cached[1]
+        try:
+            # A separate read-only connection: the statement's own may be mid-transaction
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+            try:
+                plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)]
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError) as e:
+            plan = [f'(no plan: {e})']
+        self._plans[key] = (time.monotonic(), plan)
+        return plan
+
+
+statements = StatementRegistry()
+
+
+def parameters_shape(parameters):
+    """'(int, str x 3)' or '{name: str}': the types of the parameters, not their values."""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+    runs = []
+    for name, group in itertools.groupby(type(value).__name__ for value in parameters):
+        count = len(list(group))
+        runs.append(name if count == 1 else f'{name} x {count}')
+    return '(' + ', '.join(runs) + ')'
+
+
+def record_statement(sql, parameters, elapsed, db_path, many=False):
+    endpoint = _context.endpoint or 'none'
+    key = statements.key(sql)
+    sql_seconds.observe((key,), elapsed)
+    sql_endpoint_seconds.inc((endpoint,), elapsed)
+    sql_endpoint_statements.inc((endpoint,))
+    if SHOW_SQL:
+        log.info('%.2f ms %s %s', elapsed * 1000, endpoint, statements.texts.get(key, sql))
+    if elapsed < SLOW_QUERY_SECONDS:
+        return
+    slow_statements.inc((key,))
+    if many:
+        shape, plan = 'executemany', ['(not explained)']
+    else:
+        shape, plan = parameters_shape(parameters), statements.plan(key, db_path, sql, parameters)
+    log.warning('Slow query %.1f ms in %s [%s] %s params %s\n  plan: %s', elapsed * 1000, endpoint, key,
+                statements.texts.get(key, ' '.join(sql.split())), shape, '\n        '.join(plan) or '(none)')
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Times its statement from execute() until it is exhausted, re-executed or dropped."""
+
+    _sql = None
+
+    def _start(self, sql, parameters, many):
+        self._finish()
+        self._sql, self._parameters, self._many, self._elapsed = sql, parameters, many, 0.0
+
+    def _finish(self):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            record_statement(sql, self._parameters, self._elapsed, self.connection.db_path, self._many)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters, False)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._elapsed += time.perf_counter() - started
+            if self.description is None:
+                self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, (), True)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._elapsed += time.perf_counter() - started
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._elapsed += time.perf_counter() - started
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._elapsed += time.perf_counter() - started
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._elapsed += time.perf_counter() - started
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors time their statements (pass as factory=)."""
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db_path = database
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    # Connection.execute() makes its cursor in C, without calling cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# === Request hooks and /metrics ===
+
+_stats_sources = []   # (name, stats function)
+
+
+def register_stats(name, stats):
+    """Export the numeric entries of stats() (nested dicts too) as hospital_<name>_<key> gauges."""
+    _stats_sources.append((name, stats))
+
+
+def _flatten(prefix, stats):
+    for key, value in sorted(stats.items()):
+        if isinstance(value, dict):
+            yield from _flatten(f'{prefix}_{key}', value)
+        elif isinstance(value, (bool, int, float)):
+            yield re.sub(r'\W', '_', f'{prefix}_{key}'), int(value) if isinstance(value, bool) else value
+
+
+def _render_stats(lines):
+    for source, stats in _stats_sources:
+        for name, value in _flatten(f'hospital_{source}', stats()):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+
+
+def render():
+    lines = []
+    for metric in (request_seconds, requests_total, sql_seconds, sql_endpoint_seconds,
+                   sql_endpoint_statements, slow_statements):
+        metric.render(lines)
+    lines.append('# HELP hospital_sql_statement_info Normalised text of each statement id')
+    lines.append('# TYPE hospital_sql_statement_info gauge')
+    for key, text in sorted(statements.texts.items()):
+        lines.append(f'hospital_sql_statement_info{_labels(("query", "statement"), (key, text[:300]))} 1')
+    _render_stats(lines)
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    header = request.headers.get('Authorization', '')
+    allowed = (hmac.compare_digest(header, f'Bearer {METRICS_TOKEN}') if METRICS_TOKEN
+               else request.remote_addr in LOOPBACK)
+    if not allowed:
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if not MONITORING_ENABLED:
+        return
+
+    # Registered before the rate limiter's hook so rejected requests are timed too
+    @app.before_request
+    def start_request_timer():
+        _context.endpoint = request.endpoint or 'unmatched'
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and TRACK_API_CALLS:
+            endpoint = request.endpoint or 'unmatched'
+            request_seconds.observe((endpoint, request.method), time.perf_counter() - started)
+            requests_total.inc((endpoint, request.method, str(response.status_code)))
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        started = g.pop('request_started', None)
+        if started is not None and TRACK_API_CALLS:
+            # An unhandled exception skips after_request
+            endpoint = request.endpoint or 'unmatched'
+            request_seconds.observe((endpoint, request.method), time.perf_counter() - started)
+            requests_total.inc((endpoint, request.method, '500'))
+        _context.endpoint = None
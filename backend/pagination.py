@@ -0,0 +1,106 @@
+import base64
+import binascii
+import datetime
+import json
+from config import get_setting
+
+DEFAULT_PAGE_SIZE = get_setting('api', 'default_page_size', 50)
+MAX_PAGE_SIZE = get_setting('api', 'max_page_size', 500)
+
+APPOINTMENT_STATUSES = ['Scheduled', 'Completed', 'Cancelled']
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# === Cursors ===
+# A cursor is the sort key of the last row on the previous page, JSON encoded
+# and base64'd so clients treat it as an opaque token.
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def page_args(args, key_size):
+    """Return (limit, cursor values or None) from the query string."""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('limit must be a number')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    token = args.get('cursor')
+    cursor = decode_cursor(token, key_size) if token else None
+    return limit, cursor
+
+
+def page(rows, limit, key):
+    """Build the response body from rows fetched with LIMIT limit + 1."""
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+# === Filters ===
+
+def _parse_date(value, name):
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt), fmt
+        except ValueError:
+            continue
+    raise PaginationError(f'{name} must be YYYY-MM-DD or YYYY-MM-DD HH:MM')
+
+
+def appointment_filters(args, alias='a', allow_doctor=False):
+    """Translate status / date_from / date_to (/ doctor_id) into SQL clauses."""
+    clauses, params = [], []
+
+    status = args.get('status')
+    if status:
+        if status not in APPOINTMENT_STATUSES:
+            raise PaginationError('Invalid status')
+        clauses.append(f'{alias}.Status = ?')
+        params.append(status)
+
+    date_from = args.get('date_from')
+    if date_from:
+        _parse_date(date_from, 'date_from')
+        clauses.append(f'{alias}.AppointmentDate >= ?')
+        params.append(date_from)
+
+    date_to = args.get('date_to')
+    if date_to:
+        parsed, fmt = _parse_date(date_to, 'date_to')
+        if fmt == '%Y-%m-%d':
+            # A bare date includes the whole day
+            clauses.append(f'{alias}.AppointmentDate < ?')
+            params.append((parsed + datetime.timedelta(days=1)).strftime('%Y-%m-%d'))
+        else:
+            clauses.append(f'{alias}.AppointmentDate <= ?')
+            params.append(date_to)
+
+    doctor_id = args.get('doctor_id')
+    if allow_doctor and doctor_id:
+        try:
+            params.append(int(doctor_id))
+        except ValueError:
+            raise PaginationError('doctor_id must be a number')
+        clauses.append(f'{alias}.DoctorID = ?')
+
+    return clauses, params
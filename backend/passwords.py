@@ -0,0 +1,159 @@
+"""Salted password hashing (scrypt / PBKDF2) and the pool that runs it.
+
+Hashes are stored in User.Password as self-describing strings:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+Anything else is a legacy plaintext password. It still verifies, and
+login replaces it with a hash (see needs_rehash()).
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from config import get_setting
+
+SCHEME = get_setting('security', 'password_hash_scheme', 'scrypt')
+SCRYPT_N = get_setting('security', 'scrypt_n', 2 ** 14)
+SCRYPT_R = get_setting('security', 'scrypt_r', 8)
+SCRYPT_P = get_setting('security', 'scrypt_p', 1)
+PBKDF2_ITERATIONS = get_setting('security', 'pbkdf2_iterations', 600000)
+
+# hashlib releases the GIL while hashing, so threads run KDFs in parallel
+HASH_WORKERS = get_setting('security', 'hash_workers', os.cpu_count() or 2)
+HASH_MAX_PENDING = get_setting('security', 'hash_max_pending', 64)
+HASH_TIMEOUT_SECONDS = get_setting('security', 'hash_timeout_seconds', 10)
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem must cover the 128 * n * r bytes scrypt needs
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=KEY_BYTES)
+
+
+def hash_password(password, scheme=None):
+    scheme = scheme or SCHEME
+    salt = os.urandom(SALT_BYTES)
+    if scheme == 'scrypt':
+        key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}'
+    if scheme == 'pbkdf2_sha256':
+        key = _pbkdf2(password, salt, PBKDF2_ITERATIONS)
+        return f'pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(key)}'
+    raise ValueError(f'Unknown password hash scheme {scheme!r}')
+
+
+def is_hashed(stored):
+    return stored.startswith(('scrypt$', 'pbkdf2_sha256$'))
+
+
+def verify_password(password, stored):
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        # Legacy plaintext row
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        parts = stored.split('$')
+        if parts[0] == 'scrypt':
+            n, r, p = (int(value) for value in parts[1:4])
+            expected, key = _unb64(parts[5]), _scrypt(password, _unb64(parts[4]), n, r, p)
+        else:
+            expected, key = _unb64(parts[3]), _pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+    except (ValueError, IndexError):
+        return False
+    return hmac.compare_digest(key, expected)
+
+
+def needs_rehash(stored):
+    """True for plaintext rows and hashes made with other scheme/cost settings."""
+    if SCHEME == 'scrypt':
+        return not stored.startswith(f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$')
+    return not stored.startswith(f'pbkdf2_sha256${PBKDF2_ITERATIONS}$')
+
+
+def check_password(password, stored):
+    """Verify, and return (ok, new hash to store or None)."""
+    if stored is None:
+        # Unknown user: spend the same work so timing does not reveal it
+        verify_password(password, DUMMY_HASH)
+        return False, None
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+
+DUMMY_HASH = hash_password('not-a-real-password')
+
+
+# === Bounded hashing pool ===
+
+class HashPoolBusy(Exception):
+    pass
+
+
+class HashPool:
+    """Runs KDF work off the request thread with a bounded backlog.
+
+    At most `workers` hashes run at once and at most `max_pending` more
+    wait for a worker; further requests are refused immediately with
+    HashPoolBusy instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, timeout=HASH_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'submitted': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HashPoolBusy('Too many password checks in progress')
+        with self._lock:
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HashPoolBusy('Password check timed out')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=self._in_flight, workers=self.workers,
+                        max_pending=self.max_pending, scheme=SCHEME)
+
+
+hash_pool = HashPool()
@@ -0,0 +1,249 @@
+"""Profile single requests on demand, or every request at a low sampling rate.
+
+An admin request carrying `X-Profile: 1` (or ?profile=1) runs under a
+deterministic profiler: sys.setprofile() on the request's thread charges
+the time between profiler events to the current call stack. The result is
+kept under the request ID (X-Request-ID if the client sent a usable one,
+otherwise a new one, returned as X-Profile-ID) in the last max_profiles
+profiles, readable at /api/admin/system/profiles/<id>. The profiler costs
+a few times the request's Python time, so only profile what you ask for.
+
+With monitoring.profile_sample_hz above zero, one background thread also
+samples the stacks of the threads serving requests that many times a
+second, into a process-wide profile at /api/admin/system/profiles/continuous.
+At 10-50 Hz that is a few frame walks per second, cheap enough to leave on.
+
+Both are in the collapsed-stack format flamegraph.pl and speedscope read:
+one `frame;frame;frame weight` line per stack, rooted at the endpoint.
+Weights are microseconds for request profiles and samples for the
+continuous one.
+"""
+import collections
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from flask import g, request
+from config import get_setting
+from tokens import REQUIRE_AUTH, request_claims
+
+PROFILE_REQUESTS = get_setting('monitoring', 'profile_requests', True)
+SAMPLE_HZ = get_setting('monitoring', 'profile_sample_hz', 0)
+MAX_PROFILES = get_setting('monitoring', 'max_profiles', 100)
+MAX_STACKS = get_setting('monitoring', 'profile_max_stacks', 20000)
+
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_labels = {}   # code object -> 'module.py:function'
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f'{os.path.basename(code.co_filename)}:{code.co_name}'
+    return label
+
+
+def _c_label(function):
+    # Builtin methods have no module; their qualname already names the type
+    module = getattr(function, '__module__', None) or '~'
+    return f'{module}:{getattr(function, "__qualname__", function.__name__)}'
+
+
+def frame_stack(frame):
+    """Labels of frame and its callers, outermost first."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def collapsed(stacks):
+    """Render {stack: weight} as collapsed-stack text, heaviest first."""
+    return ''.join(f'{stack} {weight}\n' for stack, weight in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+# === Deterministic request profiles ===
+
+class RequestProfile:
+    """sys.setprofile() callback charging elapsed time to the active stack."""
+
+    def __init__(self, root):
+        self.stacks = collections.Counter()
+        # keys[i] is the collapsed stack down to depth i
+        self.keys = [root]
+        self.last = time.perf_counter_ns()
+
+    def start(self):
+        # Seed with the frames already running, start() included: the first
+        # event the callback sees is start() returning
+        for label in frame_stack(sys._getframe()):
+            self.keys.append(f'{self.keys[-1]};{label}')
+        self.started = time.perf_counter()
+        self.last = time.perf_counter_ns()
+        sys.setprofile(self)
+
+    def stop(self):
+        sys.setprofile(None)
+        self.duration = time.perf_counter() - self.started
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        keys = self.keys
+        self.stacks[keys[-1]] += now - self.last
+        if event == 'call':
+            keys.append(f'{keys[-1]};{_label(frame.f_code)}')
+        elif event == 'c_call':
+            keys.append(f'{keys[-1]};{_c_label(arg)}')
+        elif len(keys) > 1:
+            # return, c_return, c_exception
+            keys.pop()
+        self.last = time.perf_counter_ns()
+
+    def result(self):
+        return {stack: ns // 1000 for stack, ns in self.stacks.items() if ns >= 1000}
+
+
+class ProfileStore:
+    def __init__(self, max_profiles=MAX_PROFILES):
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._profiles = collections.OrderedDict()   # request id -> profile
+
+    def add(self, request_id, profile):
+        with self._lock:
+            self._profiles[request_id] = profile
+            self._profiles.move_to_end(request_id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, request_id):
+        return self._profiles.get(request_id)
+
+    def summaries(self):
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [{key: value for key, value in profile.items() if key != 'stacks'} for profile in reversed(profiles)]
+
+
+profiles = ProfileStore()
+
+
+def wants_profile():
+    if request.headers.get('X-Profile', '').lower() not in ('1', 'true') and \
+            request.args.get('profile') not in ('1', 'true'):
+        return False
+    if not REQUIRE_AUTH:
+        return True
+    claims = request_claims()
+    return claims is not None and claims['role'] == 'Admin'
+
+
+# === Continuous sampling ===
+
+class Sampler:
+    """Samples the stacks of request-serving threads hz times a second."""
+
+    def __init__(self, hz=SAMPLE_HZ, max_stacks=MAX_STACKS):
+        self.hz = hz
+        self.max_stacks = max_stacks
+        self.serving = {}   # thread id -> endpoint
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.since = time.time()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.hz > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        interval = 1 / self.hz
+        while not self._stopped.wait(interval):
+            self.sample()
+
+    def sample(self):
+        serving = dict(self.serving)
+        if not serving:
+            return
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, endpoint in serving.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = ';'.join([endpoint] + frame_stack(frame))
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                else:
+                    self.dropped += 1
+                self.samples += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            stacks = dict(self.stacks)
+            info = {'hz': self.hz, 'samples': self.samples, 'dropped': self.dropped, 'since': self.since}
+            if reset:
+                self.stacks.clear()
+                self.samples = self.dropped = 0
+                self.since = time.time()
+        return stacks, info
+
+
+sampler = Sampler()
+
+
+def init_app(app):
+    if not PROFILE_REQUESTS and SAMPLE_HZ <= 0:
+        return
+    sampler.start()
+
+    @app.before_request
+    def start_profile():
+        endpoint = request.endpoint or 'unmatched'
+        if SAMPLE_HZ > 0:
+            sampler.serving[threading.get_ident()] = endpoint
+        if PROFILE_REQUESTS and wants_profile():
+            given = request.headers.get('X-Request-ID', '')
+            g.profile_id = given if _REQUEST_ID.match(given) else uuid.uuid4().hex
+            g.profile = RequestProfile(f'{request.method} {endpoint}')
+            g.profile.start()
+
+    @app.after_request
+    def add_profile_header(response):
+        if 'profile_id' in g:
+            response.headers['X-Profile-ID'] = g.profile_id
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.stop()
+            profiles.add(g.profile_id, {
+                'request_id': g.profile_id,
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'started': datetime.datetime.fromtimestamp(time.time() - profile.duration).isoformat(
+                    timespec='milliseconds'),
+                'duration_ms': round(profile.duration * 1000, 3),
+                'error': repr(exc) if exc is not None else None,
+                'stacks': profile.result(),
+            })
+        sampler.serving.pop(threading.get_ident(), None)
@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import jsonify, request
+from config import get_setting
+
+RATE_LIMIT_ENABLED = get_setting('api', 'rate_limit_enabled', False)
+RATE_LIMIT_PER_MINUTE = get_setting('api', 'rate_limit_per_minute', 60)
+RATE_LIMIT_MAX_KEYS = get_setting('api', 'rate_limit_max_keys', 100000)
+MAX_LOGIN_ATTEMPTS = get_setting('security', 'max_login_attempts', 5)
+MAX_FAILED_LOGINS_PER_IP = get_setting('security', 'max_failed_logins_per_ip', 20)
+LOCKOUT_SECONDS = get_setting('security', 'lockout_duration_minutes', 30) * 60
+
+
+class SlidingWindowLimiter:
+    """Approximate sliding-window counter per key, bounded in memory.
+
+    Each key keeps the count of the current fixed window and of the one
+    before it; the sliding estimate weights the previous window by how much
+    of it still overlaps [now - window, now]. That is three numbers per key
+    and O(1) per check.
+
+    Keys are kept in least-recently-used order, so keys idle for two
+    windows (whose counts no longer matter) are dropped from the front on
+    every call, and past max_keys the least recently used key is evicted.
+    """
+
+    def __init__(self, limit, window_seconds, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.limit = limit
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> [window_start, previous_count, current_count]
+        self._stats = {'allowed': 0, 'rejected': 0, 'expired': 0, 'evicted': 0}
+
+    def _entry(self, key, now):
+        # Drop keys that have been idle for two full windows
+        horizon = now - 2 * self.window
+        while self._entries:
+            oldest_key, oldest = next(iter(self._entries.items()))
+            if oldest[0] >= horizon:
+                break
+            del self._entries[oldest_key]
+            self._stats['expired'] += 1
+
+        window_start = now - now % self.window
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [window_start, 0, 0]
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+        elif entry[0] != window_start:
+            previous = entry[2] if entry[0] == window_start - self.window else 0
+            entry[:] = [window_start, previous, 0]
+        self._entries.move_to_end(key)
+        return entry
+
+    def _estimate(self, entry, now):
+        overlap = 1 - (now - entry[0]) / self.window
+        return entry[1] * overlap + entry[2]
+
+    def allow(self, key, now=None):
+        """Count one event for key unless it is over the limit."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entry(key, now)
+            if self._estimate(entry, now) >= self.limit:
+                self._stats['rejected'] += 1
+                return False
+            entry[2] += 1
+            self._stats['allowed'] += 1
+            return True
+
+    def record(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entry(key, now)[2] += 1
+
+    def exceeded(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and self._estimate(self._entry(key, now), now) >= self.limit
+
+    def reset(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def retry_after(self, now=None):
+        # Upper bound: the current window has rolled over by then
+        now = time.monotonic() if now is None else now
+        return max(1, int(self.window - now % self.window))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, keys=len(self._entries), max_keys=self.max_keys,
+                        limit=self.limit, window_seconds=self.window)
+
+
+class Lockout:
+    """Locks a key out for lockout_seconds once it reaches `limit` failures.
+
+    Failures are counted by a SlidingWindowLimiter over lockout_seconds. The
+    failure that reaches the limit records locked_until = now +
+    lockout_seconds and clears the count, so a lockout lasts exactly
+    lockout_seconds wherever the failures fall in the counter's windows.
+    Every lockout has the same length, so locking order is expiry order and
+    expired locks are dropped from the front.
+    """
+
+    def __init__(self, limit, lockout_seconds, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.lockout_seconds = lockout_seconds
+        self.max_keys = max_keys
+        self.failures = SlidingWindowLimiter(limit, lockout_seconds, max_keys)
+        self._lock = threading.Lock()
+        self._locked = OrderedDict()   # key -> locked_until, oldest first
+        self._lockouts = 0
+
+    def failed(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        self.failures.record(key, now)
+        if not self.failures.exceeded(key, now):
+            return
+        self.failures.reset(key)
+        with self._lock:
+            self._locked.pop(key, None)
+            self._locked[key] = now + self.lockout_seconds
+            self._lockouts += 1
+            if len(self._locked) > self.max_keys:
+                self._locked.popitem(last=False)
+
+    def retry_after(self, key, now=None):
+        """Seconds until key's lockout ends; 0 when it is not locked out."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._locked:
+                oldest_key, until = next(iter(self._locked.items()))
+                if until > now:
+                    break
+                del self._locked[oldest_key]
+            until = self._locked.get(key)
+        return 0 if until is None else max(1, math.ceil(until - now))
+
+    def reset(self, key):
+        self.failures.reset(key)
+        with self._lock:
+            self._locked.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            locked = len(self._locked)
+        return dict(self.failures.stats(), lockouts=self._lockouts, locked=locked,
+                    lockout_seconds=self.lockout_seconds)
+
+
+# Requests per client IP (login/register always, every API route when enabled)
+request_limiter = SlidingWindowLimiter(RATE_LIMIT_PER_MINUTE, 60)
+# Failed logins per username and per client IP; reaching the limit locks out
+login_failures = Lockout(MAX_LOGIN_ATTEMPTS, LOCKOUT_SECONDS)
+ip_login_failures = Lockout(MAX_FAILED_LOGINS_PER_IP, LOCKOUT_SECONDS)
+
+
+def _too_many(message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def limit_requests():
+    """before_request hook: reject a client over rate_limit_per_minute."""
+    if request.method != 'OPTIONS' and not request_limiter.allow(request.remote_addr):
+        return _too_many('Too many requests', request_limiter.retry_after())
+    return None
+
+
+def check_login_lockout(username):
+    """A 429 response if the account or the client is locked out, else None."""
+    wait = login_failures.retry_after(username.lower())
+    if wait:
+        return _too_many('Too many failed logins, account temporarily locked', wait)
+    wait = ip_login_failures.retry_after(request.remote_addr)
+    if wait:
+        return _too_many('Too many failed logins from this address', wait)
+    return None
+
+
+def login_failed(username):
+    login_failures.failed(username.lower())
+    ip_login_failures.failed(request.remote_addr)
+
+
+def login_succeeded(username):
+    login_failures.reset(username.lower())
+
+
+def stats():
+    return {
+        'requests': request_limiter.stats(),
+        'login_failures': login_failures.stats(),
+        'ip_login_failures': ip_login_failures.stats(),
+        'enabled_for_all_routes': RATE_LIMIT_ENABLED,
+    }
+
+
+def init_app(app):
+    # The auth blueprint is always limited (see routes/auth_routes.py)
+    if not RATE_LIMIT_ENABLED:
+        return
+
+    @app.before_request
+    def limit_api_requests():
+        if request.path.startswith('/api/') and not request.path.startswith('/api/auth/'):
+            return limit_requests()
+        return None
@@ -1,39 +1,67 @@
-from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+import io
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from archive import ArchiveBusy, archive_union, archiver, include_archived
+from backup import BackupBusy, BackupError, backups
+from bulk_appointments import BulkError, apply_operations, changed_appointments
+from cache import reference_cache
+from database import get_db_connection, pool
+from etags import conditional, resource_versions
+from events import event_hub, publish_appointments
+from exporter import ExportError, check_request, export_filename, export_rows, watermark
+from importer import FORMATS, ImportFormatError, import_stream
+from pagination import PaginationError, appointment_filters, page, page_args
+from passwords import HashPoolBusy, hash_password, hash_pool
+from profiler import collapsed, profiles, sampler
+from ratelimit import stats as rate_limit_stats
+from search import match_expression, search_limit
+from slots import DayFull, SlotTaken, set_status
+from streaming import NDJSON_MIMETYPE, stream_query, wants_stream
+from tokens import protect, revocations
+from validation import ValidationError, doctor_fields
 
 admin_bp = Blueprint('admin', __name__)
-
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital.db')
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# The patient dashboard lists doctors through the admin directory
+protect(admin_bp, ('Admin',), overrides={'admin.get_doctors': ('Admin', 'Doctor', 'Patient')})
 
 
 # ====== DOCTOR CRUD ======
 
 @admin_bp.route('/doctors', methods=['GET'])
+@conditional('Doctor')
 def get_doctors():
-    conn = get_db_connection()
-    doctors = conn.execute('SELECT * FROM Doctor').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in doctors])
+    try:
+        limit, cursor = page_args(request.args, 1)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    after_id = cursor[0] if cursor else 0
+
+    def load():
+        conn = get_db_connection()
+        doctors = conn.execute(
+            'SELECT * FROM Doctor WHERE DoctorID > ? ORDER BY DoctorID LIMIT ?',
+            (after_id, limit + 1)
+        ).fetchall()
+        conn.close()
+        return page(doctors, limit, lambda row: [row['DoctorID']])
+
+    return jsonify(reference_cache.get_or_load(('doctors', after_id, limit), load, resource_versions()))
 
 
 @admin_bp.route('/doctors', methods=['POST'])
 def add_doctor():
     data = request.get_json()
-    name = data.get('name')
-    specialization = data.get('specialization')
-    department_id = data.get('department_id')
-    contact = data.get('contact')
-    email = data.get('email')
     password = data.get('password', 'doctor123')  # Admin sets password, default to 'doctor123' if not provided
 
-    if not all([name, specialization, department_id, email]):
-        return jsonify({'error': 'Missing required fields (name, specialization, department, email)'}), 400
+    try:
+        name, specialization, department_id, contact, email = doctor_fields(data)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        password_hash = hash_pool.run(hash_password, password)
+    except HashPoolBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
 
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -53,11 +81,13 @@ def add_doctor():
     # Create a linked User entry with admin-provided password
     cursor.execute(
         'INSERT INTO User (Username, Password, Role, ReferenceID) VALUES (?, ?, ?, ?)',
-        (email, password, 'Doctor', doctor_id)
+        (email, password_hash, 'Doctor', doctor_id)
     )
 
     conn.commit()
     conn.close()
+    reference_cache.invalidate('doctors')
+    reference_cache.invalidate('doctor', doctor_id)
     return jsonify({'message': 'Doctor added successfully', 'login_username': email}), 201
 
 
@@ -77,6 +107,8 @@ def update_doctor(doctor_id):
     conn.execute(f'UPDATE Doctor SET {set_clause} WHERE DoctorID = ?', values)
     conn.commit()
     conn.close()
+    reference_cache.invalidate('doctors')
+    reference_cache.invalidate('doctor', doctor_id)
 
     return jsonify({'message': 'Doctor updated successfully'}), 200
 
@@ -92,6 +124,12 @@ def toggle_doctor_blacklist(doctor_id):
     conn.execute('UPDATE Doctor SET IsBlacklisted = ? WHERE DoctorID = ?', (status, doctor_id))
     conn.commit()
     conn.close()
+    if status:
+        revocations.revoke('Doctor', doctor_id)
+    reference_cache.invalidate('doctors')
+    reference_cache.invalidate('doctor', doctor_id)
+    # Everyone's doctor directory shows the flag
+    event_hub.publish('doctor.blacklist', {'DoctorID': doctor_id, 'IsBlacklisted': status}, public=True)
 
     return jsonify({'message': f'Doctor {"blacklisted" if status else "unblacklisted"} successfully'}), 200
 
@@ -103,17 +141,34 @@ def delete_doctor(doctor_id):
     conn.execute('DELETE FROM User WHERE Role = "Doctor" AND ReferenceID = ?', (doctor_id,))
     conn.commit()
     conn.close()
+    revocations.revoke('Doctor', doctor_id)
+    reference_cache.invalidate('doctors')
+    reference_cache.invalidate('doctor', doctor_id)
+    reference_cache.invalidate('availability', doctor_id)
     return jsonify({'message': 'Doctor deleted successfully'}), 200
 
 
 # ====== PATIENT CRUD ======
 
 @admin_bp.route('/patients', methods=['GET'])
+@conditional('Patient')
 def get_patients():
+    try:
+        limit, cursor = page_args(request.args, 1)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    after_id = cursor[0] if cursor else 0
+    sql = 'SELECT * FROM Patient WHERE PatientID > ? ORDER BY PatientID'
+
+    # Bulk export: stream the rest of the table instead of one page
+    if wants_stream():
+        return stream_query(sql, (after_id,))
+
     conn = get_db_connection()
-    patients = conn.execute('SELECT * FROM Patient').fetchall()
+    patients = conn.execute(sql + ' LIMIT ?', (after_id, limit + 1)).fetchall()
     conn.close()
-    return jsonify([dict(row) for row in patients])
+    return jsonify(page(patients, limit, lambda row: [row['PatientID']]))
 
 @admin_bp.route('/patients/<int:patient_id>', methods=['PUT'])
 def update_patient(patient_id):
@@ -175,6 +230,9 @@ def toggle_patient_blacklist(patient_id):
     conn.execute('UPDATE Patient SET IsBlacklisted = ? WHERE PatientID = ?', (status, patient_id))
     conn.commit()
     conn.close()
+    if status:
+        revocations.revoke('Patient', patient_id)
+    event_hub.publish('patient.blacklist', {'PatientID': patient_id, 'IsBlacklisted': status})
 
     return jsonify({'message': f'Patient {"blacklisted" if status else "unblacklisted"} successfully'}), 200
 
@@ -186,13 +244,14 @@ def delete_patient(patient_id):
     conn.execute('DELETE FROM User WHERE Role = "Patient" AND ReferenceID = ?', (patient_id,))
     conn.commit()
     conn.close()
+    revocations.revoke('Patient', patient_id)
     return jsonify({'message': 'Patient deleted successfully'}), 200
 
 # Get Prescription / History for a Patient
 @admin_bp.route('/patients/<int:patient_id>/history', methods=['GET'])
+@conditional('History', 'Appointment', 'Doctor')
 def get_patient_history(patient_id):
-    conn = get_db_connection()
-    history = conn.execute('''
+    sql, params = archive_union('''
         SELECT h.HistoryID, h.AppointmentID, h.Tests, h.MedicineName, h.Instructions,
                a.AppointmentDate, a.Status,
                d.Name AS DoctorName, d.Specialization
@@ -200,40 +259,48 @@ def get_patient_history(patient_id):
         JOIN Appointment a ON h.AppointmentID = a.AppointmentID
         JOIN Doctor d ON a.DoctorID = d.DoctorID
         WHERE h.PatientID = ?
-        ORDER BY a.AppointmentDate DESC
-    ''', (patient_id,)).fetchall()
+    ''', [patient_id], include_archived(request.args))
+
+    conn = get_db_connection()
+    history = conn.execute(sql + ' ORDER BY AppointmentDate DESC', params).fetchall()
     conn.close()
     return jsonify([dict(row) for row in history]), 200
 
 @admin_bp.route('/doctors/search', methods=['GET'])
+@conditional('Doctor')
 def search_doctors():
-    q = request.args.get('q', '').lower()
+    match = match_expression(request.args.get('q', ''))
+    if not match:
+        return jsonify([]), 200
 
+    # Prefix match on every word, best bm25 score first (name hits weigh most)
     conn = get_db_connection()
     doctors = conn.execute('''
-        SELECT * FROM Doctor
-        WHERE 
-            lower(Name) LIKE ? OR
-            lower(Specialization) LIKE ? OR
-            lower(Contact) LIKE ? OR
-            lower(Email) LIKE ?
-    ''', (f"%{q}%", f"%{q}%", f"%{q}%", f"%{q}%")).fetchall()
+        SELECT d.* FROM DoctorSearch s
+        JOIN Doctor d ON d.DoctorID = s.rowid
+        WHERE DoctorSearch MATCH ?
+        ORDER BY bm25(DoctorSearch, 10.0, 5.0, 1.0, 1.0)
+        LIMIT ?
+    ''', (match, search_limit(request.args))).fetchall()
 
     conn.close()
     return jsonify([dict(row) for row in doctors]), 200
 
 @admin_bp.route('/patients/search', methods=['GET'])
+@conditional('Patient')
 def search_patients():
-    q = request.args.get('q', '').lower()
+    match = match_expression(request.args.get('q', ''))
+    if not match:
+        return jsonify([]), 200
 
     conn = get_db_connection()
     patients = conn.execute('''
-        SELECT * FROM Patient
-        WHERE 
-            lower(Name) LIKE ? OR
-            lower(Contact) LIKE ? OR
-            lower(Address) LIKE ?
-    ''', (f"%{q}%", f"%{q}%", f"%{q}%")).fetchall()
+        SELECT p.* FROM PatientSearch s
+        JOIN Patient p ON p.PatientID = s.rowid
+        WHERE PatientSearch MATCH ?
+        ORDER BY bm25(PatientSearch, 10.0, 2.0, 1.0)
+        LIMIT ?
+    ''', (match, search_limit(request.args))).fetchall()
 
     conn.close()
     return jsonify([dict(row) for row in patients]), 200
@@ -241,11 +308,15 @@ def search_patients():
 # ====== DEPARTMENT CRUD ======
 
 @admin_bp.route('/departments', methods=['GET'])
+@conditional('Department')
 def get_departments():
-    conn = get_db_connection()
-    departments = conn.execute('SELECT * FROM Department').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in departments]), 200
+    def load():
+        conn = get_db_connection()
+        departments = conn.execute('SELECT * FROM Department').fetchall()
+        conn.close()
+        return [dict(row) for row in departments]
+
+    return jsonify(reference_cache.get_or_load(('departments',), load, resource_versions())), 200
 
 @admin_bp.route('/departments', methods=['POST'])
 def add_department():
@@ -260,6 +331,7 @@ def add_department():
     conn.execute('INSERT INTO Department (Name, Location) VALUES (?, ?)', (name, location))
     conn.commit()
     conn.close()
+    reference_cache.invalidate('departments')
     return jsonify({'message': 'Department added successfully'}), 201
 
 @admin_bp.route('/departments/<int:department_id>', methods=['PUT'])
@@ -278,6 +350,9 @@ def update_department(department_id):
     conn.execute(f'UPDATE Department SET {set_clause} WHERE DepartmentID = ?', values)
     conn.commit()
     conn.close()
+    reference_cache.invalidate('departments')
+    # Doctor detail pages embed the department name
+    reference_cache.invalidate('doctor')
 
     return jsonify({'message': 'Department updated successfully'}), 200
 
@@ -298,14 +373,27 @@ def delete_department(department_id):
     conn.execute('DELETE FROM Department WHERE DepartmentID = ?', (department_id,))
     conn.commit()
     conn.close()
+    reference_cache.invalidate('departments')
     return jsonify({'message': 'Department deleted successfully'}), 200
 
 # ====== APPOINTMENTS ======
 
 @admin_bp.route('/appointments', methods=['GET'])
+@conditional('Appointment', 'Patient', 'Doctor')
 def get_all_appointments():
-    conn = get_db_connection()
-    appointments = conn.execute('''
+    try:
+        limit, cursor = page_args(request.args, 2)
+        clauses, params = appointment_filters(request.args, allow_doctor=True)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Newest first; the cursor is the (date, id) of the last row already sent
+    if cursor:
+        clauses.append('(a.AppointmentDate, a.AppointmentID) < (?, ?)')
+        params.extend(cursor)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    sql, params = archive_union(f'''
         SELECT 
             a.AppointmentID,
             a.AppointmentDate,
@@ -318,10 +406,18 @@ def get_all_appointments():
         FROM Appointment a
         JOIN Patient p ON a.PatientID = p.PatientID
         JOIN Doctor d ON a.DoctorID = d.DoctorID
-        ORDER BY a.AppointmentDate DESC
-    ''').fetchall()
+        {where}
+    ''', params, include_archived(request.args))
+    sql += ' ORDER BY AppointmentDate DESC, AppointmentID DESC'
+
+    # Bulk export: stream every matching row instead of one page
+    if wants_stream():
+        return stream_query(sql, params)
+
+    conn = get_db_connection()
+    appointments = conn.execute(sql + ' LIMIT ?', params + [limit + 1]).fetchall()
     conn.close()
-    return jsonify([dict(row) for row in appointments]), 200
+    return jsonify(page(appointments, limit, lambda row: [row['AppointmentDate'], row['AppointmentID']])), 200
 
 @admin_bp.route('/appointments/<int:appointment_id>/status', methods=['PUT'])
 def update_appointment_status(appointment_id):
@@ -335,9 +431,175 @@ def update_appointment_status(appointment_id):
         return jsonify({'error': 'Invalid status'}), 400
     
     conn = get_db_connection()
-    conn.execute('UPDATE Appointment SET Status = ? WHERE AppointmentID = ?', (new_status, appointment_id))
-    conn.commit()
-    conn.close()
+    try:
+        if set_status(conn, appointment_id, new_status):
+            publish_appointments(conn, [appointment_id], 'appointment.updated')
+    except SlotTaken:
+        return jsonify({'error': 'Another appointment is already scheduled in this slot'}), 409
+    except DayFull:
+        return jsonify({'error': 'Doctor is fully booked on that day'}), 409
+    finally:
+        conn.close()
     
     return jsonify({'message': 'Appointment status updated successfully'}), 200
 
+@admin_bp.route('/appointments/bulk', methods=['POST'])
+def bulk_appointments():
+    # {"operations": [{"op": "book" | "cancel" | "status", ...}], "atomic": false}
+    data = request.get_json() or {}
+
+    conn = get_db_connection()
+    try:
+        results, committed = apply_operations(conn, data.get('operations'), atomic=bool(data.get('atomic')))
+        if committed:
+            publish_appointments(conn, changed_appointments(results), 'appointment.updated')
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    failed = sum(1 for result in results if not result['ok'])
+    return jsonify({'results': results, 'committed': committed, 'failed': failed}), 200
+
+# ====== BULK IMPORT ======
+
+@admin_bp.route('/import/<kind>', methods=['POST'])
+def import_records(kind):
+    # Body is the raw CSV or NDJSON file; ?format= overrides the Content-Type
+    fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Format must be one of {', '.join(FORMATS)}"}), 400
+    try:
+        batch_size = int(request.args.get('batch_size', 0))
+    except ValueError:
+        return jsonify({'error': 'batch_size must be a number'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    conn = get_db_connection()
+    try:
+        report = import_stream(conn, kind, stream, fmt, batch_size)
+    except ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    if kind == 'doctors':
+        # Lookups of an id before it was imported cached a 404 or no availability
+        reference_cache.invalidate('doctors')
+        reference_cache.invalidate('doctor')
+        reference_cache.invalidate('availability')
+    return jsonify(report), 200
+
+# ====== EXPORT ======
+
+@admin_bp.route('/export/<table>', methods=['GET'])
+def export_table(table):
+    # ?format=csv|ndjson|columnar&after_id=<watermark>&compress=gzip|none
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('compress', 'gzip') != 'none'
+    try:
+        check_request(table, fmt)
+        after_id = int(request.args.get('after_id', 0))
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    except ValueError:
+        return jsonify({'error': 'after_id must be a number'}), 400
+
+    conn = get_db_connection()
+    # One read transaction: the watermark and the rows come from the same snapshot
+    conn.execute('BEGIN')
+    upto = watermark(conn, table)
+
+    def generate():
+        try:
+            yield from export_rows(conn, table, fmt, after_id, upto, compress=compress)
+        finally:
+            conn.rollback()
+            conn.close()
+
+    if compress:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if fmt == 'csv' else NDJSON_MIMETYPE
+    filename = export_filename(table, fmt, after_id, upto, compress)
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        # Pass back as after_id to get only the rows added since
+        'X-Export-Watermark': str(upto),
+    })
+
+# ====== SYSTEM ======
+
+@admin_bp.route('/system/db-pool', methods=['GET'])
+def get_db_pool_stats():
+    return jsonify(pool.stats()), 200
+
+@admin_bp.route('/system/cache', methods=['GET'])
+def get_cache_stats():
+    return jsonify(reference_cache.stats()), 200
+
+@admin_bp.route('/system/password-hashing', methods=['GET'])
+def get_password_hashing_stats():
+    return jsonify(hash_pool.stats()), 200
+
+@admin_bp.route('/system/rate-limits', methods=['GET'])
+def get_rate_limit_stats():
+    return jsonify(rate_limit_stats()), 200
+
+@admin_bp.route('/system/events', methods=['GET'])
+def get_event_stats():
+    return jsonify(event_hub.stats()), 200
+
+@admin_bp.route('/system/archive', methods=['GET'])
+def get_archive_stats():
+    return jsonify(archiver.stats()), 200
+
+@admin_bp.route('/system/archive', methods=['POST'])
+def run_archive():
+    # Runs here rather than waiting for the scheduled run; ?max_batches= bounds the request
+    try:
+        max_batches = int(request.args['max_batches']) if request.args.get('max_batches') else None
+    except ValueError:
+        return jsonify({'error': 'max_batches must be a number'}), 400
+    try:
+        report = archiver.run(max_batches)
+    except ArchiveBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(report), 200
+
+@admin_bp.route('/system/backups', methods=['GET'])
+def get_backups():
+    return jsonify({'stats': backups.stats(), 'snapshots': backups.list()}), 200
+
+@admin_bp.route('/system/backups', methods=['POST'])
+def run_backup():
+    # Takes a snapshot now, outside the schedule; requests keep running meanwhile
+    try:
+        report = backups.run()
+    except BackupBusy as e:
+        return jsonify({'error': str(e)}), 409
+    except BackupError as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify(report), 201
+
+@admin_bp.route('/system/profiles', methods=['GET'])
+def get_profiles():
+    return jsonify(profiles.summaries()), 200
+
+@admin_bp.route('/system/profiles/continuous', methods=['GET'])
+def get_continuous_profile():
+    # Collapsed stacks weighted by sample count, since the last ?reset=1
+    stacks, info = sampler.snapshot(reset=request.args.get('reset') == '1')
+    return Response(collapsed(stacks), mimetype='text/plain', headers={
+        'X-Profile-Samples': str(info['samples']), 'X-Profile-Hz': str(info['hz']),
+    })
+
+@admin_bp.route('/system/profiles/<request_id>', methods=['GET'])
+def get_profile(request_id):
+    profile = profiles.get(request_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    # Collapsed stacks weighted by microseconds, for flamegraph.pl or speedscope
+    return Response(collapsed(profile['stacks']), mimetype='text/plain', headers={
+        'X-Profile-Duration-Ms': str(profile['duration_ms']),
+    })
@@ -1,15 +1,13 @@
 from flask import Blueprint, request, jsonify
 import sqlite3
-import os
+from database import get_db_connection
+from passwords import HashPoolBusy, check_password, hash_password, hash_pool
+from ratelimit import check_login_lockout, limit_requests, login_failed, login_succeeded
+from tokens import TOKEN_TTL_SECONDS, issue_token
 
 auth_bp = Blueprint('auth', __name__)
-
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital.db')
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Per-IP request limit, checked before any route touches the database
+auth_bp.before_request(limit_requests)
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -20,15 +18,31 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
 
+    locked = check_login_lockout(username)
+    if locked:
+        return locked
+
     conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM User WHERE Username = ? AND Password = ?',
-        (username, password)
-    ).fetchone()
+    user = conn.execute('SELECT * FROM User WHERE Username = ?', (username,)).fetchone()
+    # Don't hold a database connection while the hash runs
+    conn.close()
 
-    if not user:
-        conn.close()
+    try:
+        ok, new_hash = hash_pool.run(check_password, password, user['Password'] if user else None)
+    except HashPoolBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+
+    if not ok:
+        login_failed(username)
         return jsonify({'error': 'Invalid credentials'}), 401
+    login_succeeded(username)
+
+    conn = get_db_connection()
+    if new_hash:
+        # Plaintext or outdated hash: upgrade it unless it changed meanwhile
+        conn.execute('UPDATE User SET Password = ? WHERE UserID = ? AND Password = ?',
+                     (new_hash, user['UserID'], user['Password']))
+        conn.commit()
 
     role = user['Role']
     reference_id = user['ReferenceID']
@@ -58,7 +72,9 @@ def login():
         'role': role,
         'user_id': user['UserID'],
         'reference_id': reference_id,
-        'name': name
+        'name': name,
+        'token': issue_token(user['UserID'], role, reference_id),
+        'expires_in': TOKEN_TTL_SECONDS
     }), 200
 
 
@@ -77,6 +93,11 @@ def register():
     if not all([username, password, name, age, gender]):
         return jsonify({'error': 'Missing required fields'}), 400
 
+    try:
+        password_hash = hash_pool.run(hash_password, password)
+    except HashPoolBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -92,7 +113,7 @@ def register():
         cursor.execute('''
             INSERT INTO User (Username, Password, Role, ReferenceID)
             VALUES (?, ?, 'Patient', ?)
-        ''', (username, password, patient_id))
+        ''', (username, password_hash, patient_id))
 
         conn.commit()
     except sqlite3.IntegrityError:
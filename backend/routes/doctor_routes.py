@@ -1,31 +1,71 @@
-from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+from flask import Blueprint, g, request, jsonify
+from archive import archive_late_history, archive_union, include_archived
+from bulk_appointments import BulkError, apply_operations, changed_appointments
+from cache import reference_cache
+from database import get_db_connection
+from etags import conditional, resource_versions
+from events import publish_appointments, publish_history
+from pagination import PaginationError, appointment_filters, page, page_args
+from slots import DayFull, SlotTaken, set_status
+from summaries import appointment_summary
+from tokens import may_act_for, protect
+from validation import ValidationError, availability_fields
 
 doctor_bp = Blueprint('doctor', __name__)
+protect(doctor_bp, ('Doctor', 'Admin'), owner_arg='doctor_id')
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital.db')
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Routes addressed by appointment or availability id check the owning
+# doctor themselves; protect() only sees doctor_id in the URL
+def _appointment_owner(conn, appointment_id):
+    for table in ('Appointment', 'AppointmentArchive'):
+        row = conn.execute(f'SELECT DoctorID, PatientID FROM {table} WHERE AppointmentID = ?',
+                           (appointment_id,)).fetchone()
+        if row is not None:
+            return row
+    return None
+
+
+def _ownership_error(row, what):
+    if row is None:
+        return jsonify({'error': f'{what} not found'}), 404
+    if not may_act_for('Doctor', row['DoctorID']):
+        return jsonify({'error': 'Not allowed for this account'}), 403
+    return None
 
 
 # === 1️⃣ View Appointments for a Doctor ===
 @doctor_bp.route('/appointments/<int:doctor_id>', methods=['GET'])
+@conditional('Appointment', 'Patient')
 def get_doctor_appointments(doctor_id):
-    conn = get_db_connection()
-    appointments = conn.execute('''
+    try:
+        limit, cursor = page_args(request.args, 2)
+        clauses, params = appointment_filters(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    clauses.insert(0, 'a.DoctorID = ?')
+    params.insert(0, doctor_id)
+    if cursor:
+        clauses.append('(a.AppointmentDate, a.AppointmentID) > (?, ?)')
+        params.extend(cursor)
+
+    # ?archived=1 adds the appointments past the archive cutoff
+    sql, params = archive_union(f'''
         SELECT a.AppointmentID, a.AppointmentDate, a.Status,
                p.PatientID, p.Name AS PatientName, p.Age, p.Gender, p.Contact
         FROM Appointment a
         JOIN Patient p ON a.PatientID = p.PatientID
-        WHERE a.DoctorID = ?
-        ORDER BY a.AppointmentDate ASC
-    ''', (doctor_id,)).fetchall()
+        WHERE {' AND '.join(clauses)}
+    ''', params, include_archived(request.args))
+
+    conn = get_db_connection()
+    appointments = conn.execute(sql + '''
+        ORDER BY AppointmentDate ASC, AppointmentID ASC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
     conn.close()
-    return jsonify([dict(row) for row in appointments]), 200
+    return jsonify(page(appointments, limit, lambda row: [row['AppointmentDate'], row['AppointmentID']])), 200
 
 
 # === 2️⃣ Update Appointment Status ===
@@ -37,12 +77,42 @@ def update_appointment_status(appointment_id):
         return jsonify({'error': 'Invalid status'}), 400
 
     conn = get_db_connection()
-    conn.execute('UPDATE Appointment SET Status = ? WHERE AppointmentID = ?', (status, appointment_id))
-    conn.commit()
-    conn.close()
+    error = _ownership_error(_appointment_owner(conn, appointment_id), 'Appointment')
+    if error:
+        conn.close()
+        return error
+    try:
+        if set_status(conn, appointment_id, status):
+            publish_appointments(conn, [appointment_id], 'appointment.updated')
+    except SlotTaken:
+        return jsonify({'error': 'Another appointment is already scheduled in this slot'}), 409
+    except DayFull:
+        return jsonify({'error': 'Doctor is fully booked on that day'}), 409
+    finally:
+        conn.close()
     return jsonify({'message': f'Appointment marked as {status}'}), 200
 
 
+@doctor_bp.route('/appointments/<int:doctor_id>/bulk', methods=['POST'])
+def bulk_update_appointments(doctor_id):
+    # {"operations": [{"op": "cancel" | "status", "appointment_id": ..., "status": ...}], "atomic": false}
+    data = request.get_json() or {}
+
+    conn = get_db_connection()
+    try:
+        results, committed = apply_operations(conn, data.get('operations'), doctor_id=doctor_id,
+                                              allowed=('cancel', 'status'), atomic=bool(data.get('atomic')))
+        if committed:
+            publish_appointments(conn, changed_appointments(results), 'appointment.updated')
+    except BulkError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+
+    failed = sum(1 for result in results if not result['ok'])
+    return jsonify({'results': results, 'committed': committed, 'failed': failed}), 200
+
+
 # === 3️⃣ Add Prescription / History Record ===
 @doctor_bp.route('/appointments/<int:appointment_id>/history', methods=['POST'])
 def add_prescription(appointment_id):
@@ -56,20 +126,44 @@ def add_prescription(appointment_id):
         return jsonify({'error': 'Patient ID required'}), 400
 
     conn = get_db_connection()
-    conn.execute('''
+    owner = _appointment_owner(conn, appointment_id)
+    error = _ownership_error(owner, 'Appointment')
+    if error:
+        conn.close()
+        return error
+    if str(owner['PatientID']) != str(patient_id):
+        conn.close()
+        return jsonify({'error': 'patient_id does not match the appointment'}), 400
+    history_id = conn.execute('''
         INSERT INTO History (AppointmentID, PatientID, Tests, MedicineName, Instructions)
         VALUES (?, ?, ?, ?, ?)
-    ''', (appointment_id, patient_id, tests, medicine, instructions))
+    ''', (appointment_id, patient_id, tests, medicine, instructions)).lastrowid
+    archive_late_history(conn, appointment_id)
     conn.commit()
+    publish_history(conn, history_id)
     conn.close()
     return jsonify({'message': 'Prescription added successfully'}), 201
 
 
 # === 4️⃣ Get Prescription / History for a Patient ===
 @doctor_bp.route('/patients/<int:patient_id>/history', methods=['GET'])
+@conditional('History', 'Appointment', 'Doctor')
 def get_patient_history(patient_id):
-    conn = get_db_connection()
-    history = conn.execute('''
+    # A doctor sees the history of their own patients only
+    identity = g.get('identity')
+    if identity is not None and identity['role'] == 'Doctor':
+        conn = get_db_connection()
+        treats = conn.execute('''
+            SELECT 1 FROM Appointment WHERE PatientID = ? AND DoctorID = ?
+            UNION ALL
+            SELECT 1 FROM AppointmentArchive WHERE PatientID = ? AND DoctorID = ?
+            LIMIT 1
+        ''', (patient_id, identity['ref']) * 2).fetchone()
+        conn.close()
+        if treats is None:
+            return jsonify({'error': 'Not allowed for this account'}), 403
+
+    sql, params = archive_union('''
         SELECT h.HistoryID, h.AppointmentID, h.Tests, h.MedicineName, h.Instructions,
                a.AppointmentDate, a.Status,
                d.Name AS DoctorName, d.Specialization
@@ -77,38 +171,31 @@ def get_patient_history(patient_id):
         JOIN Appointment a ON h.AppointmentID = a.AppointmentID
         JOIN Doctor d ON a.DoctorID = d.DoctorID
         WHERE h.PatientID = ?
-        ORDER BY a.AppointmentDate DESC
-    ''', (patient_id,)).fetchall()
+    ''', [patient_id], include_archived(request.args))
+
+    conn = get_db_connection()
+    history = conn.execute(sql + ' ORDER BY AppointmentDate DESC', params).fetchall()
     conn.close()
     return jsonify([dict(row) for row in history]), 200
 
 
 # === 5️⃣ Quick Stats (optional for dashboard summary) ===
 @doctor_bp.route('/dashboard/<int:doctor_id>/summary', methods=['GET'])
+@conditional('Appointment', 'Doctor', 'Patient', per_minute=True)
 def doctor_dashboard_summary(doctor_id):
     conn = get_db_connection()
-
-    total = conn.execute('SELECT COUNT(*) AS Total FROM Appointment WHERE DoctorID = ?', (doctor_id,)).fetchone()['Total']
-    completed = conn.execute('SELECT COUNT(*) AS Completed FROM Appointment WHERE DoctorID = ? AND Status = "Completed"', (doctor_id,)).fetchone()['Completed']
-    upcoming = conn.execute('SELECT COUNT(*) AS Upcoming FROM Appointment WHERE DoctorID = ? AND Status = "Scheduled"', (doctor_id,)).fetchone()['Upcoming']
-
+    summary = appointment_summary(conn, 'DoctorID', doctor_id)
     conn.close()
 
-    return jsonify({
-        'total_appointments': total,
-        'completed_appointments': completed,
-        'upcoming_appointments': upcoming
-    }), 200
+    return jsonify(summary), 200
 
 @doctor_bp.route('/<int:doctor_id>/availability', methods=['POST'])
 def add_availability(doctor_id):
     data = request.get_json()
-    day = data.get('day')
-    start = data.get('start_time')
-    end = data.get('end_time')
-
-    if not all([day, start, end]):
-        return jsonify({'error': 'Missing required fields'}), 400
+    try:
+        day, start, end = availability_fields(data)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     conn.execute('''
@@ -117,66 +204,84 @@ def add_availability(doctor_id):
     ''', (doctor_id, day, start, end))
     conn.commit()
     conn.close()
+    reference_cache.invalidate('availability', doctor_id)
+    reference_cache.invalidate('doctor', doctor_id)
 
     return jsonify({'message': 'Availability added successfully'}), 201
 
 @doctor_bp.route('/<int:doctor_id>/availability', methods=['GET'])
+@conditional('DoctorAvailability')
 def get_availability(doctor_id):
-    conn = get_db_connection()
-    slots = conn.execute('''
-        SELECT * FROM DoctorAvailability
-        WHERE DoctorID = ?
-        ORDER BY 
-            CASE 
-                WHEN Day = 'Monday' THEN 1
-                WHEN Day = 'Tuesday' THEN 2
-                WHEN Day = 'Wednesday' THEN 3
-                WHEN Day = 'Thursday' THEN 4
-                WHEN Day = 'Friday' THEN 5
-                WHEN Day = 'Saturday' THEN 6
-                WHEN Day = 'Sunday' THEN 7
-            END,
-            StartTime
-    ''', (doctor_id,)).fetchall()
-    conn.close()
-
-    return jsonify([dict(row) for row in slots]), 200
+    def load():
+        conn = get_db_connection()
+        slots = conn.execute('''
+            SELECT * FROM DoctorAvailability
+            WHERE DoctorID = ?
+            ORDER BY 
+                CASE 
+                    WHEN Day = 'Monday' THEN 1
+                    WHEN Day = 'Tuesday' THEN 2
+                    WHEN Day = 'Wednesday' THEN 3
+                    WHEN Day = 'Thursday' THEN 4
+                    WHEN Day = 'Friday' THEN 5
+                    WHEN Day = 'Saturday' THEN 6
+                    WHEN Day = 'Sunday' THEN 7
+                END,
+                StartTime
+        ''', (doctor_id,)).fetchall()
+        conn.close()
+        return [dict(row) for row in slots]
+
+    return jsonify(reference_cache.get_or_load(('availability', doctor_id), load, resource_versions())), 200
 
 @doctor_bp.route('/availability/<int:availability_id>', methods=['DELETE'])
 def delete_availability(availability_id):
     conn = get_db_connection()
+    row = conn.execute('SELECT DoctorID FROM DoctorAvailability WHERE AvailabilityID = ?',
+                       (availability_id,)).fetchone()
+    error = _ownership_error(row, 'Availability')
+    if error:
+        conn.close()
+        return error
     conn.execute('DELETE FROM DoctorAvailability WHERE AvailabilityID = ?', 
                  (availability_id,))
     conn.commit()
     conn.close()
+    reference_cache.invalidate('availability', row['DoctorID'])
+    reference_cache.invalidate('doctor', row['DoctorID'])
 
     return jsonify({'message': 'Availability deleted successfully'}), 200
 
 @doctor_bp.route('/availability/<int:availability_id>', methods=['PUT'])
 def update_availability(availability_id):
     data = request.get_json()
-    updates = {}
-
-    if 'day' in data:
-        updates['Day'] = data['day']
-    if 'start_time' in data:
-        updates['StartTime'] = data['start_time']
-    if 'end_time' in data:
-        updates['EndTime'] = data['end_time']
+    updates = {field: data[field] for field in ('day', 'start_time', 'end_time') if field in data}
 
     if not updates:
         return jsonify({'error': 'No valid fields'}), 400
 
-    set_clause = ', '.join([f"{k} = ?" for k in updates])
-    values = list(updates.values()) + [availability_id]
-
     conn = get_db_connection()
-    conn.execute(f'''
+    row = conn.execute('SELECT DoctorID, Day, StartTime, EndTime FROM DoctorAvailability WHERE AvailabilityID = ?',
+                       (availability_id,)).fetchone()
+    error = _ownership_error(row, 'Availability')
+    if error:
+        conn.close()
+        return error
+    # Validate the slot as it will be stored, not just the fields sent
+    try:
+        day, start, end = availability_fields(dict(
+            {'day': row['Day'], 'start_time': row['StartTime'], 'end_time': row['EndTime']}, **updates))
+    except ValidationError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+    conn.execute('''
         UPDATE DoctorAvailability 
-        SET {set_clause}
+        SET Day = ?, StartTime = ?, EndTime = ?
         WHERE AvailabilityID = ?
-    ''', values)
+    ''', (day, start, end, availability_id))
     conn.commit()
     conn.close()
+    reference_cache.invalidate('availability', row['DoctorID'])
+    reference_cache.invalidate('doctor', row['DoctorID'])
 
     return jsonify({'message': 'Availability updated successfully'}), 200
@@ -0,0 +1,87 @@
+import time
+import urllib.parse
+from flask import Blueprint, Response, g, redirect, request, jsonify
+from event_server import event_server
+from events import (
+    HEARTBEAT_SECONDS, MAX_STREAM_SECONDS, MAX_WAIT_SECONDS, event_hub, format_sse, seconds_arg, subscriber_scope,
+)
+from tokens import REQUIRE_AUTH, protect, revocations
+
+events_bp = Blueprint('events', __name__)
+protect(events_bp, ('Admin', 'Doctor', 'Patient'), query_token=True)
+
+
+def _identity():
+    # With require_auth off every caller listens as an admin
+    return g.get('identity') or {'role': 'Admin', 'ref': None, 'exp': time.time() + MAX_STREAM_SECONDS}
+
+
+@events_bp.before_request
+def hand_off_to_event_server():
+    # While the event server runs, waiting subscribers are parked there instead of holding a thread here
+    if not event_server.running or request.method == 'OPTIONS':
+        return None
+    host = urllib.parse.urlsplit(request.host_url).hostname
+    if ':' in host:
+        host = f'[{host}]'
+    return redirect(f"{request.scheme}://{host}:{event_server.port}{request.full_path.rstrip('?')}", code=307)
+
+
+# === Server-sent events ===
+@events_bp.route('/stream', methods=['GET'])
+def stream_events():
+    # EventSource sends Last-Event-ID itself when it reconnects; ?timeout= closes the stream early
+    claims = _identity()
+    scope = subscriber_scope(claims)
+    try:
+        timeout = seconds_arg(request.args.get('timeout'), MAX_STREAM_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'timeout must be a number of seconds, 0 or more'}), 400
+    # The stream ends when the token does; the client then reconnects with a new one
+    closes_at = min(time.time() + timeout, claims['exp'])
+
+    if not event_hub.join():
+        return jsonify({'error': 'Too many event streams; poll /api/events/poll instead'}), 503
+    cursor, resync = event_hub.position(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+
+    def generate():
+        nonlocal cursor, resync
+        yield f'retry: {HEARTBEAT_SECONDS * 1000}\n\n'
+        while True:
+            if resync:
+                yield format_sse({'id': event_hub.event_id(cursor), 'type': 'resync', 'data': {}})
+            remaining = closes_at - time.time()
+            if remaining <= 0 or (REQUIRE_AUTH and revocations.is_revoked(claims)):
+                return
+            events, cursor, resync = event_hub.wait(cursor, scope, min(HEARTBEAT_SECONDS, remaining))
+            if events:
+                yield ''.join(format_sse(event) for event in events)
+            elif not resync:
+                # Keeps proxies from timing the connection out and finds clients that left
+                yield ': keepalive\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # Runs when the server closes the response, also if the client left before the first chunk
+    response.call_on_close(event_hub.leave)
+    return response
+
+
+# === Long polling ===
+@events_bp.route('/poll', methods=['GET'])
+def poll_events():
+    # ?after=<last_event_id>&wait=<seconds>; without after, returns the id to start from
+    scope = subscriber_scope(_identity())
+    try:
+        wait = seconds_arg(request.args.get('wait'), MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds, 0 or more'}), 400
+
+    after = request.args.get('after')
+    cursor, resync = event_hub.position(after)
+    events = []
+    if after and not resync:
+        events, cursor, resync = event_hub.wait(cursor, scope, wait)
+    return jsonify({'events': events, 'last_event_id': event_hub.event_id(cursor), 'resync': resync}), 200
@@ -1,19 +1,26 @@
+import datetime
 from flask import Blueprint, request, jsonify
-import sqlite3
-import os
+from archive import archive_union, include_archived
+from cache import reference_cache
+from database import get_db_connection
+from etags import conditional, resource_versions
+from events import publish_appointments
+from pagination import MAX_PAGE_SIZE, PaginationError, page, page_args
+from slots import (
+    BOOKING_ADVANCE_DAYS, DayFull, SlotTaken, SlotUnavailable, book_slot, free_slots, next_free_slots,
+    set_status, slot_grid,
+)
+from summaries import appointment_summary
+from tokens import may_act_for, protect
+from validation import ValidationError, patient_fields
 
 patient_bp = Blueprint('patient', __name__)
-
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital.db')
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+protect(patient_bp, ('Patient', 'Admin'), owner_arg='patient_id')
 
 
 # === 1️⃣ Patient Profile ===
 @patient_bp.route('/profile/<int:patient_id>', methods=['GET'])
+@conditional('Patient')
 def get_patient_profile(patient_id):
     conn = get_db_connection()
     patient = conn.execute('SELECT * FROM Patient WHERE PatientID = ?', (patient_id,)).fetchone()
@@ -29,27 +36,11 @@ def get_patient_profile(patient_id):
 def update_patient_profile(patient_id):
     data = request.get_json()
     
-    # Validate required fields
-    name = data.get('name')
-    age = data.get('age')
-    gender = data.get('gender')
-    contact = data.get('contact')
-    address = data.get('address', '')
-    
-    if not all([name, age, gender, contact]):
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    # Validate age
+    # Same rules as the bulk importer (see validation.py)
     try:
-        age = int(age)
-        if age < 0 or age > 150:
-            return jsonify({'error': 'Invalid age'}), 400
-    except ValueError:
-        return jsonify({'error': 'Age must be a number'}), 400
-    
-    # Validate gender
-    if gender not in ['Male', 'Female', 'Other']:
-        return jsonify({'error': 'Gender must be Male, Female, or Other'}), 400
+        name, age, gender, contact, address = patient_fields(data)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     
     conn = get_db_connection()
     
@@ -74,17 +65,20 @@ def update_patient_profile(patient_id):
 
 # === 2️⃣ View Patient Appointments ===
 @patient_bp.route('/appointments/<int:patient_id>', methods=['GET'])
+@conditional('Appointment', 'Doctor')
 def get_patient_appointments(patient_id):
-    conn = get_db_connection()
-    appointments = conn.execute('''
+    # ?archived=1 adds the appointments past the archive cutoff
+    sql, params = archive_union('''
         SELECT 
             a.AppointmentID, a.AppointmentDate, a.Status,
             d.DoctorID, d.Name AS DoctorName, d.Specialization
         FROM Appointment a
         JOIN Doctor d ON a.DoctorID = d.DoctorID
         WHERE a.PatientID = ?
-        ORDER BY a.AppointmentDate DESC
-    ''', (patient_id,)).fetchall()
+    ''', [patient_id], include_archived(request.args))
+
+    conn = get_db_connection()
+    appointments = conn.execute(sql + ' ORDER BY AppointmentDate DESC', params).fetchall()
     conn.close()
 
     return jsonify([dict(row) for row in appointments]), 200
@@ -93,8 +87,6 @@ def get_patient_appointments(patient_id):
 # === 3️⃣ Book Appointment ===
 @patient_bp.route('/appointments/book', methods=['POST'])
 def book_appointment():
-    import datetime
-
     data = request.get_json()
     patient_id = data.get('patient_id')
     doctor_id = data.get('doctor_id')
@@ -103,18 +95,15 @@ def book_appointment():
     if not all([patient_id, doctor_id, date_str]):
         return jsonify({'error': 'Missing fields'}), 400
 
+    if not may_act_for('Patient', patient_id):
+        return jsonify({'error': 'Not allowed for this account'}), 403
+
     # Parse date/time
     try:
         appointment_dt = datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M")
-    except:
+    except (ValueError, TypeError):
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD HH:MM'}), 400
 
-    # Extract weekday
-    day_name = appointment_dt.strftime("%A")   # Monday, Tuesday, ...
-
-    # Extract time as string
-    time_str = appointment_dt.strftime("%H:%M")
-
     conn = get_db_connection()
 
     # Block blacklisted patients
@@ -126,50 +115,101 @@ def book_appointment():
         conn.close()
         return jsonify({'error': 'Patient account is blacklisted'}), 403
 
-    # Fetch doctor availability for that day
-    slots = conn.execute('''
-        SELECT StartTime, EndTime 
-        FROM DoctorAvailability
-        WHERE DoctorID = ? AND Day = ?
-    ''', (doctor_id, day_name)).fetchall()
-
-    if not slots:
-        conn.close()
-        return jsonify({'error': f'Doctor is not available on {day_name}'}), 400
-
-    # Check if requested time falls in ANY availability slot
-    time_valid = False
-    for s in slots:
-        if s["StartTime"] <= time_str <= s["EndTime"]:
-            time_valid = True
-            break
+    day_name = appointment_dt.strftime("%A")   # Monday, Tuesday, ...
 
-    if not time_valid:
+    try:
+        appointment_id = book_slot(conn, patient_id, doctor_id, appointment_dt)
+    except SlotUnavailable:
+        if not slot_grid(conn, doctor_id).get(day_name):
+            conn.close()
+            return jsonify({'error': f'Doctor is not available on {day_name}'}), 400
+        available = free_slots(conn, doctor_id, appointment_dt.date())
         conn.close()
         return jsonify({
             'error': f'Doctor available on {day_name} only during these times',
-            'available_slots': [dict(slot) for slot in slots]
+            'available_slots': available
         }), 400
+    except SlotTaken:
+        available = free_slots(conn, doctor_id, appointment_dt.date())
+        conn.close()
+        return jsonify({
+            'error': 'This slot is already booked',
+            'available_slots': available
+        }), 409
+    except DayFull:
+        conn.close()
+        return jsonify({'error': f'Doctor is fully booked on {appointment_dt.date()}'}), 409
 
-    # Create appointment
-    conn.execute('''
-        INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status)
-        VALUES (?, ?, ?, 'Scheduled')
-    ''', (date_str, patient_id, doctor_id))
+    publish_appointments(conn, [appointment_id], 'appointment.booked')
+    conn.close()
 
-    conn.commit()
+    return jsonify({'message': 'Appointment booked successfully', 'appointment_id': appointment_id}), 201
+
+
+# === Find Free Slots ===
+@patient_bp.route('/slots', methods=['GET'])
+@conditional('Appointment', 'Doctor', 'DoctorAvailability', per_minute=True)
+def find_free_slots():
+    # One of doctor_id / specialization / department_id picks the doctors
+    doctor_id = request.args.get('doctor_id')
+    specialization = request.args.get('specialization')
+    department_id = request.args.get('department_id')
+
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_PAGE_SIZE)
+        days = int(request.args.get('days', BOOKING_ADVANCE_DAYS))
+        if doctor_id:
+            doctor_id = int(doctor_id)
+        if department_id:
+            department_id = int(department_id)
+    except ValueError:
+        return jsonify({'error': 'doctor_id, department_id, limit and days must be numbers'}), 400
+    if limit < 1 or not 1 <= days <= BOOKING_ADVANCE_DAYS:
+        return jsonify({'error': f'limit must be positive and days between 1 and {BOOKING_ADVANCE_DAYS}'}), 400
+
+    today = datetime.date.today()
+    try:
+        first_day = datetime.date.fromisoformat(request.args['date_from']) if request.args.get('date_from') else today
+    except ValueError:
+        return jsonify({'error': 'date_from must be YYYY-MM-DD'}), 400
+    first_day = max(first_day, today)
+    # Never search past the booking horizon
+    days = min(days, (today - first_day).days + BOOKING_ADVANCE_DAYS)
+
+    if doctor_id:
+        where, params = 'DoctorID = ?', (doctor_id,)
+    elif specialization:
+        where, params = 'Specialization = ? COLLATE NOCASE', (specialization,)
+    elif department_id:
+        where, params = 'DepartmentID = ?', (department_id,)
+    else:
+        return jsonify({'error': 'doctor_id, specialization or department_id is required'}), 400
+
+    conn = get_db_connection()
+    doctors = conn.execute(
+        f'SELECT DoctorID, Name, Specialization FROM Doctor WHERE {where} AND IsBlacklisted = 0', params
+    ).fetchall()
+    slots = next_free_slots(conn, doctors, first_day, max(days, 0), limit)
     conn.close()
 
-    return jsonify({'message': 'Appointment booked successfully'}), 201
+    return jsonify({'slots': slots}), 200
 
 
 # === 4️⃣ Cancel Appointment (Patient side) ===
 @patient_bp.route('/appointments/<int:appointment_id>/cancel', methods=['PUT'])
 def cancel_appointment(appointment_id):
     conn = get_db_connection()
+    row = conn.execute('SELECT PatientID FROM Appointment WHERE AppointmentID = ?', (appointment_id,)).fetchone()
+    if row is None:
+        conn.close()
+        return jsonify({'error': 'Appointment not found'}), 404
+    # Admin tokens pass; a patient may only cancel their own appointments
+    if not may_act_for('Patient', row['PatientID']):
+        conn.close()
+        return jsonify({'error': 'Not allowed for this account'}), 403
 
-    conn.execute('UPDATE Appointment SET Status = "Cancelled" WHERE AppointmentID = ?', (appointment_id,))
-    conn.commit()
+    if set_status(conn, appointment_id, 'Cancelled'):
+        publish_appointments(conn, [appointment_id], 'appointment.updated')
     conn.close()
 
     return jsonify({'message': 'Appointment cancelled successfully'}), 200
@@ -177,9 +217,20 @@ def cancel_appointment(appointment_id):
 
 # === 5️⃣ View Patient History ===
 @patient_bp.route('/history/<int:patient_id>', methods=['GET'])
+@conditional('History', 'Appointment', 'Doctor')
 def get_history(patient_id):
-    conn = get_db_connection()
-    history = conn.execute('''
+    try:
+        limit, cursor = page_args(request.args, 2)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    keyset = ''
+    params = [patient_id]
+    if cursor:
+        keyset = 'AND (a.AppointmentDate, h.HistoryID) < (?, ?)'
+        params.extend(cursor)
+
+    sql, params = archive_union(f'''
         SELECT 
             h.HistoryID, h.Tests, h.MedicineName, h.Instructions,
             a.AppointmentDate, a.Status,
@@ -187,85 +238,81 @@ def get_history(patient_id):
         FROM History h
         JOIN Appointment a ON h.AppointmentID = a.AppointmentID
         JOIN Doctor d ON a.DoctorID = d.DoctorID
-        WHERE h.PatientID = ?
-        ORDER BY a.AppointmentDate DESC
-    ''', (patient_id,)).fetchall()
+        WHERE h.PatientID = ? {keyset}
+    ''', params, include_archived(request.args))
+
+    conn = get_db_connection()
+    history = conn.execute(sql + '''
+        ORDER BY AppointmentDate DESC, HistoryID DESC
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
     conn.close()
 
-    return jsonify([dict(row) for row in history]), 200
+    return jsonify(page(history, limit, lambda row: [row['AppointmentDate'], row['HistoryID']])), 200
 
 
 # === 6️⃣ Dashboard Summary ===
 @patient_bp.route('/dashboard/<int:patient_id>/summary', methods=['GET'])
+@conditional('Appointment', 'Doctor', 'Patient', per_minute=True)
 def patient_summary(patient_id):
     conn = get_db_connection()
-
-    total = conn.execute(
-        'SELECT COUNT(*) AS Total FROM Appointment WHERE PatientID = ?', (patient_id,)
-    ).fetchone()['Total']
-
-    upcoming = conn.execute(
-        'SELECT COUNT(*) AS Upcoming FROM Appointment WHERE PatientID = ? AND Status = "Scheduled"',
-        (patient_id,)
-    ).fetchone()['Upcoming']
-
-    completed = conn.execute(
-        'SELECT COUNT(*) AS Completed FROM Appointment WHERE PatientID = ? AND Status = "Completed"',
-        (patient_id,)
-    ).fetchone()['Completed']
-
+    summary = appointment_summary(conn, 'PatientID', patient_id)
     conn.close()
 
-    return jsonify({
-        'total_appointments': total,
-        'upcoming_appointments': upcoming,
-        'completed_appointments': completed
-    }), 200
+    return jsonify(summary), 200
 
 @patient_bp.route('/doctor/<int:doctor_id>', methods=['GET'])
+@conditional('Doctor', 'Department', 'DoctorAvailability')
 def get_doctor_details(doctor_id):
-    conn = get_db_connection()
+    def load():
+        conn = get_db_connection()
+
+        # fetch doctor info
+        doctor = conn.execute('''
+            SELECT 
+                d.DoctorID,
+                d.Name,
+                d.Specialization,
+                dep.Name AS DepartmentName
+            FROM Doctor d
+            LEFT JOIN Department dep ON d.DepartmentID = dep.DepartmentID
+            WHERE d.DoctorID = ? AND d.IsBlacklisted = 0
+        ''', (doctor_id,)).fetchone()
+
+        if not doctor:
+            conn.close()
+            return None
+
+        # fetch availability slots
+        availability = conn.execute('''
+            SELECT AvailabilityID, Day, StartTime, EndTime
+            FROM DoctorAvailability
+            WHERE DoctorID = ?
+            ORDER BY 
+                CASE 
+                    WHEN Day = 'Monday' THEN 1
+                    WHEN Day = 'Tuesday' THEN 2
+                    WHEN Day = 'Wednesday' THEN 3
+                    WHEN Day = 'Thursday' THEN 4
+                    WHEN Day = 'Friday' THEN 5
+                    WHEN Day = 'Saturday' THEN 6
+                    WHEN Day = 'Sunday' THEN 7
+                END,
+                StartTime
+        ''', (doctor_id,)).fetchall()
 
-    # fetch doctor info
-    doctor = conn.execute('''
-        SELECT 
-            d.DoctorID,
-            d.Name,
-            d.Specialization,
-            dep.Name AS DepartmentName
-        FROM Doctor d
-        LEFT JOIN Department dep ON d.DepartmentID = dep.DepartmentID
-        WHERE d.DoctorID = ? AND d.IsBlacklisted = 0
-    ''', (doctor_id,)).fetchone()
-
-    if not doctor:
         conn.close()
-        return jsonify({'error': 'Doctor not found'}), 404
 
-    # fetch availability slots
-    availability = conn.execute('''
-        SELECT AvailabilityID, Day, StartTime, EndTime
-        FROM DoctorAvailability
-        WHERE DoctorID = ?
-        ORDER BY 
-            CASE 
-                WHEN Day = 'Monday' THEN 1
-                WHEN Day = 'Tuesday' THEN 2
-                WHEN Day = 'Wednesday' THEN 3
-                WHEN Day = 'Thursday' THEN 4
-                WHEN Day = 'Friday' THEN 5
-                WHEN Day = 'Saturday' THEN 6
-                WHEN Day = 'Sunday' THEN 7
-            END,
-            StartTime
-    ''', (doctor_id,)).fetchall()
+        return {
+            "DoctorID": doctor["DoctorID"],
+            "Name": doctor["Name"],
+            "Specialization": doctor["Specialization"],
+            "DepartmentName": doctor["DepartmentName"],
+            "Availability": [dict(a) for a in availability]
+        }
 
-    conn.close()
+    details = reference_cache.get_or_load(('doctor', doctor_id), load, resource_versions())
+    if details is None:
+        return jsonify({'error': 'Doctor not found'}), 404
 
-    return jsonify({
-        "DoctorID": doctor["DoctorID"],
-        "Name": doctor["Name"],
-        "Specialization": doctor["Specialization"],
-        "DepartmentName": doctor["DepartmentName"],
-        "Availability": [dict(a) for a in availability]
-    }), 200
+    return jsonify(details), 200
\ No newline at end of file
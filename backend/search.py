@@ -0,0 +1,26 @@
+import re
+from config import get_setting
+
+DEFAULT_SEARCH_LIMIT = get_setting('api', 'search_limit', 20)
+MAX_SEARCH_LIMIT = get_setting('api', 'max_page_size', 500)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix.
+
+    Returns None when the text has no searchable words.
+    """
+    tokens = _TOKEN.findall(q.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        return DEFAULT_SEARCH_LIMIT
+    return max(1, min(limit, MAX_SEARCH_LIMIT))
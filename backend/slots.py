@@ -0,0 +1,327 @@
+import bisect
+import datetime
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from cache import reference_cache
+from config import get_setting
+from etags import current_versions
+
+SLOT_MINUTES = get_setting('appointments', 'default_duration_minutes', 30)
+
+# How long a per-doctor/day booking index is trusted before it is reloaded.
+# Bookings and cancellations made through this process update it directly;
+# the TTL only bounds how long a change made by another process goes unseen.
+# The database stays the authority either way (see book_slot()).
+INDEX_TTL_SECONDS = get_setting('appointments', 'slot_index_ttl_seconds', 30)
+
+# How far ahead free slots are searched (and at most may be requested)
+BOOKING_ADVANCE_DAYS = get_setting('appointments', 'booking_advance_days', 30)
+
+# Appointments (other than cancelled ones) a doctor takes per day
+MAX_APPOINTMENTS_PER_DAY = get_setting('appointments', 'max_appointments_per_day', 20)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+log = logging.getLogger('hospital.slots')
+
+
+class SlotUnavailable(Exception):
+    """The requested time is not a slot in the doctor's availability."""
+
+
+class SlotTaken(Exception):
+    """The slot overlaps an appointment that is already scheduled."""
+
+
+class DayFull(Exception):
+    """The doctor already has max_appointments_per_day appointments that day."""
+
+
+def to_minutes(hhmm):
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_minutes(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+# === Slot grid ===
+
+def slot_grid(conn, doctor_id):
+    """Availability expanded into slot start minutes, by weekday name.
+
+    Cached under the doctor's 'availability' namespace, so the availability
+    write routes invalidate it together with the availability list, and
+    versioned by the DoctorAvailability counter for writes made by other
+    workers.
+    """
+    def load():
+        rows = conn.execute(
+            'SELECT Day, StartTime, EndTime FROM DoctorAvailability WHERE DoctorID = ?',
+            (doctor_id,)
+        ).fetchall()
+        grid = {}
+        for row in rows:
+            # The write routes validate times; skip rows stored before they did
+            try:
+                start, end = to_minutes(row['StartTime']), to_minutes(row['EndTime'])
+            except (AttributeError, ValueError):
+                log.warning('Skipping availability %s %s-%s of doctor %s: bad time',
+                            row['Day'], row['StartTime'], row['EndTime'], doctor_id)
+                continue
+            grid.setdefault(row['Day'], set()).update(range(start, end - SLOT_MINUTES + 1, SLOT_MINUTES))
+        return {day: sorted(starts) for day, starts in grid.items()}
+
+    version = tuple(current_versions(conn, ['DoctorAvailability']))
+    return reference_cache.get_or_load(('availability', doctor_id, 'grid'), load, version)
+
+
+# === Booking index ===
+
+class BookingIndex:
+    """Scheduled appointments per (doctor, date) as sorted start minutes.
+
+    Each day's starts are a tuple that add() replaces rather than changes, so
+    a caller can read what booked() returned without holding the lock.
+    """
+
+    def __init__(self, ttl=INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._days = {}   # (doctor_id, 'YYYY-MM-DD') -> (expires_at, (start minutes))
+
+    def booked(self, conn, doctor_id, date):
+        key = (doctor_id, date)
+        with self._lock:
+            entry = self._days.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        next_day = (datetime.date.fromisoformat(date) + datetime.timedelta(days=1)).isoformat()
+        rows = conn.execute('''
+            SELECT AppointmentDate FROM Appointment
+            WHERE DoctorID = ? AND AppointmentDate >= ? AND AppointmentDate < ? AND Status = 'Scheduled'
+        ''', (doctor_id, date, next_day)).fetchall()
+        starts = tuple(sorted(to_minutes(row['AppointmentDate'][11:16]) for row in rows))
+
+        with self._lock:
+            self._days[key] = (time.monotonic() + self.ttl, starts)
+        return starts
+
+    def add(self, doctor_id, date, start):
+        key = (doctor_id, date)
+        with self._lock:
+            entry = self._days.get(key)
+            if entry:
+                expires_at, starts = entry
+                i = bisect.bisect_left(starts, start)
+                self._days[key] = (expires_at, starts[:i] + (start,) + starts[i:])
+
+    def forget(self, doctor_id, date):
+        with self._lock:
+            self._days.pop((doctor_id, date), None)
+
+
+def overlaps(starts, start, duration=SLOT_MINUTES):
+    # Two appointments overlap when their starts are less than one slot apart
+    i = bisect.bisect_left(starts, start - duration + 1)
+    return i < len(starts) and starts[i] < start + duration
+
+
+booking_index = BookingIndex()
+
+
+# === Day capacity ===
+# DoctorDayLoad is kept current by triggers on Appointment, in the same
+# transaction as the change, so checking capacity is one primary-key lookup.
+
+def day_is_full(conn, doctor_id, date):
+    row = conn.execute('SELECT Booked FROM DoctorDayLoad WHERE DoctorID = ? AND Day = ?',
+                       (doctor_id, date)).fetchone()
+    return row is not None and row[0] >= MAX_APPOINTMENTS_PER_DAY
+
+
+def full_doctors(conn, doctor_ids, date):
+    rows = conn.execute(f'''
+        SELECT DoctorID FROM DoctorDayLoad
+        WHERE DoctorID IN ({','.join('?' * len(doctor_ids))}) AND Day = ? AND Booked >= ?
+    ''', list(doctor_ids) + [date, MAX_APPOINTMENTS_PER_DAY]).fetchall()
+    return {row[0] for row in rows}
+
+
+# === Booking ===
+
+def free_slots(conn, doctor_id, day):
+    """Free slot (start, end) strings for one doctor on one date."""
+    if day_is_full(conn, doctor_id, day.isoformat()):
+        return []
+    grid = slot_grid(conn, doctor_id).get(day.strftime('%A'), [])
+    booked = booking_index.booked(conn, doctor_id, day.isoformat())
+    return [
+        {'StartTime': format_minutes(start), 'EndTime': format_minutes(start + SLOT_MINUTES)}
+        for start in grid if not overlaps(booked, start)
+    ]
+
+
+def book_slot(conn, patient_id, doctor_id, appointment_dt):
+    """Atomically book one slot and return the new AppointmentID.
+
+    The in-memory index rejects obviously taken slots without touching the
+    write lock. The decision itself is made under BEGIN IMMEDIATE with an
+    overlap query and the day's capacity, and the partial unique index on
+    (DoctorID, AppointmentDate) for Scheduled rows backs it up.
+    """
+    date = appointment_dt.strftime('%Y-%m-%d')
+    start = appointment_dt.hour * 60 + appointment_dt.minute
+
+    if start not in slot_grid(conn, doctor_id).get(appointment_dt.strftime('%A'), []):
+        raise SlotUnavailable()
+    if overlaps(booking_index.booked(conn, doctor_id, date), start):
+        raise SlotTaken()
+
+    lower = (appointment_dt - datetime.timedelta(minutes=SLOT_MINUTES)).strftime(DATE_FORMAT)
+    upper = (appointment_dt + datetime.timedelta(minutes=SLOT_MINUTES)).strftime(DATE_FORMAT)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        clash = conn.execute('''
+            SELECT 1 FROM Appointment
+            WHERE DoctorID = ? AND AppointmentDate > ? AND AppointmentDate < ? AND Status = 'Scheduled'
+            LIMIT 1
+        ''', (doctor_id, lower, upper)).fetchone()
+        if clash:
+            raise SlotTaken()
+        if day_is_full(conn, doctor_id, date):
+            raise DayFull()
+        cursor = conn.execute('''
+            INSERT INTO Appointment (AppointmentDate, PatientID, DoctorID, Status)
+            VALUES (?, ?, ?, 'Scheduled')
+        ''', (appointment_dt.strftime(DATE_FORMAT), patient_id, doctor_id))
+        conn.commit()
+    except (SlotTaken, DayFull):
+        conn.rollback()
+        booking_index.forget(doctor_id, date)
+        raise
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        booking_index.forget(doctor_id, date)
+        raise SlotTaken()
+    except Exception:
+        conn.rollback()
+        raise
+
+    booking_index.add(doctor_id, date, start)
+    return cursor.lastrowid
+
+
+def set_status(conn, appointment_id, status):
+    """Change an appointment's status; False if it does not exist.
+
+    Cancelling frees the slot and a place in the day (the DoctorDayLoad
+    triggers release it). Bringing a cancelled appointment back re-checks
+    the day's capacity, and the partial unique index rejects it with
+    SlotTaken if its slot has been booked since.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT DoctorID, AppointmentDate, Status FROM Appointment WHERE AppointmentID = ?',
+                           (appointment_id,)).fetchone()
+        if row is None:
+            conn.rollback()
+            return False
+        date = row['AppointmentDate'][:10]
+        if row['Status'] == 'Cancelled' and status != 'Cancelled' and day_is_full(conn, row['DoctorID'], date):
+            raise DayFull()
+        conn.execute('UPDATE Appointment SET Status = ? WHERE AppointmentID = ?', (status, appointment_id))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise SlotTaken()
+    except Exception:
+        conn.rollback()
+        raise
+
+    booking_index.forget(row['DoctorID'], date)
+    return True
+
+
+# === Free slot search ===
+
+def scheduled_starts(conn, doctor_ids, day):
+    """Scheduled start minutes by doctor for one date.
+
+    One range query for every doctor instead of one index load per doctor;
+    the minutes are computed in SQL and rows come back in index order, so
+    the lists need no sorting.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None   # plain tuples, this can be thousands of rows
+    rows = cursor.execute(f'''
+        SELECT DoctorID,
+               CAST(substr(AppointmentDate, 12, 2) AS INTEGER) * 60 + CAST(substr(AppointmentDate, 15, 2) AS INTEGER)
+        FROM Appointment
+        WHERE DoctorID IN ({','.join('?' * len(doctor_ids))})
+          AND AppointmentDate >= ? AND AppointmentDate < ? AND Status = 'Scheduled'
+        ORDER BY DoctorID, AppointmentDate
+    ''', list(doctor_ids) + [day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()]).fetchall()
+    return {
+        doctor_id: [start for _, start in group]
+        for doctor_id, group in itertools.groupby(rows, key=lambda row: row[0])
+    }
+
+
+def next_free_slots(conn, doctors, first_day, days, limit, now=None):
+    """The earliest `limit` free slots across `doctors` within `days` days.
+
+    doctors are Doctor rows (DoctorID, Name, Specialization). Each day the
+    doctors' free starts, already sorted, are merged lazily, and bookings
+    are loaded a day at a time, so the search stops as soon as enough
+    slots are found.
+    """
+    if not doctors or limit < 1:
+        return []
+    now = now or datetime.datetime.now()
+    by_id = {row['DoctorID']: row for row in doctors}
+    grids = {doctor_id: slot_grid(conn, doctor_id) for doctor_id in by_id}
+
+    found = []
+    for offset in range(days):
+        day = first_day + datetime.timedelta(days=offset)
+        if day < now.date():
+            continue
+        date, weekday = day.isoformat(), day.strftime('%A')
+        working = [doctor_id for doctor_id in by_id if weekday in grids[doctor_id]]
+        if not working:
+            continue
+        full = full_doctors(conn, working, date)
+        working = [doctor_id for doctor_id in working if doctor_id not in full]
+        if not working:
+            continue
+        earliest = now.hour * 60 + now.minute if day == now.date() else 0
+        booked = scheduled_starts(conn, working, day)
+
+        def free(doctor_id):
+            taken = booked.get(doctor_id, [])
+            for start in grids[doctor_id].get(weekday, ()):
+                if start >= earliest and not overlaps(taken, start):
+                    yield start, doctor_id
+
+        merged = heapq.merge(*(free(doctor_id) for doctor_id in working))
+        for start, doctor_id in itertools.islice(merged, limit - len(found)):
+            doctor = by_id[doctor_id]
+            found.append({
+                'DoctorID': doctor_id,
+                'DoctorName': doctor['Name'],
+                'Specialization': doctor['Specialization'],
+                'AppointmentDate': f'{date} {format_minutes(start)}',
+                'StartTime': format_minutes(start),
+                'EndTime': format_minutes(start + SLOT_MINUTES),
+            })
+        if len(found) >= limit:
+            break
+    return found
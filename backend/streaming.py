@@ -0,0 +1,57 @@
+import json
+from flask import Response, request, stream_with_context
+from config import get_setting
+from database import get_db_connection
+
+STREAM_BATCH_SIZE = get_setting('api', 'stream_batch_size', 500)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def wants_stream():
+    # ?stream=1 streams a JSON array, Accept: application/x-ndjson streams NDJSON
+    return request.args.get('stream') in ('1', 'true') or wants_ndjson()
+
+
+def _encode(row):
+    return json.dumps(dict(row), separators=(',', ':'))
+
+
+def stream_query(sql, params=(), batch_size=STREAM_BATCH_SIZE):
+    """Stream every row of a query without materialising the result set.
+
+    Rows are pulled from the cursor batch_size at a time and written out as
+    either one JSON array or newline-delimited JSON, depending on the
+    request's Accept header.
+    """
+    ndjson = wants_ndjson()
+    conn = get_db_connection()
+
+    def generate():
+        try:
+            cursor = conn.execute(sql, params)
+            first = True
+            if not ndjson:
+                yield '['
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if ndjson:
+                    yield ''.join(_encode(row) + '\n' for row in rows)
+                else:
+                    chunk = ','.join(_encode(row) for row in rows)
+                    yield chunk if first else ',' + chunk
+                    first = False
+            if not ndjson:
+                yield ']'
+        finally:
+            conn.close()
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
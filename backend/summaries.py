@@ -0,0 +1,62 @@
+import datetime
+from appointment_stats import status_counts
+
+# Only these two columns may be interpolated into the summary SQL
+OWNER_COLUMNS = ('DoctorID', 'PatientID')
+
+
+def appointment_summary(conn, owner_column, owner_id, now=None):
+    """Dashboard counters for one doctor or patient.
+
+    Status counts are read from the AppointmentStats counters (at most three
+    primary-key rows), so they cost the same however long the history is.
+    Today's and this week's counts are a range seek over the owner's
+    (owner, AppointmentDate) index; the next upcoming appointment is a
+    single index seek.
+    """
+    if owner_column not in OWNER_COLUMNS:
+        raise ValueError(f'Unsupported owner column {owner_column}')
+
+    now = now or datetime.datetime.now()
+    today = now.date()
+    week_start = today - datetime.timedelta(days=today.weekday())
+
+    by_status = status_counts(conn, owner_column, owner_id)
+
+    window = conn.execute(f'''
+        SELECT
+            COALESCE(SUM(AppointmentDate >= :today AND AppointmentDate < :tomorrow), 0) AS Today,
+            COUNT(*) AS ThisWeek
+        FROM Appointment
+        WHERE {owner_column} = :owner_id
+          AND AppointmentDate >= :week_start AND AppointmentDate < :week_end
+          AND Status != 'Cancelled'
+    ''', {
+        'owner_id': owner_id,
+        'today': today.isoformat(),
+        'tomorrow': (today + datetime.timedelta(days=1)).isoformat(),
+        'week_start': week_start.isoformat(),
+        'week_end': (week_start + datetime.timedelta(days=7)).isoformat(),
+    }).fetchone()
+
+    next_appointment = conn.execute(f'''
+        SELECT a.AppointmentID, a.AppointmentDate,
+               d.DoctorID, d.Name AS DoctorName, d.Specialization,
+               p.PatientID, p.Name AS PatientName
+        FROM Appointment a
+        JOIN Doctor d ON a.DoctorID = d.DoctorID
+        JOIN Patient p ON a.PatientID = p.PatientID
+        WHERE a.{owner_column} = ? AND a.Status = 'Scheduled' AND a.AppointmentDate >= ?
+        ORDER BY a.AppointmentDate ASC
+        LIMIT 1
+    ''', (owner_id, now.strftime('%Y-%m-%d %H:%M'))).fetchone()
+
+    return {
+        'total_appointments': sum(by_status.values()),
+        'completed_appointments': by_status.get('Completed', 0),
+        'upcoming_appointments': by_status.get('Scheduled', 0),
+        'cancelled_appointments': by_status.get('Cancelled', 0),
+        'today_appointments': window['Today'],
+        'week_appointments': window['ThisWeek'],
+        'next_appointment': dict(next_appointment) if next_appointment else None,
+    }
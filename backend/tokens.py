@@ -0,0 +1,164 @@
+"""Signed, expiring session tokens and the per-blueprint checks that use them.
+
+Tokens are HS256 JWTs signed with security.jwt_secret_key and carry the
+user's role and ReferenceID, so a request is authorised without a database
+query. Blacklisting or deleting an account revokes its outstanding tokens
+through an in-process revocation list instead of a per-request lookup.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from flask import g, jsonify, request
+from config import get_setting
+
+SECRET_KEY = get_setting('security', 'jwt_secret_key', 'change-me').encode()
+TOKEN_TTL_SECONDS = get_setting('redis', 'session_timeout_minutes', 60) * 60
+REQUIRE_AUTH = get_setting('security', 'require_auth', True)
+
+_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + b'=' * (-len(text) % 4))
+
+
+def _sign(signing_input):
+    return _b64(hmac.new(SECRET_KEY, signing_input, hashlib.sha256).digest())
+
+
+def issue_token(user_id, role, reference_id, now=None):
+    now = time.time() if now is None else now
+    claims = {'sub': user_id, 'role': role, 'ref': reference_id, 'iat': round(now, 3),
+              'exp': int(now + TOKEN_TTL_SECONDS)}
+    signing_input = _HEADER + b'.' + _b64(json.dumps(claims, separators=(',', ':')).encode())
+    return (signing_input + b'.' + _sign(signing_input)).decode()
+
+
+def decode_token(token, now=None):
+    try:
+        header, payload, signature = token.encode().split(b'.')
+    except ValueError:
+        raise TokenError('Malformed token')
+    if not hmac.compare_digest(signature, _sign(header + b'.' + payload)):
+        raise TokenError('Invalid token signature')
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        raise TokenError('Malformed token')
+    if claims.get('exp', 0) <= (time.time() if now is None else now):
+        raise TokenError('Token expired')
+    if revocations.is_revoked(claims):
+        raise TokenError('Token revoked')
+    return claims
+
+
+# === Revocation ===
+
+class RevocationList:
+    """Accounts whose tokens issued before a cutoff are no longer valid.
+
+    Entries outlive the tokens they revoke by at most the token lifetime,
+    after which they are pruned. The list is per process: with several
+    workers, each must see the blacklist change (load_blacklisted() covers
+    restarts).
+    """
+
+    def __init__(self, ttl=TOKEN_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cutoffs = {}   # (role, reference_id) -> revoked-before timestamp
+
+    def revoke(self, role, reference_id, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._cutoffs[(role, reference_id)] = now
+            # Anything older than one token lifetime can't match a live token
+            stale = [key for key, cutoff in self._cutoffs.items() if cutoff < now - self.ttl]
+            for key in stale:
+                del self._cutoffs[key]
+
+    def is_revoked(self, claims):
+        cutoff = self._cutoffs.get((claims.get('role'), claims.get('ref')))
+        return cutoff is not None and claims.get('iat', 0) < cutoff
+
+    def load_blacklisted(self, conn):
+        # Tokens issued before a restart can't be checked against a lost list
+        now = time.time()
+        for role, table, key in (('Doctor', 'Doctor', 'DoctorID'), ('Patient', 'Patient', 'PatientID')):
+            for row in conn.execute(f'SELECT {key} FROM {table} WHERE IsBlacklisted = 1'):
+                self.revoke(role, row[0], now)
+
+    def __len__(self):
+        return len(self._cutoffs)
+
+
+revocations = RevocationList()
+
+
+# === Request checks ===
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    return header[7:] if header.startswith('Bearer ') else None
+
+
+def request_claims():
+    """Verified claims of the request's Bearer token, or None; for app-level hooks."""
+    token = _bearer_token()
+    if not token:
+        return None
+    try:
+        return decode_token(token)
+    except TokenError:
+        return None
+
+
+def protect(blueprint, roles, owner_arg=None, overrides=None, query_token=False):
+    """Require a valid token with one of `roles` on every route of blueprint.
+
+    owner_arg names the URL argument that holds the caller's own ReferenceID
+    (patient_id on the patient routes): a Doctor or Patient token may only
+    use its own. overrides maps endpoint names to the roles allowed there.
+    query_token also accepts the token as ?token=, for EventSource, which
+    cannot set headers. The verified claims are available as flask.g.identity.
+    """
+    overrides = overrides or {}
+
+    @blueprint.before_request
+    def check_token():
+        if not REQUIRE_AUTH or request.method == 'OPTIONS':
+            return None
+        token = _bearer_token() or (request.args.get('token') if query_token else None)
+        if not token:
+            return jsonify({'error': 'Authentication required'}), 401
+        try:
+            claims = decode_token(token)
+        except TokenError as e:
+            return jsonify({'error': str(e)}), 401
+
+        if claims['role'] not in overrides.get(request.endpoint, roles):
+            return jsonify({'error': 'Not allowed for this role'}), 403
+        owner = (request.view_args or {}).get(owner_arg)
+        if owner is not None and claims['role'] != 'Admin' and owner != claims['ref']:
+            return jsonify({'error': 'Not allowed for this account'}), 403
+        g.identity = claims
+        return None
+
+
+def may_act_for(role, reference_id):
+    """False when the caller is a `role` token for a different account."""
+    identity = g.get('identity')
+    if identity is None or identity['role'] != role:
+        return True
+    return str(identity['ref']) == str(reference_id)
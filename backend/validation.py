@@ -0,0 +1,103 @@
+"""Field rules shared by the profile/doctor routes and the bulk importer."""
+import datetime
+from pagination import APPOINTMENT_STATUSES
+
+GENDERS = ('Male', 'Female', 'Other')
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+APPOINTMENT_DATE_FORMAT = '%Y-%m-%d %H:%M'
+AVAILABILITY_TIME_FORMAT = '%H:%M'
+
+
+class ValidationError(ValueError):
+    pass
+
+
+def _int(value, message):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(message)
+
+
+def patient_fields(data):
+    """(name, age, gender, contact, address) from a patient profile dict."""
+    name = data.get('name')
+    age = data.get('age')
+    gender = data.get('gender')
+    contact = data.get('contact')
+    address = data.get('address', '')
+
+    if not all([name, age, gender, contact]):
+        raise ValidationError('Missing required fields')
+
+    age = _int(age, 'Age must be a number')
+    if age < 0 or age > 150:
+        raise ValidationError('Invalid age')
+
+    if gender not in GENDERS:
+        raise ValidationError('Gender must be Male, Female, or Other')
+
+    return name, age, gender, contact, address
+
+
+def doctor_fields(data):
+    """(name, specialization, department_id, contact, email) from a doctor dict."""
+    name = data.get('name')
+    specialization = data.get('specialization')
+    department_id = data.get('department_id')
+    contact = data.get('contact')
+    email = data.get('email')
+
+    if not all([name, specialization, department_id, email]):
+        raise ValidationError('Missing required fields (name, specialization, department, email)')
+
+    department_id = _int(department_id, 'Department must be a number')
+    return name, specialization, department_id, contact, email
+
+
+def _time(value):
+    try:
+        return datetime.datetime.strptime(value, AVAILABILITY_TIME_FORMAT).strftime(AVAILABILITY_TIME_FORMAT)
+    except (TypeError, ValueError):
+        raise ValidationError('Invalid time format. Use HH:MM')
+
+
+def availability_fields(data):
+    """(day, start_time, end_time) from an availability dict, times as zero-padded HH:MM."""
+    day = data.get('day')
+    start = data.get('start_time')
+    end = data.get('end_time')
+
+    if not all([day, start, end]):
+        raise ValidationError('Missing required fields')
+
+    if day not in DAYS:
+        raise ValidationError('Day must be a weekday name, e.g. Monday')
+
+    start, end = _time(start), _time(end)
+    if start >= end:
+        raise ValidationError('start_time must be before end_time')
+
+    return day, start, end
+
+
+def appointment_fields(data):
+    """(date, patient_id, doctor_id, status) from an appointment dict."""
+    patient_id = data.get('patient_id')
+    doctor_id = data.get('doctor_id')
+    date_str = data.get('date')
+    status = data.get('status') or 'Scheduled'
+
+    if not all([patient_id, doctor_id, date_str]):
+        raise ValidationError('Missing fields')
+
+    try:
+        date = datetime.datetime.strptime(date_str, APPOINTMENT_DATE_FORMAT).strftime(APPOINTMENT_DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ValidationError('Invalid date format. Use YYYY-MM-DD HH:MM')
+
+    if status not in APPOINTMENT_STATUSES:
+        raise ValidationError('Invalid status')
+
+    return (date, _int(patient_id, 'patient_id must be a number'),
+            _int(doctor_id, 'doctor_id must be a number'), status)
@@ -1,3 +1,38 @@
 const API = axios.create({
     baseURL: "http://127.0.0.1:5000/api"
 });
+
+// Send the session token issued by /auth/login with every request
+API.interceptors.request.use(config => {
+    const user = typeof Session !== 'undefined' ? Session.get() : null;
+    if (user && user.token) {
+        config.headers.Authorization = `Bearer ${user.token}`;
+    }
+    return config;
+});
+
+// An expired or revoked token sends the user back to the login page
+API.interceptors.response.use(null, err => {
+    if (err.response?.status === 401 && err.config.headers.Authorization) {
+        Session.logout();
+    }
+    return Promise.reject(err);
+});
+
+// List endpoints return { items, next_cursor }; pass the cursor back to get the next page
+API.getPage = async (url, cursor = null, params = {}) => {
+    const res = await API.get(url, { params: cursor ? { ...params, cursor } : params });
+    return res.data;
+};
+
+// Follow next_cursor until the list is exhausted (for small, bounded lists)
+API.getAllPages = async (url, params = {}) => {
+    let items = [];
+    let cursor = null;
+    do {
+        const page = await API.getPage(url, cursor, params);
+        items = items.concat(page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return items;
+};
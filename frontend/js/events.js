@@ -0,0 +1,44 @@
+// Live change events from /api/events/stream, so dashboards patch their lists instead of reloading them
+
+const LiveEvents = {
+    source: null,
+    connected: false,
+
+    // handlers maps event types (appointment.booked, appointment.updated, history.added,
+    // doctor.blacklist, patient.blacklist) to functions taking the changed row;
+    // onResync runs when events were missed and the lists must be reloaded once
+    subscribe(handlers, onResync) {
+        const user = Session.get();
+        if (!user || !user.token || typeof EventSource === 'undefined') return;
+
+        // EventSource can't send headers; it resends Last-Event-ID itself when it reconnects
+        this.source = new EventSource(`${API.defaults.baseURL}/events/stream?token=${encodeURIComponent(user.token)}`);
+        this.source.onopen = () => { this.connected = true; };
+        this.source.onerror = () => {
+            this.connected = false;
+            // The stream ends when the token expires; don't reconnect with a dead token
+            if (!Session.get()) this.close();
+        };
+        for (const [type, handler] of Object.entries(handlers)) {
+            this.source.addEventListener(type, e => handler(JSON.parse(e.data)));
+        }
+        if (onResync) this.source.addEventListener('resync', () => onResync());
+    },
+
+    close() {
+        if (this.source) this.source.close();
+        this.source = null;
+        this.connected = false;
+    },
+
+    // Replace the row with the same key or insert it where `before` says it sorts
+    upsert(list, row, key, before) {
+        const i = list.findIndex(item => item[key] === row[key]);
+        if (i !== -1) {
+            list.splice(i, 1, { ...list[i], ...row });
+            return;
+        }
+        const at = list.findIndex(item => before(row, item));
+        list.splice(at === -1 ? list.length : at, 0, row);
+    }
+};
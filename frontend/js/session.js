@@ -6,10 +6,15 @@ const Session = {
         localStorage.setItem('hospital_user', JSON.stringify(userData));
     },
 
-    // Get current user session
+    // Get current user session (null once its token has expired)
     get() {
         const data = localStorage.getItem('hospital_user');
-        return data ? JSON.parse(data) : null;
+        const user = data ? JSON.parse(data) : null;
+        if (user && user.expiresAt && user.expiresAt <= Date.now()) {
+            this.clear();
+            return null;
+        }
+        return user;
     },
 
     // Clear session (logout)